@@ -33,6 +33,10 @@ cd ..
 echo -e "${GREEN}Installation des dépendances Python pour le backend...${NC}"
 pip3 install -r server/fastapi/production_requirements.txt
 
+# Compilation du modèle en artefact NumPy (chargé avec MODEL_ARTIFACT)
+echo -e "${GREEN}Export de l'artefact compilé du modèle...${NC}"
+(cd server/fastapi && python3 artifact.py export)
+
 echo -e "${GREEN}Création du fichier README pour le déploiement...${NC}"
 cat > dist/README.md << 'EOL'
 # NéphroPredict - Instructions de déploiement
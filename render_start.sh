@@ -6,7 +6,7 @@ export PORT=${PORT:-8000}
 export HOST=${HOST:-0.0.0.0}
 export WORKERS=${WORKERS:-1}  # Réduit à un seul worker pour éviter les timeouts
 export TIMEOUT=${TIMEOUT:-120}  # Augmente le timeout à 120 secondes
-export MAX_REQUESTS=${MAX_REQUESTS:-1}  # Limite le nombre de requêtes par worker
+export MAX_REQUESTS=${MAX_REQUESTS:-0}  # Requêtes avant recyclage d'un worker (0: jamais, il garde son cache et ses fenêtres)
 
 echo "=== Démarrage de NéphroPredict sur Render ==="
 echo "Hôte: $HOST"
@@ -40,6 +40,7 @@ fi
 # Démarrer avec un seul worker et augmenter le timeout
 # Utiliser render_main.py au lieu de main.py pour bénéficier du chargement paresseux du modèle
 exec gunicorn render_main:app \
+    --config gunicorn.conf.py \
     --worker-class uvicorn.workers.UvicornWorker \
     --workers $WORKERS \
     --bind $HOST:$PORT \
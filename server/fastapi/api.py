@@ -0,0 +1,953 @@
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Any, Dict, List, Mapping, MutableMapping, Optional
+import asyncio
+import codecs
+import datetime
+import hmac
+import time
+import numpy as np
+import config
+import fastjson
+import preload
+from audit import AuditEntry, AuditLog, AuditLogSaturated, parse_cursor
+from batcher import MicroBatcher
+from cache import PredictionCache
+from compression import CompressionMiddleware, etag_matches, negotiate
+from drift import DriftMonitor, FeatureReference
+from executor import InferenceExecutor, ExecutorSaturated
+from metadata import MetadataStore
+from metrics import Metrics, MetricsMiddleware
+from model import FEATURE_NAMES, IRCModel, PredictionResult, MODEL_READY
+from partial_dependence import PartialDependenceCache, partial_dependence_curves
+from readiness import ReadinessGate, ModelNotReady
+from registry import ModelRegistry, ModelVersionNotFound
+from sensitivity import Sweep, sensitivity_sweep, sweep_values
+from shadow import ShadowScorer
+from trajectory import TrajectoryStore, VisitOutOfOrder, score_trajectory
+from score import ResultWriter, detect_format, read_chunks, score_next
+from schemas import (
+    PredictionInput,
+    StageProbability,
+    FeatureImportance,
+    FeatureContribution,
+    PredictionOutput,
+    BatchPredictionInput,
+    BatchRowPrediction,
+    BatchRowError,
+    BatchPredictionOutput,
+    ModelStatus,
+    ModelReloadInput,
+    ModelActivateInput,
+    SensitivityInput,
+    ShadowModelInput,
+    TrajectoryInput,
+    Visit,
+    parse_feature_row
+)
+
+def _stage_probabilities(probabilities: Mapping[int, float]) -> List[StageProbability]:
+    """Convert a stage -> probability mapping into the response format"""
+    return [
+        StageProbability(stage=stage, probability=prob)
+        for stage, prob in probabilities.items()
+    ]
+
+def _feature_importance(importances: Mapping[str, float]) -> List[FeatureImportance]:
+    """Convert a feature -> importance mapping into the response format"""
+    return [
+        FeatureImportance(feature=feat, importance=imp)
+        for feat, imp in importances.items()
+    ]
+
+def _feature_contributions(result: PredictionResult, explain: bool) -> Optional[List[FeatureContribution]]:
+    """Convert a result's contributions into the response format, if they were requested"""
+    if not explain or result.contributions is None:
+        return None
+    return [
+        FeatureContribution(feature=feat, contribution=value)
+        for feat, value in result.contributions.items()
+    ]
+
+def _prediction_body(result: PredictionResult, explain: bool) -> bytes:
+    """
+    Serialize a single prediction result as the /predict response
+    
+    The fields and their order are those of PredictionOutput, but the values
+    are already plain floats and ints, so the body is encoded directly
+    instead of building and re-validating the Pydantic model.
+    """
+    contributions = None
+    if explain and result.contributions is not None:
+        contributions = [
+            {"feature": feat, "contribution": value}
+            for feat, value in result.contributions.items()
+        ]
+    return fastjson.dumps({
+        "predicted_stage": result.predicted_stage,
+        "confidence": result.confidence,
+        "stage_probabilities": [
+            {"stage": stage, "probability": prob}
+            for stage, prob in result.stage_probabilities.items()
+        ],
+        "feature_importance": [
+            {"feature": feat, "importance": imp}
+            for feat, imp in result.feature_importance.items()
+        ],
+        "base_probability": result.base_probability if explain else None,
+        "feature_contributions": contributions,
+        "fallback": result.fallback
+    })
+
+def _body_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    """Locate the errors of a request body validated by hand like FastAPI does"""
+    return [{**err, "loc": ("body", *err["loc"])} for err in error.errors()]
+
+def _timestamp(moment: Optional[datetime.datetime]) -> Optional[float]:
+    """POSIX time of a query parameter, taken as UTC when it has no offset"""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+def create_app(model: IRCModel) -> FastAPI:
+    """
+    Build the NéphroPredict API around a loaded model
+    
+    main.py and render_main.py only differ in how the model is loaded,
+    so they share the same endpoints. The given model is the first active
+    version of the registry; later versions are loaded by reloads.
+    
+    The state the app keeps (executor and batcher counters, caches, stores,
+    drift and shadow statistics) is only touched from the event loop thread,
+    so it takes no locks; models run on the inference threads and the audit
+    log writes from its own thread.
+    """
+    # Initialize the FastAPI app
+    app = FastAPI(
+        title="NéphroPredict API",
+        description="API for predicting the stage of IRC (Insuffisance Rénale Chronique)",
+        version="1.0.0"
+    )
+    # Lets the gunicorn master reach the model of a preloaded app (gunicorn.conf.py)
+    app.state.model = model
+    
+    # Resident model versions; requests use the active one unless they pin another
+    registry = ModelRegistry(
+        model,
+        max_versions=config.MODEL_VERSIONS,
+        watch_path=config.MODEL_ARTIFACT or config.MODEL_PATH
+    )
+    app.state.registry = registry
+    
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific domains
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Queue-Wait-Ms", "X-Inference-Ms", "Server-Timing", "X-Cache", "X-Model-Version", "ETag"],
+    )
+    
+    # Large batch, sweep, trajectory and file results are compressed
+    if config.COMPRESSION:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=config.COMPRESSION_MIN_SIZE,
+            gzip_level=config.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=config.COMPRESSION_BROTLI_QUALITY
+        )
+    
+    # Inference runs on a bounded thread pool so it never blocks the event loop
+    executor = InferenceExecutor(
+        max_workers=config.INFERENCE_WORKERS,
+        max_queue=config.INFERENCE_QUEUE_DEPTH,
+        retry_after=config.INFERENCE_RETRY_AFTER
+    )
+    
+    # Optional secondary model scoring /predict traffic on its own bounded pool
+    shadow = ShadowScorer(
+        executor,
+        max_workers=config.SHADOW_WORKERS,
+        max_queue=config.SHADOW_QUEUE_DEPTH,
+        sample_rate=config.SHADOW_SAMPLE_RATE
+    )
+    
+    @app.on_event("shutdown")
+    def shutdown_executor():
+        executor.shutdown()
+        shadow.shutdown()
+        registry.stop_watching()
+        registry.stop_processes()
+    
+    # Optionally record every prediction served, written in batches in the background
+    audit = None
+    if config.AUDIT_LOG:
+        audit = AuditLog(
+            config.AUDIT_LOG,
+            max_queue=config.AUDIT_QUEUE_SIZE,
+            batch_size=config.AUDIT_BATCH_SIZE,
+            flush_ms=config.AUDIT_FLUSH_MS,
+            queue_timeout=config.AUDIT_QUEUE_TIMEOUT
+        )
+        
+        @app.on_event("shutdown")
+        async def flush_audit_log():
+            await audit.close()
+    
+    # Threads do not survive the fork of preloaded gunicorn workers, so the
+    # watcher, the shadow model loading and the inference worker processes
+    # are started by each worker
+    @app.on_event("startup")
+    def start_model_watch():
+        registry.active.start_processes()
+        if config.MODEL_WATCH:
+            registry.start_watching(config.MODEL_WATCH_INTERVAL)
+        if config.SHADOW_MODEL:
+            shadow.load(config.SHADOW_MODEL)
+    
+    # What happens to predictions received while the model is loading or warming up
+    readiness = ReadinessGate(
+        registry,
+        policy=config.NOT_READY_POLICY,
+        timeout=config.NOT_READY_TIMEOUT,
+        retry_after=config.NOT_READY_RETRY_AFTER
+    )
+    
+    # Optionally coalesce concurrent /predict calls into vectorized batches
+    batcher = None
+    if config.MICRO_BATCHING:
+        batcher = MicroBatcher(
+            model,
+            executor,
+            window_ms=config.MICRO_BATCH_WINDOW_MS,
+            max_batch_size=config.MICRO_BATCH_MAX_SIZE
+        )
+    
+    # Optionally remember the predictions of recently seen patients
+    cache = None
+    if config.PREDICTION_CACHE:
+        cache = PredictionCache(
+            max_entries=config.PREDICTION_CACHE_SIZE,
+            ttl=config.PREDICTION_CACHE_TTL
+        )
+    
+    # Optionally count requests and time the stages of every prediction
+    metrics = None
+    if config.METRICS:
+        metrics = Metrics()
+        model.metrics = metrics
+    
+    # Trajectories of identified patients, so a new visit is scored on its own
+    trajectories = TrajectoryStore(max_patients=config.TRAJECTORY_STORE_SIZE, max_visits=config.TRAJECTORY_MAX_VISITS)
+    
+    # Optionally compare the features received by /predict with the training data
+    drift = None
+    if config.DRIFT_MONITOR:
+        try:
+            drift = DriftMonitor(FeatureReference.from_csv(bins=config.DRIFT_BINS), window=config.DRIFT_WINDOW)
+        except Exception as e:
+            print(f"Drift monitor disabled, cannot read the reference data: {e}")
+    
+    # Partial-dependence curves of the training data, per resident model version
+    partial_dependence = PartialDependenceCache(max_versions=config.MODEL_VERSIONS)
+    
+    # Feature list, classes and importances of the resident model versions, serialized once per version
+    metadata = MetadataStore(
+        max_versions=config.MODEL_VERSIONS,
+        minimum_size=config.COMPRESSION_MIN_SIZE,
+        gzip_level=config.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=config.COMPRESSION_BROTLI_QUALITY
+    )
+    
+    def select_model(version: Optional[str], headers: MutableMapping[str, str]) -> IRCModel:
+        """Resolve the model version pinned by a request, or the active one, and report it in headers"""
+        try:
+            selected = registry.get(version)
+        except ModelVersionNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if selected.version is not None:
+            headers["X-Model-Version"] = selected.version
+        return selected
+    
+    async def ensure_ready():
+        """Apply NOT_READY_POLICY before running a prediction"""
+        try:
+            await readiness.check()
+        except ModelNotReady as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"{e}, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+    
+    async def await_inference(call):
+        """
+        Await a timed model call, turning its failures into HTTP errors
+        
+        Args:
+            call: Awaitable returning a (result, InferenceTiming) pair, from
+                the executor or the micro-batcher
+        """
+        try:
+            result, timing = await call
+        except ExecutorSaturated as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Prediction service is busy, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+        if metrics is not None:
+            metrics.observe_stage_duration("queue", timing.queue_wait_ms / 1000)
+        return result, timing
+    
+    async def audit_predictions(endpoint: str, version: Optional[str], inputs, indices, results, received: float,
+                                started: float, row_offset: int = 0, wait: bool = False):
+        """
+        Queue the predictions of a request in the audit log, if enabled
+        
+        Args:
+            wait: Keep waiting for room instead of answering 503, once a
+                streamed response has started
+        """
+        if audit is None:
+            return
+        entry = AuditEntry(
+            timestamp=received,
+            endpoint=endpoint,
+            model_version=version,
+            inputs=inputs,
+            indices=indices,
+            results=results,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            row_offset=row_offset
+        )
+        while True:
+            try:
+                await audit.submit(entry)
+                return
+            except AuditLogSaturated as e:
+                if not wait:
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Prediction audit log is busy, please retry later",
+                        headers={"Retry-After": str(e.retry_after)}
+                    )
+    
+    async def run_inference(response: Response, call):
+        """Await a timed model call and expose its timing in the response headers"""
+        result, timing = await await_inference(call)
+        response.headers.update(timing.to_headers())
+        return result
+    
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to the NéphroPredict API. Use /predict endpoint to make IRC stage predictions."}
+    
+    @app.get("/health")
+    async def health_check():
+        """Endpoint for health checks"""
+        status = registry.active.get_status()
+        return {"status": "ok", "model_loaded": status["model_loaded"], "model_status": status}
+    
+    @app.get("/model/status", response_model=ModelStatus)
+    async def model_status():
+        """Get the current status of the active model"""
+        status = registry.active.get_status()
+        return ModelStatus(
+            status="ok" if status["state"] == MODEL_READY else status["state"],
+            model_loaded=status["model_loaded"],
+            model_loading=status["model_loading"],
+            model_type=status["model_type"],
+            state=status["state"],
+            timings=status["timings"],
+            readiness=readiness.get_status(),
+            executor=executor.get_status(),
+            micro_batching=batcher.get_status() if batcher is not None else None,
+            cache=cache.get_status() if cache is not None else None,
+            trajectories=trajectories.get_status(),
+            process=preload.get_status(),
+            audit=audit.get_status() if audit is not None else None
+        )
+    
+    def metadata_response(name: str, request: Request, version: Optional[str]) -> Response:
+        """
+        Send a precomputed metadata document, or 304 if the client's copy is current
+        
+        The encoding is negotiated here, from the precompressed bodies, so
+        the compression middleware leaves the response alone.
+        """
+        headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding, X-Model-Version"}
+        document = metadata.get(select_model(version, headers), name)
+        encoding = negotiate(request.headers.get("accept-encoding", "")) if config.COMPRESSION else None
+        body, etag, encoding = document.representation(encoding)
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), [document.etag]):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    @app.get("/model/metadata")
+    async def model_metadata(
+        request: Request,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """Get the model's features (with descriptions and importances), classes and ranked importances"""
+        return metadata_response("metadata", request, model_version)
+    
+    @app.get("/model/features")
+    async def model_features(
+        request: Request,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """Get the model's input features in column order, with their description, type and importance"""
+        return metadata_response("features", request, model_version)
+    
+    @app.get("/model/classes")
+    async def model_classes(
+        request: Request,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """Get the stages the model predicts, in the order of its probabilities"""
+        return metadata_response("classes", request, model_version)
+    
+    @app.get("/model/importance")
+    async def model_importance(
+        request: Request,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """Get the model's global feature importances, most important first"""
+        return metadata_response("importance", request, model_version)
+    
+    def prediction_response(result: PredictionResult, explain: bool, response: Response) -> Response:
+        """Send a /predict body along with the headers set on the injected response"""
+        started = time.perf_counter()
+        content = _prediction_body(result, explain)
+        if metrics is not None:
+            metrics.observe_stage("serialization", started)
+        return Response(content=content, media_type="application/json", headers=response.headers)
+    
+    # /predict reads its body itself (see parse_feature_row), so the request
+    # schema is declared for the docs; response_model is only documentation
+    # too, since the endpoint returns a ready-made Response
+    @app.post(
+        "/predict",
+        response_model=PredictionOutput,
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {"application/json": {"schema": PredictionInput.model_json_schema()}}
+            }
+        }
+    )
+    async def predict(
+        request: Request,
+        response: Response,
+        explain: bool = True,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Predict the IRC stage of one patient
+        
+        Pass explain=false to skip the per-patient feature contributions.
+        """
+        received = time.time()
+        body = await request.body()
+        started = time.perf_counter()
+        if not body:
+            raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+        try:
+            row = parse_feature_row(fastjson.loads(body))
+        except ValidationError as e:
+            raise RequestValidationError(_body_errors(e))
+        except ValueError as e:
+            raise RequestValidationError([{
+                "type": "json_invalid",
+                "loc": ("body", getattr(e, "pos", 0)),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": getattr(e, "msg", str(e))}
+            }])
+        if metrics is not None:
+            metrics.observe_stage("validation", started)
+        if drift is not None:
+            drift.observe(row)
+        
+        await ensure_ready()
+        current = select_model(model_version, response.headers)
+        
+        # Resubmitted patients are answered without running the model. Pinned
+        # requests bypass the cache, which only holds the active version
+        use_cache = cache is not None and model_version is None
+        if use_cache:
+            version = current.version
+            cache_key = cache.key(row)
+            result = cache.get(cache_key, version, explained=explain)
+            response.headers["X-Cache"] = "hit" if result is not None else "miss"
+            if result is not None:
+                await audit_predictions("/predict", version, row, None, (result,), received, started)
+                return prediction_response(result, explain, response)
+        
+        # Make prediction
+        if batcher is not None:
+            result, timing = await await_inference(batcher.predict(row, explain, current))
+        else:
+            results, timing = await await_inference(executor.run(current.predict_matrix, row, explain))
+            result = results[0]
+        response.headers.update(timing.to_headers())
+        
+        if use_cache:
+            cache.put(cache_key, version, result)
+        # Compared in the background once the answer is on its way
+        if model_version is None:
+            shadow.submit(row, result, current.version, timing.execution_ms)
+        await audit_predictions("/predict", current.version, row, None, (result,), received, started)
+        
+        # Return prediction results
+        return prediction_response(result, explain, response)
+    
+    @app.post("/predict/batch", response_model=BatchPredictionOutput)
+    async def predict_batch(
+        input_data: BatchPredictionInput,
+        response: Response,
+        explain: bool = False,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Score many patients with a single vectorized model call
+        
+        Pass explain=true to add every patient's feature contributions.
+        """
+        received, started = time.time(), time.perf_counter()
+        if (input_data.records is None) == (input_data.columns is None):
+            raise HTTPException(status_code=422, detail="Provide exactly one of 'records' or 'columns'")
+        
+        rows = input_data.records if input_data.records is not None else input_data.columns
+        count = len(rows) if isinstance(rows, list) else max((len(v) for v in rows.values()), default=0)
+        if count > config.MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch of {count} rows exceeds the maximum of {config.MAX_BATCH_SIZE}"
+            )
+        
+        await ensure_ready()
+        current = select_model(model_version, response.headers)
+        batch_result = await run_inference(response, executor.run(current.predict_batch, rows, explain))
+        await audit_predictions(
+            "/predict/batch", current.version, rows, batch_result.indices, batch_result.predictions, received, started
+        )
+        
+        started = time.perf_counter()
+        output = BatchPredictionOutput(
+            count=count,
+            predictions=[
+                BatchRowPrediction(
+                    index=index,
+                    predicted_stage=result.predicted_stage,
+                    confidence=result.confidence,
+                    stage_probabilities=_stage_probabilities(result.stage_probabilities),
+                    base_probability=result.base_probability if explain else None,
+                    feature_contributions=_feature_contributions(result, explain),
+                    fallback=result.fallback
+                )
+                for index, result in zip(batch_result.indices, batch_result.predictions)
+            ],
+            errors=[BatchRowError(index=error.index, error=error.error) for error in batch_result.errors],
+            feature_importance=_feature_importance(batch_result.feature_importance)
+        )
+        if metrics is not None:
+            metrics.observe_stage("serialization", started)
+        return output
+    
+    @app.post("/predict/file")
+    async def predict_file(
+        file: UploadFile = File(..., description="CSV or NDJSON file shaped like the training dataset"),
+        file_format: Optional[str] = Query(None, alias="format", description="csv or ndjson (default: from the file name)"),
+        keep: List[str] = Query([], description="Input columns copied to the output, e.g. a patient id"),
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Score an uploaded patient file chunk by chunk
+        
+        Raw dataset columns (Sexe, Anémie, ...) are accepted. Results are
+        streamed back in the file's format as each chunk of SCORING_CHUNK_SIZE
+        rows is scored, so memory use does not grow with the file size.
+        """
+        received, started = time.time(), time.perf_counter()
+        await ensure_ready()
+        # The whole file is scored by the version selected when it was received
+        headers: Dict[str, str] = {}
+        current = select_model(model_version, headers)
+        try:
+            writer = ResultWriter(file_format or detect_format(file.filename), keep)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        stream = codecs.getreader("utf-8-sig")(file.file)
+        chunks = read_chunks(stream, writer.fmt, config.SCORING_CHUNK_SIZE, keep)
+        
+        async def audit_chunk(scored, wait: bool):
+            _, chunk, result = scored
+            await audit_predictions(
+                "/predict/file", current.version, chunk.columns, result.indices, result.predictions, received,
+                started, row_offset=chunk.start, wait=wait
+            )
+        
+        # The first chunk is scored (and audited) before answering, so a bad
+        # header or a busy executor or audit log still gets a proper status code
+        first, timing = await await_inference(executor.run(score_next, current, chunks, writer))
+        if first is not None:
+            await audit_chunk(first, wait=False)
+        
+        async def next_chunk():
+            # Once streaming has started a 503 can no longer be sent: wait instead
+            while True:
+                try:
+                    scored, _ = await executor.run(score_next, current, chunks, writer)
+                    break
+                except ExecutorSaturated as e:
+                    await asyncio.sleep(e.retry_after)
+            if scored is not None:
+                await audit_chunk(scored, wait=True)
+            return scored
+        
+        async def body():
+            yield writer.header()
+            scored = first
+            while scored is not None:
+                yield scored[0]
+                scored = await next_chunk()
+        
+        headers.update(timing.to_headers())
+        return StreamingResponse(body(), media_type=writer.media_type, headers=headers)
+    
+    @app.post("/predict/sensitivity")
+    async def predict_sensitivity(
+        input_data: SensitivityInput,
+        response: Response,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Sweep one or two features of a patient and score the whole grid at once
+        
+        Returns the predicted stage, confidence and per-stage probability
+        surfaces over the grid, the patient's own prediction (baseline) and the
+        decision thresholds: the intervals of a swept feature across which the
+        predicted stage changes.
+        
+        Only the patient's own prediction is audited: the grid points are
+        hypothetical patients, not predictions served for anyone.
+        """
+        received, started = time.time(), time.perf_counter()
+        # Steps are checked before any value is generated
+        steps = max(sweep.steps for sweep in input_data.sweeps)
+        if steps > config.SENSITIVITY_MAX_POINTS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Sweep of {steps} steps exceeds the maximum of {config.SENSITIVITY_MAX_POINTS} grid points"
+            )
+        sweeps = [
+            Sweep(sweep.feature, sweep_values(sweep.feature, sweep.min, sweep.max, sweep.steps))
+            for sweep in input_data.sweeps
+        ]
+        points = int(np.prod([len(sweep.values) for sweep in sweeps]))
+        if points > config.SENSITIVITY_MAX_POINTS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Grid of {points} points exceeds the maximum of {config.SENSITIVITY_MAX_POINTS}"
+            )
+        row = input_data.patient.to_feature_row()
+        
+        await ensure_ready()
+        current = select_model(model_version, response.headers)
+        body = await run_inference(response, executor.run(sensitivity_sweep, current, row, sweeps))
+        baseline = body["baseline"]
+        await audit_predictions("/predict/sensitivity", current.version, row, None, (PredictionResult(
+            predicted_stage=baseline["predicted_stage"],
+            stage_probabilities={p["stage"]: p["probability"] for p in baseline["stage_probabilities"]},
+            feature_importance={},
+            fallback=body["fallback"]
+        ),), received, started)
+        return Response(content=fastjson.dumps(body), media_type="application/json", headers=response.headers)
+    
+    @app.post("/predict/trajectory")
+    async def predict_trajectory(
+        input_data: TrajectoryInput,
+        response: Response,
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Score a patient's visits in one vectorized call
+        
+        Returns the stage and probability curve over the visits (in date
+        order), the creatinine and urea slopes and the stage transitions. With
+        a patient_id (and no pinned version) the trajectory is kept, replacing
+        any previous one, so new visits can be appended to it.
+        """
+        received, started = time.time(), time.perf_counter()
+        if len(input_data.visits) > trajectories.max_visits:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Trajectory of {len(input_data.visits)} visits exceeds the maximum of {trajectories.max_visits}"
+            )
+        visits = sorted(input_data.visits, key=lambda visit: visit.date)
+        matrix = np.vstack([visit.to_feature_row() for visit in visits])
+        
+        await ensure_ready()
+        current = select_model(model_version, response.headers)
+        trajectory = await run_inference(
+            response, executor.run(score_trajectory, current, [visit.date for visit in visits], matrix)
+        )
+        if input_data.patient_id is not None and model_version is None:
+            trajectories.put(input_data.patient_id, trajectory)
+        # Row numbers are the visit numbers, in date order
+        await audit_predictions(
+            "/predict/trajectory", current.version, matrix, range(len(trajectory)),
+            [point.result for point in trajectory.points], received, started
+        )
+        return {"patient_id": input_data.patient_id, **trajectory.to_dict()}
+    
+    @app.post("/patients/{patient_id}/visits")
+    async def append_visit(patient_id: str, visit: Visit, response: Response):
+        """
+        Add a visit to a patient's trajectory kept by /predict/trajectory
+        
+        Only the new visit is scored and the trends are updated from running
+        sums, so the cost does not grow with the patient's history. The whole
+        history is rescored in one call if the active model changed since.
+        
+        Trajectories are kept in the memory of each server worker, so an
+        unknown patient (never submitted, evicted, or kept by a recycled
+        worker) gets a 404 rather than a trajectory started from this visit
+        alone, and appends are refused when several workers share the
+        traffic. "visits" in the answer is the number of visits the slopes
+        and transitions were computed over.
+        """
+        received, started = time.time(), time.perf_counter()
+        workers = config.SERVER_WORKERS
+        if workers > 1:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Visits cannot be appended with {workers} server workers, each keeping its own "
+                       "trajectories: submit the whole trajectory to /predict/trajectory instead"
+            )
+        trajectory = trajectories.get(patient_id)
+        if trajectory is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No trajectory kept for patient {patient_id}: "
+                       "submit the whole trajectory to /predict/trajectory first"
+            )
+        if len(trajectory) >= trajectories.max_visits:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Trajectory of patient {patient_id} already has {len(trajectory)} visits"
+            )
+        if visit.date < trajectory.last_date:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Visit of {visit.date} is before the last one ({trajectory.last_date}): "
+                       "submit the whole trajectory to /predict/trajectory instead"
+            )
+        row = visit.to_feature_row()
+        
+        await ensure_ready()
+        current = select_model(None, response.headers)
+        rescored = trajectory.version != current.version
+        if rescored:
+            trajectory = await run_inference(response, executor.run(
+                score_trajectory, current, trajectory.dates + [visit.date], np.vstack([trajectory.stacked_rows(), row])
+            ))
+            trajectories.put(patient_id, trajectory)
+            last = trajectory.transitions[-1] if trajectory.transitions else None
+            transition = last if last is not None and last["visit"] == len(trajectory) - 1 else None
+        else:
+            results = await run_inference(response, executor.run(current.predict_matrix, row))
+            try:
+                transition = trajectory.append(visit.date, row, results[0])
+            except VisitOutOfOrder as e:
+                # A later visit of the same patient was appended meanwhile
+                raise HTTPException(status_code=409, detail=str(e))
+        trajectories.count_append(rescored)
+        await audit_predictions(
+            "/patients/{patient_id}/visits", current.version, row, (len(trajectory) - 1,),
+            (trajectory.points[-1].result,), received, started
+        )
+        
+        return {
+            "patient_id": patient_id,
+            **trajectory.summary(),
+            "visit": trajectory.points[-1].to_dict(),
+            "transition": transition,
+            "rescored": rescored
+        }
+    
+    @app.get("/patients/{patient_id}/trajectory")
+    async def patient_trajectory(patient_id: str):
+        """Get the kept trajectory of a patient (this worker)"""
+        trajectory = trajectories.get(patient_id)
+        if trajectory is None:
+            raise HTTPException(status_code=404, detail=f"No trajectory kept for patient {patient_id}")
+        return {"patient_id": patient_id, **trajectory.to_dict()}
+    
+    @app.delete("/patients/{patient_id}/trajectory", status_code=204)
+    async def delete_patient_trajectory(patient_id: str):
+        """Forget the kept trajectory of a patient"""
+        if not trajectories.delete(patient_id):
+            raise HTTPException(status_code=404, detail=f"No trajectory kept for patient {patient_id}")
+        return Response(status_code=204)
+    
+    @app.get("/model/partial-dependence")
+    async def model_partial_dependence(
+        response: Response,
+        feature: Optional[str] = Query(None, description="Only return the curve of this feature"),
+        model_version: Optional[str] = Header(None, alias="X-Model-Version", description="Pin a resident model version")
+    ):
+        """
+        Get the partial dependence of the stage probabilities on every feature, over the training data
+        
+        Curves are exact: the model's answer only changes at its split
+        breakpoints, so each curve holds one value per interval between them.
+        They are computed once per model version, then served from memory.
+        """
+        if feature is not None and feature not in FEATURE_NAMES:
+            raise HTTPException(status_code=422, detail=f"Unknown feature: {feature}")
+        await ensure_ready()
+        current = select_model(model_version, response.headers)
+        if current.threshold_index is None:
+            raise HTTPException(status_code=404, detail="Partial dependence needs the tree model, the fallback rule is in use")
+        try:
+            matrix = partial_dependence.matrix
+        except (OSError, ValueError) as e:
+            raise HTTPException(status_code=503, detail=f"Training data unavailable: {e}")
+        
+        body = await partial_dependence.get(
+            current.version,
+            lambda: run_inference(response, executor.run(partial_dependence_curves, current, matrix))
+        )
+        if feature is not None:
+            body = {**body, "features": [curve for curve in body["features"] if curve["feature"] == feature]}
+        return Response(content=fastjson.dumps(body), media_type="application/json", headers=response.headers)
+    
+    @app.get("/model/shadow")
+    async def model_shadow():
+        """Get how the shadow model's answers compare with the primary's on live traffic (this worker)"""
+        return shadow.get_status()
+    
+    @app.get("/monitoring/drift")
+    async def monitoring_drift():
+        """Get how the features received by /predict compare with the training data (this worker)"""
+        if drift is None:
+            raise HTTPException(status_code=404, detail="Drift monitoring is disabled")
+        return drift.get_status()
+    
+    @app.get("/model/versions")
+    async def model_versions():
+        """Get the resident model versions of this worker, their memory use and the reload state"""
+        return registry.get_status()
+    
+    if config.ADMIN_TOKEN:
+        def check_admin_token(token: Optional[str]):
+            if token is None or not hmac.compare_digest(token, config.ADMIN_TOKEN):
+                raise HTTPException(status_code=403, detail="Invalid admin token")
+        
+        @app.post("/admin/model/reload", status_code=202)
+        async def reload_model(
+            body: Optional[ModelReloadInput] = None,
+            admin_token: Optional[str] = Header(None, alias="X-Admin-Token")
+        ):
+            """
+            Load a model version in the background, then switch to it once warmed up
+            
+            Only the worker receiving the request reloads; with several
+            workers, replace the watched file instead (MODEL_WATCH=1).
+            """
+            check_admin_token(admin_token)
+            source = body.source if body is not None else None
+            if not registry.reload(source):
+                raise HTTPException(status_code=409, detail="A model reload is already running")
+            return registry.get_status()
+        
+        @app.post("/admin/model/shadow", status_code=202)
+        async def set_shadow_model(
+            body: ShadowModelInput,
+            admin_token: Optional[str] = Header(None, alias="X-Admin-Token")
+        ):
+            """Load a shadow model in the background, or stop shadow scoring with a null source"""
+            check_admin_token(admin_token)
+            if not shadow.load(body.source):
+                raise HTTPException(status_code=409, detail="A shadow model is already being loaded")
+            return shadow.get_status()
+        
+        @app.post("/admin/model/activate")
+        async def activate_model(
+            body: ModelActivateInput,
+            admin_token: Optional[str] = Header(None, alias="X-Admin-Token")
+        ):
+            """Switch back to a resident model version"""
+            check_admin_token(admin_token)
+            try:
+                registry.activate(body.version)
+            except ModelVersionNotFound as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return registry.get_status()
+        
+        @app.post("/admin/drift/reset")
+        async def reset_drift(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+            """Forget the rows seen by the drift monitor of this worker"""
+            check_admin_token(admin_token)
+            if drift is None:
+                raise HTTPException(status_code=404, detail="Drift monitoring is disabled")
+            drift.reset()
+            return drift.get_status()
+        
+        @app.get("/admin/audit")
+        async def audit_records(
+            since: Optional[datetime.datetime] = Query(None, description="Oldest record time (UTC if no offset)"),
+            until: Optional[datetime.datetime] = Query(None, description="Record time to stop before (UTC if no offset)"),
+            before: Optional[str] = Query(None, description="Cursor of the next page, from a previous answer"),
+            limit: int = Query(100, ge=1, le=1000),
+            model_version: Optional[str] = Query(None),
+            predicted_stage: Optional[int] = Query(None),
+            admin_token: Optional[str] = Header(None, alias="X-Admin-Token")
+        ):
+            """
+            Get the most recent audited predictions first, from every worker
+            
+            Records hold patient data, hence the admin token. Records queued
+            but not yet written (see AUDIT_FLUSH_MS) are not listed.
+            """
+            check_admin_token(admin_token)
+            if audit is None:
+                raise HTTPException(status_code=404, detail="The audit log is disabled")
+            try:
+                cursor = parse_cursor(before) if before is not None else None
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"Invalid cursor: {before}")
+            records, next_cursor = await audit.query(
+                _timestamp(since), _timestamp(until), limit, cursor, model_version, predicted_stage
+            )
+            return {"count": len(records), "records": records, "next": next_cursor, "status": audit.get_status()}
+    
+    if metrics is not None:
+        @app.get("/metrics", include_in_schema=False)
+        async def prometheus_metrics():
+            """Metrics of this worker in the Prometheus text format"""
+            return Response(
+                content=metrics.render(registry.active.get_status()),
+                media_type="text/plain; version=0.0.4"
+            )
+        
+        # Added last so it wraps every other middleware and route
+        app.add_middleware(MetricsMiddleware, metrics=metrics, routes=app.routes)
+    
+    return app
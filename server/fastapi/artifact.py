@@ -0,0 +1,220 @@
+"""
+Compact on-disk format for the compiled random forest
+
+Usage:
+    python artifact.py export [--model PATH.pkl] [--out DIR]
+    python artifact.py verify [DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from compiled_forest import CompiledForest
+from model import FEATURE_NAMES
+
+# Bump when the layout of the arrays or of the manifest changes
+FORMAT_NAME = "nephropredict-compiled-forest"
+FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+
+# CompiledForest attributes stored as .npy files
+ARRAY_NAMES = ("feature", "threshold", "children", "value", "roots")
+
+# Array files of an artifact, named after their content (or, before that, after the array alone)
+ARRAY_FILE_PATTERN = re.compile(rf"({'|'.join(ARRAY_NAMES)})(-[0-9a-f]+)?\.npy")
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), '../../attached_assets/model_lucien_v1.pkl')
+DEFAULT_ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), '../../attached_assets/model_lucien_v1')
+
+class ArtifactError(ValueError):
+    """Raised when an artifact is missing, incomplete, corrupted or of an unsupported version"""
+
+def file_sha256(path: str) -> str:
+    """Checksum of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_replacing(out_dir: str, suffix: str, write) -> str:
+    """Write a file under a temporary name in out_dir, returning that name, removed if write fails"""
+    path = os.path.join(out_dir, f".export-{os.getpid()}-{secrets.token_hex(8)}{suffix}")
+    try:
+        with open(path, 'xb') as file:
+            write(file)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def export_artifact(forest: CompiledForest, out_dir: str, source_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a compiled forest as an artifact directory
+    
+    Files are never rewritten in place, since loaded artifacts map them:
+    every array goes to a new file named after its checksum, then the
+    manifest is replaced in one rename (what MODEL_WATCH looks at), and the
+    array files it no longer lists are removed.
+    
+    Args:
+        forest: Compiled forest to export
+        out_dir: Destination directory, created if needed
+        source_path: Pickle the forest was compiled from, recorded in the manifest
+    
+    Returns:
+        The manifest written next to the arrays
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {}
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(getattr(forest, name))
+        path = _write_replacing(out_dir, ".npy", lambda file: np.save(file, array, allow_pickle=False))
+        checksum = file_sha256(path)
+        file_name = f"{name}-{checksum[:16]}.npy"
+        os.replace(path, os.path.join(out_dir, file_name))
+        arrays[name] = {
+            "file": file_name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "sha256": checksum
+        }
+    
+    manifest = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "feature_names": FEATURE_NAMES,
+        "classes": [int(c) for c in forest.classes_],
+        "n_estimators": forest.n_estimators,
+        "max_depth": forest.max_depth,
+        "feature_importances": [float(v) for v in getattr(forest, "feature_importances_", [])],
+        "source": {
+            "path": os.path.basename(source_path),
+            "sha256": file_sha256(source_path)
+        } if source_path else None,
+        "arrays": arrays
+    }
+    # Switched last, so an interrupted export leaves the previous artifact whole
+    body = json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+    os.replace(_write_replacing(out_dir, ".json", lambda file: file.write(body)), os.path.join(out_dir, MANIFEST_FILE))
+    
+    listed = {entry["file"] for entry in arrays.values()}
+    for file_name in os.listdir(out_dir):
+        if ARRAY_FILE_PATTERN.fullmatch(file_name) and file_name not in listed:
+            # Mappings of the previous arrays stay valid once they are unlinked
+            os.remove(os.path.join(out_dir, file_name))
+    return manifest
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """
+    Read and validate the manifest of an artifact directory
+    
+    Raises:
+        ArtifactError: if the manifest is missing or describes another format or version
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Cannot read artifact manifest {manifest_path}: {e}")
+    
+    if manifest.get("format") != FORMAT_NAME:
+        raise ArtifactError(f"{manifest_path} is not a {FORMAT_NAME} artifact")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact version {manifest.get('format_version')} (expected {FORMAT_VERSION})"
+        )
+    if manifest.get("feature_names") != FEATURE_NAMES:
+        raise ArtifactError("Artifact was exported for different model features")
+    missing = [name for name in ARRAY_NAMES if name not in manifest.get("arrays", {})]
+    if missing:
+        raise ArtifactError(f"Artifact manifest is missing arrays: {', '.join(missing)}")
+    return manifest
+
+def artifact_version(manifest: Dict[str, Any]) -> str:
+    """Short identifier of an artifact's content, derived from its array checksums"""
+    digest = hashlib.sha256()
+    for name in ARRAY_NAMES:
+        digest.update(manifest["arrays"][name]["sha256"].encode())
+    return digest.hexdigest()[:16]
+
+def load_artifact(path: str, mmap: bool = True, verify: bool = True) -> Tuple[CompiledForest, Dict[str, Any]]:
+    """
+    Load an artifact directory as a CompiledForest
+    
+    Args:
+        path: Artifact directory
+        mmap: Memory-map the arrays read-only instead of reading them into private memory
+        verify: Check every array file against its manifest checksum
+    
+    Returns:
+        The compiled forest and its manifest
+    
+    Raises:
+        ArtifactError: if the artifact is missing, corrupted or of an unsupported version
+    """
+    manifest = read_manifest(path)
+    
+    arrays = {}
+    for name in ARRAY_NAMES:
+        entry = manifest["arrays"][name]
+        array_path = os.path.join(path, entry["file"])
+        if verify and file_sha256(array_path) != entry["sha256"]:
+            raise ArtifactError(f"Checksum mismatch for {array_path}")
+        try:
+            array = np.load(array_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            raise ArtifactError(f"Cannot load {array_path}: {e}")
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise ArtifactError(f"{array_path} does not match its manifest entry")
+        arrays[name] = array
+    
+    importances = manifest.get("feature_importances")
+    forest = CompiledForest(
+        classes=np.asarray(manifest["classes"]),
+        max_depth=int(manifest["max_depth"]),
+        feature_importances=np.asarray(importances, dtype=np.float64) if importances else None,
+        **arrays
+    )
+    return forest, manifest
+
+def _export_command(args: argparse.Namespace):
+    """Compile the pickled model and write it as an artifact"""
+    import pickle
+    
+    with open(args.model, 'rb') as file:
+        sk_model = pickle.load(file)
+    forest = CompiledForest.from_sklearn(sk_model)
+    manifest = export_artifact(forest, args.out, source_path=args.model)
+    print(f"Exported {manifest['n_estimators']} trees ({forest.n_nodes} nodes) to {args.out}")
+
+def _verify_command(args: argparse.Namespace):
+    """Load an artifact with checksum verification"""
+    forest, manifest = load_artifact(args.path, verify=True)
+    print(f"{args.path}: format v{manifest['format_version']}, {forest.n_estimators} trees, checksums OK")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or verify compiled model artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    export_parser = subparsers.add_parser("export", help="compile a pickled forest into an artifact")
+    export_parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="pickled RandomForestClassifier")
+    export_parser.add_argument("--out", default=DEFAULT_ARTIFACT_PATH, help="artifact directory")
+    export_parser.set_defaults(func=_export_command)
+    
+    verify_parser = subparsers.add_parser("verify", help="check an artifact's version and checksums")
+    verify_parser.add_argument("path", nargs="?", default=DEFAULT_ARTIFACT_PATH)
+    verify_parser.set_defaults(func=_verify_command)
+    
+    args = parser.parse_args()
+    args.func(args)
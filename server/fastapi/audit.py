@@ -0,0 +1,306 @@
+"""Audit log of the predictions served, for clinical traceability"""
+import asyncio
+import datetime
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from model import FEATURE_NAMES, PredictionResult
+
+# Seconds before a failed batch is written again
+RETRY_DELAY = 1.0
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        endpoint TEXT NOT NULL,
+        row_index INTEGER,
+        model_version TEXT,
+        inputs TEXT NOT NULL,
+        predicted_stage INTEGER NOT NULL,
+        confidence REAL NOT NULL,
+        stage_probabilities TEXT NOT NULL,
+        fallback INTEGER NOT NULL,
+        latency_ms REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts)"
+)
+
+_COLUMNS = ("id", "ts", "endpoint", "row_index", "model_version", "inputs", "predicted_stage",
+            "confidence", "stage_probabilities", "fallback", "latency_ms")
+
+class AuditLogSaturated(Exception):
+    """Raised when the audit queue stayed full and the request should be retried later"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Audit log queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+@dataclass(frozen=True)
+class AuditEntry:
+    """
+    Predictions of one request, turned into database rows by the writer thread
+    
+    inputs is either the validated feature matrix (one row per result) or
+    a raw payload, records or columns (a /predict/batch body, a chunk of
+    /predict/file), whose rows indices point into. indices are recorded as
+    the row numbers, shifted by row_offset (the rows of a file's earlier
+    chunks); single-row requests have none.
+    """
+    timestamp: float
+    endpoint: str
+    model_version: Optional[str]
+    inputs: Union[np.ndarray, List[Dict[str, Any]], Dict[str, List[Any]]]
+    indices: Optional[Sequence[int]]
+    results: Sequence[PredictionResult]
+    latency_ms: float
+    row_offset: int = 0
+    
+    def __len__(self) -> int:
+        return len(self.results)
+    
+    def _inputs_of(self, position: int) -> Dict[str, Any]:
+        inputs = self.inputs
+        if isinstance(inputs, np.ndarray):
+            return dict(zip(FEATURE_NAMES, inputs[position].tolist()))
+        index = self.indices[position]
+        if isinstance(inputs, dict):
+            return {name: values[index] for name, values in inputs.items() if index < len(values)}
+        return inputs[index]
+    
+    def rows(self) -> List[tuple]:
+        """Values of the database rows, in _COLUMNS order after the id"""
+        return [
+            (
+                self.timestamp,
+                self.endpoint,
+                self.row_offset + self.indices[position] if self.indices is not None else None,
+                self.model_version,
+                json.dumps(self._inputs_of(position), ensure_ascii=False),
+                result.predicted_stage,
+                result.confidence,
+                json.dumps({str(stage): p for stage, p in result.stage_probabilities.items()}),
+                int(result.fallback),
+                self.latency_ms
+            )
+            for position, result in enumerate(self.results)
+        ]
+
+def parse_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    (ts, id) of a page cursor returned by AuditStore.query
+    
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    ts, _, record_id = cursor.partition(":")
+    return float(ts), int(record_id)
+
+def _record(row: Sequence[Any]) -> Dict[str, Any]:
+    record = dict(zip(_COLUMNS, row))
+    record["timestamp"] = datetime.datetime.fromtimestamp(record.pop("ts"), datetime.timezone.utc).isoformat()
+    record["inputs"] = json.loads(record["inputs"])
+    record["stage_probabilities"] = {int(s): p for s, p in json.loads(record["stage_probabilities"]).items()}
+    record["fallback"] = bool(record["fallback"])
+    return record
+
+class AuditStore:
+    """
+    Append-only SQLite table of the prediction records
+    
+    Every call must come from the same thread (the AuditLog's writer).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=10.0)
+            # Readers do not block the writers of the other workers, and a
+            # commit only syncs the log (durable across process crashes)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+            self._connection = connection
+        return self._connection
+    
+    def write(self, entries: Sequence[AuditEntry]) -> int:
+        """Append the records of some entries in one transaction, returning how many were written"""
+        rows = [row for entry in entries for row in entry.rows()]
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                f"INSERT INTO predictions ({', '.join(_COLUMNS[1:])}) VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})",
+                rows
+            )
+        return len(rows)
+    
+    def query(self, since: Optional[float], until: Optional[float], limit: int,
+              before: Optional[Tuple[float, int]] = None, model_version: Optional[str] = None,
+              predicted_stage: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Most recent records first, in [since, until), through the time index
+        
+        Args:
+            before: Cursor of the previous page (see parse_cursor); the
+                records of one batch share their ts, so the id breaks ties
+        
+        Returns:
+            The records and, when the page is full, the cursor of the next one
+        """
+        conditions, parameters = [], []
+        for condition, value in (("ts >= ?", since), ("ts < ?", until), ("model_version = ?", model_version),
+                                 ("predicted_stage = ?", predicted_stage)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        if before is not None:
+            conditions.append("ts <= ? AND (ts < ? OR id < ?)")
+            parameters += [before[0], before[0], before[1]]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM predictions INDEXED BY predictions_ts {where} "
+            "ORDER BY ts DESC, id DESC LIMIT ?",
+            (*parameters, limit)
+        ).fetchall()
+        cursor = f"{rows[-1][1]!r}:{rows[-1][0]}" if len(rows) == limit else None
+        return [_record(row) for row in rows], cursor
+    
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+class AuditLog:
+    """
+    Bounded queue of prediction records flushed in batches by a background task
+    
+    The database is only touched from the writer thread.
+    """
+    def __init__(self, path: str, max_queue: int, batch_size: int, flush_ms: float, queue_timeout: float,
+                 retry_after: int = 1):
+        self._store = AuditStore(path)
+        self._max_queue = max(1, max_queue)
+        self._batch_size = max(1, batch_size)
+        self._flush_s = flush_ms / 1000
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit")
+        self._pending: List[AuditEntry] = []
+        self._queued = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Event] = None
+        self._closing = False
+        self._written = 0
+        self._batches = 0
+        self._waits = 0
+        self._rejected = 0
+        self._errors = 0
+        self._last_error: Optional[str] = None
+    
+    def _start(self):
+        # Started on first use, from the event loop the requests run on
+        self._wakeup, self._room = asyncio.Event(), asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+    
+    async def submit(self, entry: AuditEntry):
+        """
+        Queue the records of a request, waiting while the queue is full
+        
+        Raises:
+            AuditLogSaturated: if the queue stayed full for queue_timeout seconds
+        """
+        if self._task is None:
+            self._start()
+        if self._queued and self._queued + len(entry) > self._max_queue:
+            self._waits += 1
+            deadline = time.monotonic() + self._queue_timeout
+            while self._queued and self._queued + len(entry) > self._max_queue:
+                self._room.clear()
+                try:
+                    await asyncio.wait_for(self._room.wait(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    self._rejected += 1
+                    raise AuditLogSaturated(self._retry_after)
+        self._pending.append(entry)
+        self._queued += len(entry)
+        self._wakeup.set()
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self._queued < self._batch_size and not self._closing:
+                # Let a batch build up, unless it already has
+                try:
+                    await asyncio.wait_for(self._full_batch(), self._flush_s)
+                except asyncio.TimeoutError:
+                    pass
+            batch, queued = self._pending, self._queued
+            self._pending, self._queued = [], 0
+            self._room.set()
+            try:
+                written = await loop.run_in_executor(self._thread, self._store.write, batch)
+            except Exception as e:
+                self._errors += 1
+                self._last_error = str(e)
+                if self._closing:
+                    print(f"Audit log write error at shutdown, {queued} records lost: {e}")
+                    continue
+                print(f"Audit log write error, retrying: {e}")
+                # Written again first, before anything queued since
+                self._pending[:0] = batch
+                self._queued += queued
+                await asyncio.sleep(RETRY_DELAY)
+            else:
+                self._written += written
+                self._batches += 1
+    
+    async def _full_batch(self):
+        while self._queued < self._batch_size and not self._closing:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+    
+    async def query(self, since: Optional[float], until: Optional[float], limit: int,
+                    before: Optional[Tuple[float, int]] = None, model_version: Optional[str] = None,
+                    predicted_stage: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Recent records of the database (from every worker), on the writer thread"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._thread, self._store.query, since, until, limit, before, model_version, predicted_stage
+        )
+    
+    async def close(self):
+        """Write what is still queued and close the database"""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+        await asyncio.get_running_loop().run_in_executor(self._thread, self._store.close)
+        self._thread.shutdown()
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "path": self._store.path,
+            "queued": self._queued,
+            "max_queue": self._max_queue,
+            "written": self._written,
+            "batches": self._batches,
+            "backpressure_waits": self._waits,
+            "rejected": self._rejected,
+            "write_errors": self._errors,
+            "last_error": self._last_error
+        }
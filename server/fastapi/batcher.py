@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from executor import InferenceExecutor, InferenceTiming
+from model import IRCModel, PredictionResult
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-patient predictions into one vectorized model call
+    
+    Requests arriving within window_ms of the first pending one (or until
+    max_batch_size requests are pending) are stacked into a single matrix,
+    scored with one predict_proba call on the inference executor, and each
+    awaiting request gets its own row of the result back.
+    """
+    def __init__(self, model: IRCModel, executor: InferenceExecutor, window_ms: float, max_batch_size: int):
+        self._model = model
+        self._executor = executor
+        self._window = window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._pending: List[Tuple[IRCModel, np.ndarray, float, asyncio.Future, bool]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches = 0
+        self._batched_requests = 0
+    
+    async def predict(self, row: np.ndarray, explain: bool = True,
+                      model: Optional[IRCModel] = None) -> Tuple[PredictionResult, InferenceTiming]:
+        """
+        Queue one patient for the next batch and wait for its result
+        
+        Args:
+            row: Validated (1, n_features) matrix in FEATURE_NAMES order;
+                validation happens before queueing so one bad request cannot
+                fail a whole batch
+            explain: Whether this patient needs feature contributions; they are
+                computed for the whole batch if any of its requests needs them
+            model: Model version to score the patient with (defaults to the
+                batcher's model); requests for different versions are
+                batched separately
+        
+        Returns:
+            The prediction result and its timing; the queue wait includes the
+            time spent waiting for the batch window to close
+        
+        Raises:
+            ExecutorSaturated: if the inference executor rejected the batch
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((model or self._model, row, time.perf_counter(), future, explain))
+        
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Send the pending requests to the executor as one batch per model version"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        batches: Dict[int, List[Tuple[np.ndarray, float, asyncio.Future, bool]]] = {}
+        models: Dict[int, IRCModel] = {}
+        for model, *request in pending:
+            batches.setdefault(id(model), []).append(tuple(request))
+            models[id(model)] = model
+        for key, batch in batches.items():
+            asyncio.ensure_future(self._run_batch(models[key], batch))
+    
+    async def _run_batch(self, model: IRCModel, batch: List[Tuple[np.ndarray, float, asyncio.Future, bool]]):
+        """Score a batch and fan the results back out to the awaiting requests"""
+        matrix = np.vstack([row for row, _, _, _ in batch])
+        explain = any(explain for _, _, _, explain in batch)
+        submitted = time.perf_counter()
+        try:
+            results, timing = await self._executor.run(model.predict_matrix, matrix, explain)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self._batches += 1
+        self._batched_requests += len(batch)
+        for (_, enqueued, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result((result, InferenceTiming(
+                    queue_wait_ms=(submitted - enqueued) * 1000 + timing.queue_wait_ms,
+                    execution_ms=timing.execution_ms
+                )))
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the batching settings and the average batch size so far"""
+        return {
+            "window_ms": self._window * 1000,
+            "max_batch_size": self._max_batch_size,
+            "batches": self._batches,
+            "mean_batch_size": self._batched_requests / self._batches if self._batches else 0.0
+        }
@@ -0,0 +1,259 @@
+"""
+Micro-benchmarks for the prediction service
+
+Usage:
+    python benchmark.py single-pass [--iterations N]
+    python benchmark.py micro-batching [--iterations N] [--concurrency C]
+    python benchmark.py compiled [--iterations N]
+    python benchmark.py processes [--iterations N] [--processes P]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from batcher import MicroBatcher
+from compiled_forest import CompiledForest
+from dataset import load_feature_matrix
+from executor import InferenceExecutor
+from model import FEATURE_NAMES, IRCModel
+from process_pool import ForestPool, PooledForest, artifact_directory
+
+# Patient used by the single-row benchmarks (same as the /predict example)
+EXAMPLE_PATIENT = {
+    "Créatinine (mg/L)": 42.0,
+    "Urée (g/L)": 1.14,
+    "Age": 68,
+    "Na^+ (meq/L)": 142.0,
+    "TA (mmHg)/Systole": 130.0,
+    "Choc de Pointe/Perçu": 0,
+    "Score de Glasgow (/15)": 15.0,
+    "Sexe_M": 1,
+    "Anémie_True": 1,
+    "Enquête Sociale/Tabac_True": 0,
+    "Enquête Sociale/Alcool_True": 1
+}
+
+def time_calls(fn: Callable[[], Any], iterations: int, warmup: int = 5) -> List[float]:
+    """Call fn repeatedly and return the duration of each call in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Summarize call durations (milliseconds)"""
+    ordered = sorted(durations)
+    return {
+        "mean_ms": statistics.mean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    }
+
+def print_summary(label: str, summary: Dict[str, float]):
+    """Print one benchmark line"""
+    print(f"{label:<40} " + "  ".join(f"{k}={v:8.3f}" for k, v in summary.items()))
+
+def _legacy_predict(sk_model: Any, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The previous per-request path: two passes over the forest and a rebuilt importance table"""
+    import pandas as pd
+    
+    df = pd.DataFrame([input_data])
+    predicted_stage = int(sk_model.predict(df)[0])
+    proba = sk_model.predict_proba(df)[0]
+    classes = sk_model.classes_
+    stage_probabilities = {int(classes[i]): float(proba[i]) for i in range(len(classes))}
+    importances = sk_model.feature_importances_
+    feature_importance = {df.columns[i]: float(importances[i]) for i in range(len(df.columns))}
+    total = sum(feature_importance.values())
+    feature_importance = {k: v/total for k, v in feature_importance.items()}
+    return {
+        "predicted_stage": predicted_stage,
+        "stage_probabilities": stage_probabilities,
+        "feature_importance": feature_importance
+    }
+
+def bench_single_pass(args: argparse.Namespace):
+    """Compare the legacy predict + predict_proba path with the single-pass path"""
+    iterations = args.iterations
+    model = IRCModel()
+    sk_model = model._model
+    
+    legacy = _legacy_predict(sk_model, EXAMPLE_PATIENT)
+    current = model.predict(EXAMPLE_PATIENT)
+    assert legacy["predicted_stage"] == current.predicted_stage
+    assert np.allclose(
+        [legacy["stage_probabilities"][c] for c in sorted(legacy["stage_probabilities"])],
+        [current.stage_probabilities[c] for c in sorted(current.stage_probabilities)]
+    )
+    
+    legacy_summary = summarize(time_calls(lambda: _legacy_predict(sk_model, EXAMPLE_PATIENT), iterations))
+    current_summary = summarize(time_calls(lambda: model.predict(EXAMPLE_PATIENT), iterations))
+    
+    print(f"Single-row prediction latency over {iterations} calls")
+    print_summary("predict + predict_proba (legacy)", legacy_summary)
+    print_summary("single-pass predict_proba", current_summary)
+    print(f"Speed-up (p50): {legacy_summary['p50_ms'] / current_summary['p50_ms']:.2f}x")
+
+async def _closed_loop(call: Callable[[Dict[str, Any]], Any], requests: int, concurrency: int) -> Tuple[float, List[float]]:
+    """
+    Issue requests from `concurrency` concurrent clients, each sending its next
+    request as soon as the previous one is answered
+    
+    Returns:
+        The wall-clock duration in seconds and the per-request latencies in milliseconds
+    """
+    latencies: List[float] = []
+    remaining = [requests]
+    
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            await call(EXAMPLE_PATIENT)
+            latencies.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return time.perf_counter() - start, latencies
+
+def bench_micro_batching(args: argparse.Namespace):
+    """Compare throughput and tail latency of /predict's inference with and without micro-batching"""
+    model = IRCModel()
+    
+    async def run():
+        # Large enough queue that no request is rejected during the benchmark
+        executor = InferenceExecutor(max_workers=args.workers, max_queue=args.concurrency)
+        batcher = MicroBatcher(model, executor, window_ms=args.window_ms, max_batch_size=args.max_batch_size)
+        scenarios = [
+            ("unbatched", lambda patient: executor.run(model.predict, patient)),
+            (f"micro-batched ({args.window_ms:g} ms window)", lambda patient: batcher.predict(model.build_feature_row(patient)))
+        ]
+        print(f"{args.iterations} requests from {args.concurrency} concurrent clients, {args.workers} inference threads")
+        for label, call in scenarios:
+            await _closed_loop(call, args.concurrency, args.concurrency)
+            elapsed, latencies = await _closed_loop(call, args.iterations, args.concurrency)
+            summary = summarize(latencies)
+            summary["req_per_s"] = len(latencies) / elapsed
+            print_summary(label, summary)
+        print(f"Mean batch size: {batcher.get_status()['mean_batch_size']:.1f}")
+        executor.shutdown()
+    
+    asyncio.run(run())
+
+def bench_compiled(args: argparse.Namespace):
+    """Check the compiled forest against scikit-learn on the bundled dataset and compare their latency"""
+    sk_model = IRCModel(backend="sklearn")._model
+    compiled = CompiledForest.from_sklearn(sk_model)
+    matrix, _ = load_feature_matrix()
+    
+    expected = sk_model.predict_proba(matrix)
+    actual = compiled.predict_proba(matrix)
+    identical = np.array_equal(expected, actual)
+    print(f"Compiled forest: {compiled.n_estimators} trees, {compiled.n_nodes} nodes, max depth {compiled.max_depth}")
+    print(f"predict_proba identical on {len(matrix)} dataset rows: {identical}")
+    if not identical:
+        raise SystemExit(f"Max absolute difference: {np.abs(expected - actual).max()}")
+    
+    row = matrix[:1]
+    print(f"Single-row latency over {args.iterations} calls")
+    print_summary("sklearn predict_proba", summarize(time_calls(lambda: sk_model.predict_proba(row), args.iterations)))
+    print_summary("compiled predict_proba", summarize(time_calls(lambda: compiled.predict_proba(row), args.iterations)))
+    
+    iterations = max(1, args.iterations // 10)
+    print(f"Batch latency ({len(matrix)} rows) over {iterations} calls")
+    print_summary("sklearn predict_proba", summarize(time_calls(lambda: sk_model.predict_proba(matrix), iterations)))
+    print_summary("compiled predict_proba", summarize(time_calls(lambda: compiled.predict_proba(matrix), iterations)))
+
+def _threaded(call: Callable[[], Any], requests: int, threads: int) -> Tuple[float, List[float]]:
+    """
+    Issue requests from `threads` inference threads, like InferenceExecutor does
+    
+    Returns:
+        The wall-clock duration in seconds and the per-request latencies in milliseconds
+    """
+    def timed():
+        start = time.perf_counter()
+        call()
+        return (time.perf_counter() - start) * 1000
+    
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: timed(), range(requests)))
+        return time.perf_counter() - start, latencies
+
+def bench_processes(args: argparse.Namespace):
+    """Throughput of single-row and batch predict_proba with 1 to N inference worker processes"""
+    model = IRCModel(backend="compiled")
+    forest = model._estimator
+    source = model.get_status()["source"]
+    path = artifact_directory(forest, source)
+    matrix, _ = load_feature_matrix()
+    matrix = matrix[np.isfinite(matrix).all(axis=1)]
+    batch = np.resize(matrix, (args.batch_rows, matrix.shape[1]))
+    row = matrix[:1]
+    expected = forest.predict_proba(batch)
+    
+    counts = sorted({1, *[2 ** i for i in range(1, args.processes.bit_length())], args.processes})
+    print(f"{os.cpu_count()} CPUs; single rows from {args.threads or 'P'} threads, {len(batch)}-row batches")
+    scenarios = [("threads, in process", forest, None)]
+    for count in counts:
+        pool = ForestPool(path, len(FEATURE_NAMES), forest.n_estimators, processes=count, max_rows=args.max_rows,
+                          owns_path=path != source)
+        pool.start()
+        scenarios.append((f"{count} worker process{'es' if count > 1 else ''}", PooledForest(forest, pool), pool))
+    
+    baseline = None
+    for label, scored, pool in scenarios:
+        if not np.array_equal(scored.predict_proba(batch), expected):
+            raise SystemExit(f"{label}: probabilities differ from the compiled forest")
+        threads = args.threads or (pool.get_status()["processes"] if pool is not None else 1)
+        _threaded(lambda: scored.predict_proba(row), threads * 5, threads)
+        elapsed, latencies = _threaded(lambda: scored.predict_proba(row), args.iterations, threads)
+        summary = summarize(latencies)
+        summary["rows_per_s"] = len(latencies) / elapsed
+        batch_elapsed, _ = _threaded(lambda: scored.predict_proba(batch), max(1, args.iterations // 100), 1)
+        summary["batch_rows_per_s"] = max(1, args.iterations // 100) * len(batch) / batch_elapsed
+        if pool is not None and baseline is None:
+            baseline = summary
+        if baseline is not None:
+            summary["speed_up"] = summary["rows_per_s"] / baseline["rows_per_s"]
+        print_summary(f"{label} ({threads} threads)", summary)
+        if pool is not None:
+            pool.stop()
+
+BENCHMARKS = {
+    "compiled": bench_compiled,
+    "processes": bench_processes,
+    "single-pass": bench_single_pass,
+    "micro-batching": bench_micro_batching
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prediction service micro-benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=2, help="inference threads")
+    parser.add_argument("--window-ms", type=float, default=3.0, help="micro-batching window")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="most inference worker processes")
+    parser.add_argument("--threads", type=int, default=0, help="inference threads (default: one per worker process)")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="rows of the batch scenario")
+    parser.add_argument("--max-rows", type=int, default=1024, help="rows per worker process call")
+    args = parser.parse_args()
+    
+    # The pickled model was fitted without feature names and sklearn warns on every DataFrame call
+    warnings.filterwarnings("ignore", category=UserWarning)
+    BENCHMARKS[args.benchmark](args)
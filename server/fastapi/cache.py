@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from model import PredictionResult
+
+CacheKey = bytes
+
+class PredictionCache:
+    """
+    Bounded LRU cache of single-patient predictions
+    
+    Keys are the 11 model features in FEATURE_NAMES order as the float32
+    values the forest compares with its thresholds: patients with the same
+    key take the same paths, so a cached answer is the one the forest would
+    give, and resubmissions of the same panel (form retries, dashboard
+    refreshes) skip it. Entries expire after ttl seconds,
+    the least recently used entry is evicted once max_entries is reached, and
+    the whole cache is dropped when the model version changes.
+    """
+    def __init__(self, max_entries: int, ttl: float):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, PredictionResult]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+    
+    def key(self, row: np.ndarray) -> CacheKey:
+        """
+        Canonical key of a patient
+        
+        Args:
+            row: (1, n_features) matrix in FEATURE_NAMES order, as built by
+                parse_feature_row or IRCModel.build_feature_row
+        """
+        return row[0].astype(np.float32).tobytes()
+    
+    def get(self, key: CacheKey, version: Optional[str], explained: bool = False) -> Optional[PredictionResult]:
+        """
+        Get the cached prediction of a patient for the given model version
+        
+        Args:
+            explained: Only accept a result that includes feature contributions
+        """
+        self._check_version(version)
+        entry = self._entries.get(key)
+        if entry is None or (explained and entry[1].contributions is None):
+            self._misses += 1
+            return None
+        
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self._expirations += 1
+            self._misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return result
+    
+    def put(self, key: CacheKey, version: Optional[str], result: PredictionResult):
+        """Cache a prediction made by the given model version"""
+        # Fallback answers and placeholder models are never cached
+        if version is None or result.fallback:
+            return
+        self._check_version(version)
+        self._entries[key] = (time.monotonic() + self._ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+    
+    def _check_version(self, version: Optional[str]):
+        """Drop every entry when the model has been replaced"""
+        if version != self._version:
+            if self._entries:
+                self._entries.clear()
+                self._invalidations += 1
+            self._version = version
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the cache settings and counters"""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "ttl_s": self._ttl,
+            "model_version": self._version,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "invalidations": self._invalidations
+        }
@@ -0,0 +1,156 @@
+from typing import Any, Optional
+
+import numpy as np
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous NumPy arrays
+    
+    All trees are concatenated into one node table (split feature, threshold,
+    [left, right] children and normalized class distribution of every node),
+    so a batch of rows is evaluated by walking every tree at once, one depth
+    level per step, without going through scikit-learn at request time.
+    
+    predict_proba reproduces RandomForestClassifier.predict_proba bit for bit:
+    inputs are compared as float32 like sklearn does, each tree's leaf
+    distribution is normalized the same way, and the per-tree probabilities
+    are accumulated in estimator order before dividing by the tree count.
+    """
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, classes: np.ndarray, max_depth: int,
+                 feature_importances: Optional[np.ndarray] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        # Flat view: the child of node i is _next[2 * i + went_right]
+        self._next = children.reshape(-1)
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+        # The arrays are never written once compiled: making them read-only
+        # guarantees that workers forked from a preloading master keep sharing them
+        for array in (feature, threshold, children, value, roots):
+            array.setflags(write=False)
+        if feature_importances is not None:
+            # Same attribute name as sklearn, so the model wrapper can read either
+            self.feature_importances_ = feature_importances
+    
+    @classmethod
+    def from_sklearn(cls, forest: Any) -> "CompiledForest":
+        """
+        Compile a fitted single-output RandomForestClassifier
+        
+        Raises:
+            ValueError: if the estimator is not a fitted single-output forest
+        """
+        if not hasattr(forest, "estimators_") or getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Only fitted single-output random forests can be compiled")
+        
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes, dtype=np.intp) + offset
+            
+            # Leaves point to themselves, so extra walking steps leave a row on its leaf
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_left + offset),
+                np.where(is_leaf, node_ids, tree.children_right + offset)
+            ], axis=1))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = np.array(tree.value[:, 0, :forest.n_classes_], dtype=np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            values.append(proba)
+            
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, int(tree.max_depth))
+        
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(forest.classes_),
+            max_depth=max_depth,
+            feature_importances=np.asarray(forest.feature_importances_, dtype=np.float64)
+        )
+    
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+    
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+    
+    @property
+    def nbytes(self) -> int:
+        """Size of the node arrays"""
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.children, self.value, self.roots))
+    
+    @property
+    def memory_mapped(self) -> bool:
+        """Whether the node arrays are mapped from an artifact (and shared between processes)"""
+        return isinstance(self.value, np.memmap)
+    
+    def apply(self, X: np.ndarray, roots: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Find the leaf reached in every tree
+        
+        Args:
+            X: Array of shape (n_rows, n_features)
+            roots: Root nodes of the trees to walk (all of them by default)
+        
+        Returns:
+            Global node ids of shape (n_rows, n_estimators), or (n_rows, len(roots))
+        """
+        # sklearn evaluates splits on float32 inputs
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2D array, got {X.ndim}D")
+        # Like sklearn, refuse values for which the split comparisons are meaningless
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        
+        n_rows, n_features = X.shape
+        flat = X.reshape(-1)
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, np.newaxis]
+        roots = self.roots if roots is None else roots
+        nodes = np.repeat(roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            went_right = flat[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self._next[2 * nodes + went_right]
+        return nodes
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities of every row, identical to the source forest's predict_proba
+        
+        Args:
+            X: Array of shape (n_rows, n_features)
+        
+        Returns:
+            Array of shape (n_rows, n_classes)
+        """
+        leaves = self.apply(X)
+        # (n_estimators, n_rows, n_classes): reducing over the first axis adds
+        # whole per-tree slices one after the other, in estimator order
+        per_tree = self.value[leaves.T]
+        proba = np.add.reduce(per_tree, axis=0)
+        proba /= self.n_estimators
+        return proba
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Most probable class of every row"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,196 @@
+"""Negotiated gzip/brotli compression of large responses"""
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Media types worth compressing (images, archives... already are)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Encodings in order of preference, when available
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Encodings of an Accept-Encoding header with their quality values"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, parameters = item.strip().partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The preferred available encoding the client accepts, None for the identity"""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+class Encoder:
+    """Incremental compressor of one response body"""
+    def __init__(self, encoding: str, gzip_level: int = 6, brotli_quality: int = 4):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        elif encoding == "gzip":
+            self._brotli = None
+            # wbits 16 + 15: a gzip header and trailer around the deflate stream
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+    
+    def compress(self, data: bytes, finish: bool) -> bytes:
+        """Compress a chunk, flushed so the client can decode it at once, or the last chunk"""
+        if self._brotli is not None:
+            return self._brotli.process(data) + (self._brotli.finish() if finish else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """Compress a whole body"""
+    return Encoder(encoding, gzip_level, brotli_quality).compress(data, finish=True)
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the encoded representation of a response with a strong ETag"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """
+    Whether an If-None-Match header names one of the current ETags
+    
+    Weak comparison, as RFC 9110 prescribes for If-None-Match; the encoded
+    forms of the ETags (see encoded_etag) match as well.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = set()
+    for etag in etags:
+        current.add(etag)
+        current.update(encoded_etag(etag, encoding) for encoding in ("br", "gzip"))
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) in current for tag in candidates)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing large responses with the negotiated encoding
+    
+    Responses that already have a Content-Encoding, are not compressible,
+    have no body (204, 304, HEAD) or are smaller than minimum_size are sent
+    unchanged; compressible ones always get "Vary: Accept-Encoding".
+    """
+    def __init__(self, app, minimum_size: int = 2048, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = None
+        if scope["method"] != "HEAD":
+            for name, value in scope["headers"]:
+                if name == b"accept-encoding":
+                    encoding = negotiate(value.decode("latin-1"))
+                    break
+        start = None
+        encoder: Optional[Encoder] = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk tells whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if encoder is not None:
+                more_body = message.get("more_body", False)
+                body = encoder.compress(message.get("body", b""), finish=not more_body)
+                if body or not more_body:
+                    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            
+            # First body chunk
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = _Headers(start["headers"])
+            compressible = (
+                start["status"] not in (204, 304)
+                and headers.get(b"content-encoding") is None
+                and is_compressible(headers.get(b"content-type") or "")
+            )
+            if compressible:
+                headers.add_vary()
+            if not compressible or encoding is None or (not more_body and len(body) < self.minimum_size):
+                passthrough = True
+                start["headers"] = headers.raw
+                await send(start)
+                await send(message)
+                return
+            
+            encoder = Encoder(encoding, self.gzip_level, self.brotli_quality)
+            body = encoder.compress(body, finish=not more_body)
+            headers.set(b"content-encoding", encoding)
+            etag = headers.get(b"etag")
+            if etag is not None:
+                headers.set(b"etag", encoded_etag(etag, encoding))
+            if more_body:
+                headers.remove(b"content-length")
+            else:
+                headers.set(b"content-length", str(len(body)))
+            start["headers"] = headers.raw
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        
+        await self.app(scope, receive, send_compressed)
+
+class _Headers:
+    """Minimal editor of the raw (name, value) header list of an ASGI response start"""
+    def __init__(self, raw: Iterable):
+        self.raw: List = list(raw)
+    
+    def get(self, name: bytes) -> Optional[str]:
+        for key, value in self.raw:
+            if key.lower() == name:
+                return value.decode("latin-1")
+        return None
+    
+    def remove(self, name: bytes):
+        self.raw = [(key, value) for key, value in self.raw if key.lower() != name]
+    
+    def set(self, name: bytes, value: str):
+        self.remove(name)
+        self.raw.append((name, value.encode("latin-1")))
+    
+    def add_vary(self):
+        vary = self.get(b"vary")
+        if vary is None:
+            self.set(b"vary", "Accept-Encoding")
+        elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+            self.set(b"vary", f"{vary}, Accept-Encoding")
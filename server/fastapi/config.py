@@ -0,0 +1,177 @@
+import os
+
+# Runtime configuration for the FastAPI service.
+# Every setting can be overridden through an environment variable of the same name,
+# in the same way PORT, HOST and WORKERS are configured in start_production.sh.
+
+# Maximum number of patients accepted by a single /predict/batch call
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "5000"))
+
+# Threads running model inference outside of the asyncio event loop
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+
+# Requests allowed to wait for an inference thread before new ones get a 503
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "32"))
+
+# Retry-After value (seconds) sent with 503 responses when the queue is full
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", "1"))
+
+# Coalesce concurrent /predict requests into vectorized batches (1 to enable)
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "0") == "1"
+
+# How long the first request of a batch waits for others to join it
+MICRO_BATCH_WINDOW_MS = float(os.environ.get("MICRO_BATCH_WINDOW_MS", "3"))
+
+# A batch is sent as soon as it holds this many requests
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "64"))
+
+# Inference backend: "sklearn" calls the pickled forest, "compiled" evaluates
+# the same trees from flat NumPy arrays without going through scikit-learn,
+# "process" walks them on a pool of worker processes (see process_pool.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "sklearn")
+
+# Compiled model artifact directory (see artifact.py). When set, the model is
+# memory-mapped from it instead of being unpickled; empty to use the pickle file
+MODEL_ARTIFACT = os.environ.get("MODEL_ARTIFACT", "")
+
+# Check the artifact's array checksums when loading it (1 to enable)
+MODEL_ARTIFACT_VERIFY = os.environ.get("MODEL_ARTIFACT_VERIFY", "1") == "1"
+
+# Load the model once in the gunicorn master and fork the workers from it (1 to enable)
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "1") == "1"
+
+# Seconds the gunicorn master waits for a background-loading model before forking
+PRELOAD_TIMEOUT = float(os.environ.get("PRELOAD_TIMEOUT", "120"))
+
+# Synthetic predictions run after loading the model, before it is marked ready
+WARMUP_ROUNDS = int(os.environ.get("WARMUP_ROUNDS", "3"))
+
+# Rows of the synthetic warm-up batch
+WARMUP_BATCH_SIZE = int(os.environ.get("WARMUP_BATCH_SIZE", "64"))
+
+# Handling of predictions received before the model is ready:
+# "wait" up to NOT_READY_TIMEOUT then 503, "reject" with 503 immediately,
+# or "fallback" to the creatinine rule with "fallback": true in the response
+NOT_READY_POLICY = os.environ.get("NOT_READY_POLICY", "wait")
+
+# Seconds a request waits for the model under the "wait" policy
+NOT_READY_TIMEOUT = float(os.environ.get("NOT_READY_TIMEOUT", "10"))
+
+# Retry-After value (seconds) sent with 503 responses while the model is not ready
+NOT_READY_RETRY_AFTER = int(os.environ.get("NOT_READY_RETRY_AFTER", "5"))
+
+# Cache /predict results of identical patients in each worker (1 to enable)
+PREDICTION_CACHE = os.environ.get("PREDICTION_CACHE", "0") == "1"
+
+# Maximum number of cached patients; the least recently used one is evicted first
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))
+
+# Seconds a cached prediction stays valid
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "300"))
+
+# Precompute per-node contributions at load time so predictions can include
+# per-patient feature contributions (1 to enable)
+EXPLANATIONS = os.environ.get("EXPLANATIONS", "1") == "1"
+
+# Rows scored per model call by score.py and the /predict/file endpoint
+SCORING_CHUNK_SIZE = int(os.environ.get("SCORING_CHUNK_SIZE", "5000"))
+
+# Expose request counts and per-stage latency histograms on /metrics (0 to disable)
+METRICS = os.environ.get("METRICS", "1") == "1"
+
+# Pickled model loaded at startup (and by reloads that do not name a source)
+MODEL_PATH = os.environ.get(
+    "MODEL_PATH", os.path.join(os.path.dirname(__file__), "../../attached_assets/model_lucien_v1.pkl")
+)
+
+# Model versions kept resident per worker for pinning and instant rollback,
+# the active one included
+MODEL_VERSIONS = int(os.environ.get("MODEL_VERSIONS", "2"))
+
+# Reload the model when MODEL_ARTIFACT (or MODEL_PATH) changes on disk (1 to enable)
+MODEL_WATCH = os.environ.get("MODEL_WATCH", "0") == "1"
+
+# Seconds between two checks of the watched model file
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "5"))
+
+# Token expected in the X-Admin-Token header of the /admin endpoints;
+# they are not exposed when it is empty
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Secondary model (pickle file or artifact directory) scoring /predict traffic
+# in the background for comparison with the primary one; empty to disable
+SHADOW_MODEL = os.environ.get("SHADOW_MODEL", "")
+
+# Threads and queued calls of the shadow pool; shadow work beyond that is dropped
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", "1"))
+SHADOW_QUEUE_DEPTH = int(os.environ.get("SHADOW_QUEUE_DEPTH", "16"))
+
+# Fraction of /predict requests also sent to the shadow model
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "1.0"))
+
+# Monitor the distribution of the features received by /predict against the
+# training CSV (1 to enable, 0 to disable)
+DRIFT_MONITOR = os.environ.get("DRIFT_MONITOR", "1") == "1"
+
+# Rows per histogram window of the drift monitor (scores cover the current
+# and the previous window)
+DRIFT_WINDOW = int(os.environ.get("DRIFT_WINDOW", "1000"))
+
+# Histogram bins per feature, cut at quantiles of the training data
+DRIFT_BINS = int(os.environ.get("DRIFT_BINS", "10"))
+
+# Patients whose trajectory is kept per worker for visit appends; the least
+# recently used one is evicted first
+TRAJECTORY_STORE_SIZE = int(os.environ.get("TRAJECTORY_STORE_SIZE", "10000"))
+
+# Maximum number of visits in a patient's trajectory
+TRAJECTORY_MAX_VISITS = int(os.environ.get("TRAJECTORY_MAX_VISITS", "1000"))
+
+# Server worker processes sharing the traffic: kept trajectories live in each
+# worker, so visit appends are refused with more than one. gunicorn.conf.py
+# sets it from the gunicorn workers; WORKERS otherwise
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS") or os.environ.get("WORKERS") or "1")
+
+# Maximum number of grid points scored by one /predict/sensitivity call
+SENSITIVITY_MAX_POINTS = int(os.environ.get("SENSITIVITY_MAX_POINTS", "10000"))
+
+# Compress responses of COMPRESSION_MIN_SIZE bytes or more with the encoding
+# the client accepts: brotli (if the brotli package is installed) or gzip
+# (1 to enable)
+COMPRESSION = os.environ.get("COMPRESSION", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "2048"))
+
+# gzip level (1-9) and brotli quality (0-11): higher compresses more, slower
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# SQLite database recording every prediction served (by /predict, the batch,
+# file and trajectory endpoints, visit appends and the patient's own row of a
+# sensitivity sweep) with its inputs, model version and latency (empty to
+# disable); shared by the workers
+AUDIT_LOG = os.environ.get("AUDIT_LOG", "")
+
+# Records queued in memory per worker before requests wait for the writer
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+
+# Records written per transaction, and how long the writer waits for a batch
+# to fill before writing what it has
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_MS = float(os.environ.get("AUDIT_FLUSH_MS", "200"))
+
+# Seconds a request waits for room in a full queue before failing with 503
+AUDIT_QUEUE_TIMEOUT = float(os.environ.get("AUDIT_QUEUE_TIMEOUT", "5"))
+
+# Worker processes of each server worker for the "process" inference backend
+# (0 to divide the CPUs between the gunicorn workers, at least one each).
+# Give INFERENCE_WORKERS at least as many threads
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+
+# Rows a worker process walks per call; larger batches are split across workers
+INFERENCE_PROCESS_MAX_ROWS = int(os.environ.get("INFERENCE_PROCESS_MAX_ROWS", "1024"))
+
+# Seconds before a worker process that does not answer is replaced
+INFERENCE_PROCESS_TIMEOUT = float(os.environ.get("INFERENCE_PROCESS_TIMEOUT", "10"))
+
+# Seconds between two pings of the idle worker processes
+INFERENCE_PROCESS_HEALTH_INTERVAL = float(os.environ.get("INFERENCE_PROCESS_HEALTH_INTERVAL", "5"))
@@ -0,0 +1,53 @@
+import csv
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from model import FEATURE_NAMES
+
+# Training data bundled with the model
+DATASET_PATH = os.path.join(os.path.dirname(__file__), '../../attached_assets/dataset-modelisation-hackathon-vf.csv')
+
+# Target column of the training data
+TARGET_COLUMN = "Stage de l'IRC"
+
+# Raw dataset columns renamed to the one-hot feature the model expects
+RAW_COLUMN_MAP = {
+    'Sexe': 'Sexe_M',
+    'Anémie': 'Anémie_True',
+    'Enquête Sociale/Tabac': 'Enquête Sociale/Tabac_True',
+    'Enquête Sociale/Alcool': 'Enquête Sociale/Alcool_True'
+}
+
+def load_feature_matrix(path: str = DATASET_PATH) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Load a dataset shaped like the training CSV as a model feature matrix
+    
+    Read with the csv module rather than pandas, which the API would otherwise
+    import at startup only for this (empty cells become NaN).
+    
+    Returns:
+        The (n_rows, n_features) matrix in FEATURE_NAMES order, and the target
+        stages if the file has a target column
+    
+    Raises:
+        ValueError: if a model feature is missing from the header
+    """
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        reader = csv.reader(file)
+        header = [RAW_COLUMN_MAP.get(name, name) for name in next(reader)]
+        missing = [name for name in FEATURE_NAMES if name not in header]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        rows = [[float(value) if value.strip() else math.nan for value in row] for row in reader if row]
+    
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), len(header))
+    matrix = table[:, [header.index(name) for name in FEATURE_NAMES]]
+    target = None
+    if TARGET_COLUMN in header:
+        target = table[:, header.index(TARGET_COLUMN)]
+        if not np.isnan(target).any():
+            target = target.astype(np.int64)
+    return matrix, target
@@ -0,0 +1,196 @@
+"""Streaming monitor of the feature distributions received by /predict"""
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from model import FEATURE_NAMES
+
+# PSI above which a feature is reported as drifting, or worth a look
+PSI_DRIFT = 0.25
+PSI_WARNING = 0.1
+
+# Share given to empty bins so the PSI stays finite
+_EPSILON = 1e-4
+
+# Rows buffered before being folded into the statistics
+FOLD_ROWS = 64
+
+def _bin_edges(values: np.ndarray, bins: int) -> np.ndarray:
+    """Inner bin edges of a reference column: midpoints for discrete features, quantiles otherwise"""
+    unique = np.unique(values)
+    if len(unique) <= bins:
+        return (unique[:-1] + unique[1:]) / 2
+    return np.unique(np.quantile(values, np.arange(1, bins) / bins))
+
+def _proportions(counts: np.ndarray) -> np.ndarray:
+    """Bin shares of histograms, with empty bins floored at _EPSILON"""
+    totals = counts.sum(axis=-1, keepdims=True)
+    shares = counts / np.maximum(totals, 1)
+    shares = np.maximum(shares, _EPSILON)
+    return shares / shares.sum(axis=-1, keepdims=True)
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return round(float(value), digits) if math.isfinite(value) else None
+
+class FeatureReference:
+    """Training distribution of the model features, binned for the drift scores"""
+    def __init__(self, matrix: np.ndarray, bins: int):
+        n_features = matrix.shape[1]
+        edges = [_bin_edges(matrix[:, j], bins) for j in range(n_features)]
+        self.n_bins = max(len(e) for e in edges) + 1
+        # Padded with +inf so every feature is binned by the same comparison
+        self.edges = np.full((n_features, self.n_bins - 1), np.inf)
+        for j, e in enumerate(edges):
+            self.edges[j, :len(e)] = e
+        self.used_bins = np.array([len(e) + 1 for e in edges])
+        
+        bin_index = (matrix[:, :, None] >= self.edges[None, :, :]).sum(axis=2)
+        self.counts = np.zeros((n_features, self.n_bins))
+        for j in range(n_features):
+            self.counts[j] = np.bincount(bin_index[:, j], minlength=self.n_bins)
+        self.proportions = _proportions(self.counts)
+        self.rows = matrix.shape[0]
+        self.mean = matrix.mean(axis=0)
+        self.std = matrix.std(axis=0, ddof=1) if matrix.shape[0] > 1 else np.zeros(n_features)
+        self.min = matrix.min(axis=0)
+        self.max = matrix.max(axis=0)
+    
+    @classmethod
+    def from_csv(cls, path: Optional[str] = None, bins: int = 10) -> "FeatureReference":
+        """Reference distribution of a dataset shaped like the training CSV (the training CSV by default)"""
+        from dataset import DATASET_PATH, load_feature_matrix
+        
+        matrix, _ = load_feature_matrix(path or DATASET_PATH)
+        return cls(matrix[np.isfinite(matrix).all(axis=1)], bins)
+
+class DriftMonitor:
+    """Running statistics of the live feature rows, compared with a reference"""
+    def __init__(self, reference: FeatureReference, window: int, min_rows: int = 100):
+        self.reference = reference
+        self._window = max(1, window)
+        self._min_rows = min_rows
+        n_features = len(FEATURE_NAMES)
+        # Position of each feature's first bin in a flattened histogram
+        self._offsets = np.arange(n_features) * reference.n_bins
+        self._pending = np.empty((FOLD_ROWS, n_features))
+        self.reset()
+    
+    def reset(self):
+        """Forget every row seen so far (e.g. once a site's units have been fixed)"""
+        n_features = len(FEATURE_NAMES)
+        self._started_at = time.time()
+        self._rows = 0
+        self._mean = np.zeros(n_features)
+        self._m2 = np.zeros(n_features)
+        self._min = np.full(n_features, np.inf)
+        self._max = np.full(n_features, -np.inf)
+        self._below = np.zeros(n_features, dtype=np.int64)
+        self._above = np.zeros(n_features, dtype=np.int64)
+        # Current and previous window of the histograms
+        self._histograms = np.zeros((2, n_features, self.reference.n_bins), dtype=np.int64)
+        self._current = 0
+        self._window_rows = 0
+        self._n_pending = 0
+    
+    def observe(self, row: np.ndarray):
+        """Add a (1, n_features) feature row to the statistics"""
+        self._pending[self._n_pending] = row[0]
+        self._n_pending += 1
+        if self._n_pending == FOLD_ROWS:
+            self._fold()
+    
+    def _fold(self):
+        """Merge the buffered rows into the running statistics"""
+        block = self._pending[:self._n_pending]
+        self._n_pending = 0
+        n = len(block)
+        if n == 0:
+            return
+        reference = self.reference
+        
+        # Chan et al.: combine the running and the block mean and variance
+        total = self._rows + n
+        block_mean = block.mean(axis=0)
+        delta = block_mean - self._mean
+        self._m2 += ((block - block_mean) ** 2).sum(axis=0) + delta ** 2 * (self._rows * n / total)
+        self._mean += delta * (n / total)
+        self._rows = total
+        np.minimum(self._min, block.min(axis=0), out=self._min)
+        np.maximum(self._max, block.max(axis=0), out=self._max)
+        self._below += (block < reference.min).sum(axis=0)
+        self._above += (block > reference.max).sum(axis=0)
+        
+        bins = (block[:, :, None] >= reference.edges).sum(axis=2) + self._offsets
+        while len(bins):
+            if self._window_rows == self._window:
+                self._current ^= 1
+                self._histograms[self._current] = 0
+                self._window_rows = 0
+            part, bins = np.split(bins, [self._window - self._window_rows])
+            self._histograms[self._current] += np.bincount(
+                part.ravel(), minlength=self._histograms[0].size
+            ).reshape(self._histograms[0].shape)
+            self._window_rows += len(part)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the live statistics and drift scores of every feature"""
+        self._fold()
+        reference = self.reference
+        counts = self._histograms.sum(axis=0)
+        window_rows = int(counts[0].sum())
+        live = _proportions(counts)
+        psi = ((live - reference.proportions) * np.log(live / reference.proportions)).sum(axis=1)
+        ks = np.abs(np.cumsum(live, axis=1) - np.cumsum(reference.proportions, axis=1)).max(axis=1)
+        std = np.sqrt(self._m2 / (self._rows - 1)) if self._rows > 1 else np.full(len(FEATURE_NAMES), np.nan)
+        scored = window_rows >= self._min_rows
+        
+        features: List[Dict[str, Any]] = []
+        for j, name in enumerate(FEATURE_NAMES):
+            used = reference.used_bins[j]
+            if not scored:
+                status = "insufficient_data"
+            elif psi[j] >= PSI_DRIFT:
+                status = "drift"
+            elif psi[j] >= PSI_WARNING:
+                status = "warning"
+            else:
+                status = "ok"
+            features.append({
+                "feature": name,
+                "status": status,
+                "psi": _round(psi[j]) if scored else None,
+                "ks": _round(ks[j]) if scored else None,
+                "live": {
+                    "mean": _round(self._mean[j]) if self._rows else None,
+                    "std": _round(std[j]),
+                    "min": _round(self._min[j]),
+                    "max": _round(self._max[j]),
+                    "below_reference_min": int(self._below[j]),
+                    "above_reference_max": int(self._above[j]),
+                    "histogram": counts[j, :used].tolist()
+                },
+                "reference": {
+                    "mean": _round(reference.mean[j]),
+                    "std": _round(reference.std[j]),
+                    "min": _round(reference.min[j]),
+                    "max": _round(reference.max[j]),
+                    "histogram": reference.counts[j, :used].astype(int).tolist()
+                },
+                "mean_ratio": _round(self._mean[j] / reference.mean[j])
+                if self._rows and reference.mean[j] != 0 else None,
+                "bin_edges": [_round(e, 6) for e in reference.edges[j, :used - 1]]
+            })
+        
+        return {
+            "rows": self._rows,
+            "window_rows": window_rows,
+            "window_size": self._window,
+            "min_rows": self._min_rows,
+            "since": self._started_at,
+            "reference_rows": reference.rows,
+            "drifting": [f["feature"] for f in features if f["status"] == "drift"],
+            "thresholds": {"psi_warning": PSI_WARNING, "psi_drift": PSI_DRIFT},
+            "features": features
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+class ExecutorSaturated(Exception):
+    """Raised when the inference queue is full and the request should be retried later"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+@dataclass(frozen=True)
+class InferenceTiming:
+    """Time a call spent waiting for a worker and running on it, in milliseconds"""
+    queue_wait_ms: float
+    execution_ms: float
+    
+    def to_headers(self) -> Dict[str, str]:
+        """Response headers exposing the timing of the call"""
+        return {
+            "X-Queue-Wait-Ms": f"{self.queue_wait_ms:.3f}",
+            "X-Inference-Ms": f"{self.execution_ms:.3f}",
+            "Server-Timing": f"queue;dur={self.queue_wait_ms:.3f}, inference;dur={self.execution_ms:.3f}"
+        }
+
+class InferenceExecutor:
+    """
+    Run CPU-bound inference on a thread pool instead of the asyncio event loop
+    
+    While a prediction runs, the event loop keeps serving /health and
+    /model/status. At most max_workers calls run at once and max_queue more
+    may wait; beyond that, run() fails fast with ExecutorSaturated instead of
+    letting requests pile up until the gunicorn worker times out.
+    """
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int = 1):
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._rejected = 0
+    
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Tuple[Any, InferenceTiming]:
+        """
+        Run fn(*args) on the pool
+        
+        Returns:
+            The result of the call and its timing
+        
+        Raises:
+            ExecutorSaturated: if max_workers + max_queue calls are already pending
+        """
+        if self._pending >= self._max_workers + self._max_queue:
+            self._rejected += 1
+            raise ExecutorSaturated(self._retry_after)
+        
+        submitted = time.perf_counter()
+        
+        def timed_call():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started, time.perf_counter()
+        
+        future = self._pool.submit(timed_call)
+        self._pending += 1
+        # Released when the call is over, not when the request stops waiting
+        # for it: a cancelled request's call still holds its thread (only a
+        # call still queued is dropped, when the cancellation reaches it)
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._release_soon(loop))
+        result, started, finished = await asyncio.wrap_future(future)
+        
+        return result, InferenceTiming(
+            queue_wait_ms=(started - submitted) * 1000,
+            execution_ms=(finished - started) * 1000
+        )
+    
+    def _release_soon(self, loop: asyncio.AbstractEventLoop):
+        # Done callbacks run on the pool thread that ran the call
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop already closed, at shutdown
+            pass
+    
+    def _release(self):
+        self._pending -= 1
+    
+    @property
+    def busy(self) -> bool:
+        """Whether every worker is taken, so new calls would have to queue"""
+        return self._pending >= self._max_workers
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the current load of the executor"""
+        return {
+            "max_workers": self._max_workers,
+            "max_queue": self._max_queue,
+            "pending": self._pending,
+            "rejected": self._rejected
+        }
+    
+    def shutdown(self):
+        """Stop the worker threads once the running calls are finished"""
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,72 @@
+import numpy as np
+
+from compiled_forest import CompiledForest
+
+class TreeExplainer:
+    """
+    Per-patient feature contributions of a random forest (Saabas method)
+    
+    Along the decision path of a row, every split moves the class distribution
+    from the parent's value to the child's: that delta is credited to the
+    feature the parent split on. For every tree,
+        
+        predict_proba(row) = value(root) + sum of the deltas along the path
+    
+    so averaging over the trees splits each probability into a bias (the
+    training class distribution) plus one contribution per feature.
+    
+    The deltas are summed once at load time into a cumulative table holding,
+    for every node, the contributions accumulated from its root. Explaining a
+    row is then the same depth-bounded walk as predict_proba (to find the
+    leaves) and one lookup per tree.
+    """
+    # Rows explained per block, bounding the (rows, trees, features, classes) gather
+    CHUNK_SIZE = 64
+    
+    def __init__(self, forest: CompiledForest, n_features: int):
+        self._forest = forest
+        self.n_features = n_features
+        n_nodes, n_classes = forest.value.shape
+        self.bias = forest.value[forest.roots].mean(axis=0)
+        
+        # Parents have smaller ids than their children within each tree, but
+        # the table is filled one depth level at a time, without relying on it
+        path = np.zeros((n_nodes, n_features, n_classes), dtype=np.float64)
+        frontier = np.asarray(forest.roots, dtype=np.intp)
+        for _ in range(forest.max_depth):
+            left, right = forest.children[frontier, 0], forest.children[frontier, 1]
+            internal = left != frontier
+            if not internal.any():
+                break
+            parents = frontier[internal]
+            split_feature = forest.feature[parents]
+            for child in (left[internal], right[internal]):
+                path[child] = path[parents]
+                path[child, split_feature] += forest.value[child] - forest.value[parents]
+            frontier = np.concatenate([left[internal], right[internal]])
+        path.setflags(write=False)
+        self._path = path
+    
+    @property
+    def nbytes(self) -> int:
+        """Size of the cumulative contribution table"""
+        return self._path.nbytes
+    
+    def contributions(self, X: np.ndarray) -> np.ndarray:
+        """
+        Feature contributions of every row to every class probability
+        
+        Args:
+            X: Array of shape (n_rows, n_features)
+        
+        Returns:
+            Array of shape (n_rows, n_features, n_classes); adding self.bias to
+            the sum over features gives predict_proba(X)
+        """
+        leaves = self._forest.apply(X)
+        n_trees = self._forest.n_estimators
+        result = np.empty((len(leaves), self.n_features, self._path.shape[2]), dtype=np.float64)
+        for start in range(0, len(leaves), self.CHUNK_SIZE):
+            block = leaves[start:start + self.CHUNK_SIZE]
+            result[start:start + len(block)] = self._path[block].sum(axis=1) / n_trees
+        return result
@@ -0,0 +1,26 @@
+"""JSON encoding and decoding for the request hot paths"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data: bytes) -> Any:
+    """
+    Parse a JSON document
+    
+    Raises:
+        json.JSONDecodeError: if the document is not valid JSON (orjson's
+            error is a subclass of it)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any) -> bytes:
+    """Serialize JSON-native data (dicts, lists, str, int, float, bool, None) to UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
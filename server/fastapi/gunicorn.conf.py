@@ -0,0 +1,31 @@
+# Gunicorn settings shared by start_production.sh and render_start.sh.
+# Command-line options (workers, bind, timeout...) still take precedence.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Module-level names are read as gunicorn settings, so only import the values
+from config import PRELOAD_MODEL, PRELOAD_TIMEOUT
+
+# Import the app, and so load the model, once in the master before forking workers
+preload_app = PRELOAD_MODEL
+
+def when_ready(server):
+    """Wait for the preloaded model and freeze the heap the workers will share"""
+    # Inherited by the workers: per-worker state such as kept trajectories
+    # is only consistent with a single one. The config module of a preloaded
+    # app was imported before the worker count was known
+    import config
+    
+    os.environ["SERVER_WORKERS"] = str(server.cfg.workers)
+    config.SERVER_WORKERS = server.cfg.workers
+    if not server.cfg.preload_app:
+        return
+    import preload
+    
+    app = server.app.wsgi()
+    if preload.prepare_for_fork(app.state.model, PRELOAD_TIMEOUT):
+        server.log.info("Model preloaded in master %s, forking workers", os.getpid())
+    else:
+        server.log.warning("Model not ready after %ss, workers will finish loading it", PRELOAD_TIMEOUT)
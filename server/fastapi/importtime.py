@@ -0,0 +1,179 @@
+"""
+Import-time budget of the API process
+
+Usage:
+    python importtime.py [MODULE] [--artifact DIR] [--budget-ms MS] [--forbid PKG ...]
+                         [--runs N] [--top N] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+# Packages the inference path must not import
+FORBIDDEN_PACKAGES = ("pandas", "sklearn", "scipy", "matplotlib")
+
+# Budget of the whole import, model loading included
+DEFAULT_BUDGET_MS = 3000.0
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S.*)$")
+
+@dataclass
+class ImportRecord:
+    """One line of -X importtime: a module with its own and cumulative import time"""
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    # Module whose import triggered this one, None for top-level imports
+    parent: Optional[str] = None
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """
+    Parse the -X importtime lines of an interpreter's stderr
+    
+    A module is printed once its import finishes, after the modules it
+    imported, which are indented one level deeper.
+    """
+    records = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    
+    # Walking backwards, every module comes before those it imported
+    importers: List[ImportRecord] = []
+    for record in reversed(records):
+        del importers[record.depth:]
+        record.parent = importers[-1].name if importers else None
+        importers.append(record)
+    return records
+
+def import_chain(records: Sequence[ImportRecord], record: ImportRecord) -> List[str]:
+    """Modules from a top-level import down to the given one"""
+    by_name = {r.name: r for r in records}
+    chain = [record.name]
+    while record.parent is not None and record.parent in by_name:
+        record = by_name[record.parent]
+        chain.append(record.name)
+    return chain[::-1]
+
+def measure(module: str, env: Dict[str, str]) -> List[ImportRecord]:
+    """
+    Import a module in a fresh interpreter and return its import timings
+    
+    Raises:
+        RuntimeError: if the import fails
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not _LINE.match(line)]
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(errors[-20:]))
+    return parse_importtime(process.stderr)
+
+def analyze(records: List[ImportRecord], budget_ms: float, forbidden: Sequence[str], top: int) -> Dict[str, Any]:
+    """Summarize the timings of one import and check them against the budget"""
+    total_ms = sum(r.cumulative_us for r in records if r.depth == 0) / 1000
+    packages: Dict[str, int] = defaultdict(int)
+    for record in records:
+        packages[record.name.split(".")[0]] += record.self_us
+    
+    violations = []
+    for package in forbidden:
+        imported = [r for r in records if r.name == package or r.name.startswith(package + ".")]
+        if imported:
+            # The outermost module of the package is the one another package imported
+            first = min(imported, key=lambda r: r.depth)
+            violations.append({
+                "package": package,
+                "chain": import_chain(records, first),
+                "cumulative_ms": round(first.cumulative_us / 1000, 1)
+            })
+    
+    slowest = sorted(records, key=lambda r: r.self_us, reverse=True)[:top]
+    return {
+        "total_ms": round(total_ms, 1),
+        "budget_ms": budget_ms,
+        "over_budget": budget_ms > 0 and total_ms > budget_ms,
+        "modules": len(records),
+        "forbidden_imports": violations,
+        "slowest_modules": [
+            {"module": r.name, "self_ms": round(r.self_us / 1000, 1), "cumulative_ms": round(r.cumulative_us / 1000, 1),
+             "imported_by": r.parent}
+            for r in slowest
+        ],
+        "slowest_packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ]
+    }
+
+def format_report(module: str, report: Dict[str, Any]) -> str:
+    """Human-readable summary of analyze()"""
+    lines = [f"import {module}: {report['total_ms']:.0f} ms over {report['modules']} modules"
+             + (f" (budget {report['budget_ms']:.0f} ms)" if report["budget_ms"] > 0 else "")]
+    lines.append("\nSlowest packages (own time of all their modules):")
+    lines += [f"  {p['self_ms']:8.1f} ms  {p['package']}" for p in report["slowest_packages"]]
+    lines.append("\nSlowest modules (own time, cumulative, imported by):")
+    lines += [
+        f"  {m['self_ms']:8.1f} ms  {m['cumulative_ms']:8.1f} ms  {m['module']}  <- {m['imported_by'] or '-'}"
+        for m in report["slowest_modules"]
+    ]
+    for violation in report["forbidden_imports"]:
+        lines.append(f"\nFORBIDDEN: {violation['package']} ({violation['cumulative_ms']:.0f} ms) imported by "
+                     + " > ".join(violation["chain"]))
+    if report["over_budget"]:
+        lines.append(f"\nOVER BUDGET: {report['total_ms']:.0f} ms > {report['budget_ms']:.0f} ms")
+    return "\n".join(lines)
+
+def main(argv: Optional[Sequence[str]] = None):
+    from artifact import DEFAULT_ARTIFACT_PATH
+    
+    parser = argparse.ArgumentParser(description="Check the import time of the API against a budget")
+    parser.add_argument("module", nargs="?", default="main", help="module to import (default: main)")
+    parser.add_argument("--artifact", default=DEFAULT_ARTIFACT_PATH,
+                        help="MODEL_ARTIFACT of the imported app, empty to keep the environment's")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="maximum total import time, 0 for none")
+    parser.add_argument("--forbid", nargs="*", default=list(FORBIDDEN_PACKAGES), help="packages that must not be imported")
+    parser.add_argument("--runs", type=int, default=3, help="imports measured, the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="modules and packages listed")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    
+    env = dict(os.environ)
+    if args.artifact:
+        if not os.path.isdir(args.artifact):
+            parser.error(f"no artifact at {args.artifact}: run python artifact.py export, or pass --artifact ''")
+        env["MODEL_ARTIFACT"] = os.path.abspath(args.artifact)
+    
+    try:
+        runs = [measure(args.module, env) for _ in range(max(1, args.runs))]
+    except RuntimeError as e:
+        sys.exit(str(e))
+    records = min(runs, key=lambda run: sum(r.cumulative_us for r in run if r.depth == 0))
+    report = analyze(records, args.budget_ms, args.forbid, args.top)
+    
+    if args.json:
+        report["module"] = args.module
+        report["model_artifact"] = env.get("MODEL_ARTIFACT") or None
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(args.module, report))
+    if report["over_budget"] or report["forbidden_imports"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,229 +1,62 @@
-import pickle
-import pandas as pd
 import numpy as np
 import os
 import threading
 import time
-from typing import Dict, List, Any, Optional
+from typing import List, Optional, Tuple
+import config
+from model import IRCModel, MODEL_LOADING
 
-class LazyIRCModel:
+class LazyIRCModel(IRCModel):
     """
     Class to handle the IRC (Insuffisance Rénale Chronique) prediction model
     with lazy loading to avoid Render timeouts
+    
+    The model goes through the same loading -> warming -> ready (or failed)
+    states as IRCModel, in a background thread. How requests received in the
+    meantime are answered is decided by the API (NOT_READY_POLICY).
     """
-    def __init__(self):
-        self._model = None
-        self._feature_importance = None
-        self._stage_probabilities = None
-        self._model_loading = False
-        self._model_loaded = False
+    def __init__(self, backend: Optional[str] = None, source: Optional[str] = None):
+        self._created = time.perf_counter()
+        self._init_state(backend, source)
+        
+        # The loading thread does not survive a fork: a worker forked from a
+        # preloading gunicorn master before the model was ready loads it itself
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._resume_loading_after_fork)
         
         # Start a background thread to load the model
         self._start_loading_model()
     
     def _start_loading_model(self):
         """Start a background thread to load the model"""
-        self._model_loading = True
-        thread = threading.Thread(target=self._load_model)
+        thread = threading.Thread(target=self._load_model_in_background)
         thread.daemon = True  # Thread will exit when the main program exits
         thread.start()
     
-    def _load_model(self):
-        """Load the model from the pickle file in a background thread"""
-        try:
-            print("Starting model loading in background thread...")
-            model_path = os.path.join(os.path.dirname(__file__), '../../attached_assets/model_lucien_v1.pkl')
-            
-            # Give some time for the application to start before loading the model
+    def _load_model_in_background(self):
+        """Load and warm up the model in a background thread"""
+        print("Starting model loading in background thread...")
+        
+        # Give some time for the application to start before unpickling the model.
+        # A compiled artifact loads in milliseconds and does not need the delay.
+        if not (config.MODEL_ARTIFACT or (self._source and os.path.isdir(self._source))):
             time.sleep(2)
-            
-            with open(model_path, 'rb') as file:
-                self._model = pickle.load(file)
-            
-            self._model_loaded = True
-            self._model_loading = False
-            print("Model loaded successfully in background thread")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            self._model_loading = False
-            # Create a simple fallback model for testing
-            self._create_fallback_model()
-    
-    def _create_fallback_model(self):
-        """Create a simple fallback model for testing purposes"""
-        from sklearn.ensemble import RandomForestClassifier
         
-        # This is just a placeholder model for when the real pickle file can't be loaded
-        print("Creating fallback model for testing")
-        self._model = RandomForestClassifier(n_estimators=10, random_state=42)
-        self._model_loaded = True
+        self._load_model()
     
-    def is_model_ready(self) -> bool:
-        """Check if the model is loaded and ready for predictions"""
-        return self._model_loaded
+    def _resume_loading_after_fork(self):
+        """Restart loading in a forked child if the parent had not finished"""
+        if not self._settled.is_set():
+            self._init_state(self._backend, self._source)
+            self._start_loading_model()
     
-    def predict(self, input_data: Dict[str, Any]) -> int:
+    def _predict_matrix(self, matrix: np.ndarray) -> Tuple[List[int], np.ndarray, np.ndarray, bool]:
         """
-        Make a prediction using the loaded model
+        Run the model over a feature matrix, using the fallback rule while it is loading
         
-        Args:
-            input_data: Dictionary containing patient data
-            
-        Returns:
-            Predicted IRC stage (0-5)
+        Both /predict and /predict/batch go through this method, so requests
+        let through before the model is loaded get (flagged) fallback results.
         """
-        # If model is not loaded yet, use fallback prediction
-        if not self._model_loaded:
-            df = pd.DataFrame([input_data])
-            return self._fallback_predict(df)
-            
-        try:
-            # Convert input data to pandas DataFrame
-            df = pd.DataFrame([input_data])
-            
-            # If using the fallback model (for testing only)
-            if not hasattr(self._model, 'predict'):
-                return self._fallback_predict(df)
-            
-            # Make prediction using the real model
-            prediction = self._model.predict(df)
-            predicted_stage = int(prediction[0])
-            
-            # Calculate stage probabilities if the model supports it
-            if hasattr(self._model, 'predict_proba'):
-                proba = self._model.predict_proba(df)[0]
-                classes = self._model.classes_
-                self._stage_probabilities = {int(classes[i]): float(proba[i]) for i in range(len(classes))}
-            else:
-                # Fallback probabilities
-                self._generate_fallback_probabilities(predicted_stage)
-            
-            # Calculate feature importance
-            self._calculate_feature_importance(df)
-            
-            return predicted_stage
-        
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return self._fallback_predict(pd.DataFrame([input_data]))
-    
-    def _fallback_predict(self, df: pd.DataFrame) -> int:
-        """Simple fallback prediction logic for testing"""
-        # Simple logic based on creatinine levels
-        creatinine = df['Créatinine (mg/L)'].values[0]
-        
-        if creatinine > 200:
-            stage = 5
-        elif creatinine > 100:
-            stage = 4
-        elif creatinine > 50:
-            stage = 3
-        elif creatinine > 20:
-            stage = 2
-        elif creatinine > 15:
-            stage = 1
-        else:
-            stage = 0
-            
-        # Generate probabilities and feature importance for fallback
-        self._generate_fallback_probabilities(stage)
-        self._generate_fallback_feature_importance(df)
-        
-        return stage
-    
-    def _generate_fallback_probabilities(self, predicted_stage: int) -> None:
-        """Generate fallback probabilities for testing"""
-        # Give the predicted stage a high probability and distribute the rest
-        confidence = 0.75 + (np.random.random() * 0.2)  # Between 0.75 and 0.95
-        remaining = 1.0 - confidence
-        
-        self._stage_probabilities = {
-            0: 0.0,
-            1: 0.0,
-            2: 0.0,
-            3: 0.0,
-            4: 0.0,
-            5: 0.0
-        }
-        
-        # Set the confidence for the predicted stage
-        self._stage_probabilities[predicted_stage] = confidence
-        
-        # Distribute remaining probability among other stages
-        other_stages = [s for s in range(6) if s != predicted_stage]
-        for stage in other_stages:
-            self._stage_probabilities[stage] = remaining / len(other_stages)
-    
-    def _calculate_feature_importance(self, df: pd.DataFrame) -> None:
-        """Calculate feature importance based on the model"""
-        try:
-            if hasattr(self._model, 'feature_importances_'):
-                # Get feature names
-                feature_names = df.columns.tolist()
-                
-                # Get feature importances from model
-                importances = self._model.feature_importances_
-                
-                # Create a dictionary of feature importances
-                self._feature_importance = {
-                    feature_names[i]: float(importances[i]) 
-                    for i in range(len(feature_names))
-                }
-                
-                # Normalize to sum to 1
-                total = sum(self._feature_importance.values())
-                self._feature_importance = {
-                    k: v/total for k, v in self._feature_importance.items()
-                }
-            else:
-                self._generate_fallback_feature_importance(df)
-        except Exception as e:
-            print(f"Error calculating feature importance: {e}")
-            self._generate_fallback_feature_importance(df)
-    
-    def _generate_fallback_feature_importance(self, df: pd.DataFrame) -> None:
-        """Generate fallback feature importance for testing"""
-        # Create a dictionary mapping feature names to importance values
-        features = list(df.columns)
-        
-        # Assign higher importance to creatinine and urea
-        self._feature_importance = {
-            "Créatinine (mg/L)": 0.35,
-            "Urée (g/L)": 0.25,
-            "Age": 0.15,
-            "TA (mmHg)/Systole": 0.10,
-            "Na^+ (meq/L)": 0.05,
-            "Score de Glasgow (/15)": 0.05,
-            "Sexe_M": 0.02,
-            "Anémie_True": 0.03,
-            "Choc de Pointe/Perçu": 0.02,
-            "Enquête Sociale/Tabac_True": 0.015,
-            "Enquête Sociale/Alcool_True": 0.015
-        }
-        
-        # Make sure we're only using features that are actually in the input
-        self._feature_importance = {
-            k: v for k, v in self._feature_importance.items() if k in features
-        }
-        
-        # Normalize to sum to 1
-        total = sum(self._feature_importance.values())
-        self._feature_importance = {
-            k: v/total for k, v in self._feature_importance.items()
-        }
-    
-    def get_stage_probabilities(self) -> Dict[int, float]:
-        """Get the probability distribution across all stages"""
-        return self._stage_probabilities if self._stage_probabilities else {}
-    
-    def get_feature_importance(self) -> Dict[str, float]:
-        """Get the feature importance scores"""
-        return self._feature_importance if self._feature_importance else {}
-    
-    def get_status(self) -> Dict[str, Any]:
-        """Get the current status of the model"""
-        return {
-            "model_loaded": self._model_loaded,
-            "model_loading": self._model_loading,
-            "model_type": type(self._model).__name__ if self._model else "None"
-        }
\ No newline at end of file
+        if self._state == MODEL_LOADING:
+            return self._fallback_predict_matrix(matrix)
+        return super()._predict_matrix(matrix)
@@ -0,0 +1,345 @@
+"""
+Load tests of the prediction service, with machine-readable results
+
+Usage:
+    python loadtest.py [--apps main render_main] [--modes inprocess uvicorn gunicorn]
+                       [--workers 1 2] [--concurrency 1 8 32] [--requests N]
+                       [--endpoint predict|batch] [--batch-size N] [--seed S]
+                       [-o results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmark import summarize
+from dataset import load_feature_matrix
+from model import FEATURE_NAMES
+from preload import memory_usage
+
+APPS = ("main", "render_main")
+MODES = ("inprocess", "uvicorn", "gunicorn")
+ENDPOINTS = ("predict", "batch")
+
+# Features drawn as 0/1 from their frequency in the dataset
+BINARY_FEATURES = ("Choc de Pointe/Perçu", "Sexe_M", "Anémie_True", "Enquête Sociale/Tabac_True", "Enquête Sociale/Alcool_True")
+
+# Integer-valued features (validated as int by PredictionInput)
+INTEGER_FEATURES = ("Age",) + BINARY_FEATURES
+
+# Noise added to resampled continuous values, as a fraction of the feature's standard deviation
+JITTER = 0.05
+
+# Environment variables recorded with the results, as they change what is measured
+RECORDED_SETTINGS = (
+    "INFERENCE_BACKEND", "INFERENCE_WORKERS", "INFERENCE_QUEUE_DEPTH", "MICRO_BATCHING",
+    "MICRO_BATCH_WINDOW_MS", "PREDICTION_CACHE", "MODEL_ARTIFACT", "PRELOAD_MODEL",
+    "NOT_READY_POLICY", "EXPLANATIONS", "METRICS"
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class SyntheticPatients:
+    """
+    Patients resampled from the bundled dataset
+    
+    Rows are drawn with replacement, so correlations between features are
+    kept, then continuous features get a small Gaussian jitter (clipped to
+    the observed range) and binary features are redrawn from their observed
+    frequency, so most generated patients are new to the model and the cache.
+    """
+    def __init__(self, seed: int):
+        self._matrix, _ = load_feature_matrix()
+        self._rng = np.random.default_rng(seed)
+        self._low = self._matrix.min(axis=0)
+        self._high = self._matrix.max(axis=0)
+        self._scale = self._matrix.std(axis=0) * JITTER
+        self._frequency = self._matrix.mean(axis=0)
+    
+    def sample(self, n: int) -> List[Dict[str, Any]]:
+        """Draw n patients keyed like the /predict body"""
+        rows = self._matrix[self._rng.integers(0, len(self._matrix), size=n)]
+        rows = np.clip(rows + self._rng.normal(0.0, 1.0, size=rows.shape) * self._scale, self._low, self._high)
+        for j, name in enumerate(FEATURE_NAMES):
+            if name in BINARY_FEATURES:
+                rows[:, j] = self._rng.random(n) < self._frequency[j]
+        return [
+            {
+                name: int(round(value)) if name in INTEGER_FEATURES else round(float(value), 2)
+                for name, value in zip(FEATURE_NAMES, row)
+            }
+            for row in rows
+        ]
+
+def build_bodies(patients: List[Dict[str, Any]], endpoint: str, batch_size: int) -> List[bytes]:
+    """Encode the request bodies of a run once, outside of the timed loop"""
+    if endpoint == "predict":
+        return [json.dumps(patient).encode() for patient in patients]
+    return [
+        json.dumps({"records": patients[start:start + batch_size]}).encode()
+        for start in range(0, len(patients), batch_size)
+    ]
+
+async def drive(client, path: str, bodies: List[bytes], concurrency: int) -> Dict[str, Any]:
+    """
+    Send every body once from `concurrency` closed-loop clients
+    
+    Returns:
+        Throughput, latency percentiles (milliseconds) and status code counts
+    """
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    queue = iter(bodies)
+    headers = {"content-type": "application/json"}
+    
+    async def worker():
+        for body in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, content=body, headers=headers)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    
+    result = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status != "200"),
+        "statuses": dict(sorted(statuses.items())),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None
+    }
+    result.update({key: round(value, 3) for key, value in summarize(latencies).items()})
+    return result
+
+async def run_levels(client, args: argparse.Namespace, patients: SyntheticPatients) -> List[Dict[str, Any]]:
+    """Warm the service up, then run every concurrency level with fresh patients"""
+    path = "/predict" if args.endpoint == "predict" else "/predict/batch"
+    per_request = 1 if args.endpoint == "predict" else args.batch_size
+    warmup = build_bodies(patients.sample(args.warmup * per_request), args.endpoint, args.batch_size)
+    await drive(client, path, warmup, max(args.concurrency))
+    
+    levels = []
+    for concurrency in args.concurrency:
+        bodies = build_bodies(patients.sample(args.requests * per_request), args.endpoint, args.batch_size)
+        levels.append(await drive(client, path, bodies, concurrency))
+    return levels
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants (Linux only)"""
+    pids = [pid]
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return pids
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as file:
+                children = [int(child) for child in file.read().split()]
+        except OSError:
+            continue
+        for child in children:
+            pids.extend(_process_tree(child))
+    return pids
+
+def _server_command(app: str, mode: str, workers: int, port: int) -> List[str]:
+    if mode == "uvicorn":
+        return [
+            sys.executable, "-m", "uvicorn", f"{app}:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+        ]
+    return [
+        sys.executable, "-m", "gunicorn", f"{app}:app",
+        "--config", "gunicorn.conf.py",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", f"127.0.0.1:{port}",
+        "--timeout", "120",
+        "--log-level", "warning"
+    ]
+
+async def _wait_until_ready(client, process: subprocess.Popen, timeout: float) -> Dict[str, Optional[float]]:
+    """
+    Poll a starting server until its model is ready
+    
+    Returns:
+        Seconds until the first answer to /health and until /model/status
+        reported the model ready (None if it never did)
+    """
+    started = time.perf_counter()
+    first_response = None
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if first_response is None:
+                await client.get("/health")
+                first_response = time.perf_counter() - started
+            status = (await client.get("/model/status")).json()
+            if status.get("state") == "ready":
+                return {"first_response_s": round(first_response, 3), "ready_s": round(time.perf_counter() - started, 3)}
+        except Exception:
+            pass
+        await asyncio.sleep(0.05)
+    return {"first_response_s": round(first_response, 3) if first_response else None, "ready_s": None}
+
+def _stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+async def run_server(app: str, mode: str, workers: int, args: argparse.Namespace,
+                     patients: SyntheticPatients) -> Dict[str, Any]:
+    """Start a server, measure its cold start, memory and the load levels, then stop it"""
+    import httpx
+    
+    port = _free_port()
+    process = subprocess.Popen(
+        _server_command(app, mode, workers, port),
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+            cold_start = await _wait_until_ready(client, process, args.startup_timeout)
+            levels = await run_levels(client, args, patients) if cold_start["ready_s"] is not None else []
+        memory = [{"pid": pid, "role": "master" if pid == process.pid else "worker", **memory_usage(pid)}
+                  for pid in _process_tree(process.pid)]
+    finally:
+        _stop(process)
+    return {"app": app, "mode": mode, "workers": workers, "cold_start": cold_start, "memory": memory, "levels": levels}
+
+def run_inprocess(app: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the in-process scenario in a fresh interpreter, so imports and the model load are cold"""
+    command = [sys.executable, os.path.abspath(__file__), "--inprocess-child", app, *_forwarded(args)]
+    completed = subprocess.run(command, cwd=HERE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(completed.stdout.decode().strip().splitlines()[-1])
+
+def _forwarded(args: argparse.Namespace) -> List[str]:
+    """Options of this run passed on to an in-process child"""
+    return [
+        "--concurrency", *map(str, args.concurrency),
+        "--requests", str(args.requests),
+        "--warmup", str(args.warmup),
+        "--endpoint", args.endpoint,
+        "--batch-size", str(args.batch_size),
+        "--seed", str(args.seed),
+        "--startup-timeout", str(args.startup_timeout)
+    ]
+
+def inprocess_child(app: str, args: argparse.Namespace):
+    """Import an app in this process, drive it through ASGI and print one JSON line"""
+    import httpx
+    
+    patients = SyntheticPatients(args.seed)
+    started = time.perf_counter()
+    module = __import__(app)
+    imported = time.perf_counter() - started
+    ready = module.app.state.model.wait_until_ready(args.startup_timeout)
+    
+    async def run():
+        transport = httpx.ASGITransport(app=module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inprocess", timeout=args.timeout) as client:
+            return await run_levels(client, args, patients)
+    
+    # The app can answer as soon as its module is imported
+    cold_start = {
+        "first_response_s": round(imported, 3),
+        "ready_s": round(time.perf_counter() - started, 3) if ready else None
+    }
+    levels = asyncio.run(run()) if ready else []
+    print(json.dumps({
+        "app": app, "mode": "inprocess", "workers": 1, "cold_start": cold_start,
+        "memory": [{"pid": os.getpid(), "role": "inprocess", **memory_usage()}],
+        "levels": levels
+    }))
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=HERE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Load-test the prediction service and report JSON results")
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=list(APPS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2], help="server worker processes (uvicorn/gunicorn)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests sent before the levels")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="predict")
+    parser.add_argument("--batch-size", type=int, default=100, help="patients per /predict/batch request")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic patients")
+    parser.add_argument("--timeout", type=float, default=60, help="request timeout (seconds)")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="seconds allowed for the model to be ready")
+    parser.add_argument("-o", "--output", default="-", help="JSON report file, - for stdout")
+    parser.add_argument("--inprocess-child", choices=APPS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.inprocess_child:
+        inprocess_child(args.inprocess_child, args)
+        return
+    
+    patients = SyntheticPatients(args.seed)
+    scenarios = []
+    for app in args.apps:
+        for mode in args.modes:
+            for workers in ([1] if mode == "inprocess" else args.workers):
+                print(f"Running {app} {mode} with {workers} worker(s)...", file=sys.stderr)
+                if mode == "inprocess":
+                    scenarios.append(run_inprocess(app, args))
+                else:
+                    scenarios.append(asyncio.run(run_server(app, mode, workers, args, patients)))
+    
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {name: os.environ[name] for name in RECORDED_SETTINGS if name in os.environ},
+            "endpoint": args.endpoint,
+            "batch_size": args.batch_size if args.endpoint == "batch" else None,
+            "requests_per_level": args.requests,
+            "warmup_requests": args.warmup,
+            "seed": args.seed
+        },
+        "scenarios": scenarios
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
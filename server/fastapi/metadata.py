@@ -0,0 +1,105 @@
+"""Static model metadata served from precomputed bodies"""
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import fastjson
+from compression import ENCODINGS, compress, encoded_etag
+from model import FEATURE_NAMES, MODEL_READY, MODEL_WARMING, IRCModel
+from schemas import INTEGER_FEATURES, PredictionInput
+
+# Stages the fallback rule can answer, when the model has no classes
+FALLBACK_CLASSES = list(range(6))
+
+# Description of every feature, from the /predict input fields
+FEATURE_DESCRIPTIONS = {field.alias: field.description for field in PredictionInput.model_fields.values()}
+
+@dataclass(frozen=True)
+class Document:
+    """One serialized metadata document, with its compressed forms"""
+    body: bytes
+    etag: str
+    # Body of each encoding in compression.ENCODINGS, none below the size threshold
+    encoded: Mapping[str, bytes]
+    
+    def representation(self, encoding: Optional[str]) -> Tuple[bytes, str, Optional[str]]:
+        """Body, ETag and Content-Encoding to send for a negotiated encoding (None for the identity)"""
+        if encoding not in self.encoded:
+            return self.body, self.etag, None
+        return self.encoded[encoding], encoded_etag(self.etag, encoding), encoding
+
+def metadata_documents(model: IRCModel) -> Dict[str, Dict[str, Any]]:
+    """Content of the metadata documents of a model, by name"""
+    importance = model.feature_importance
+    classes = model.classes or FALLBACK_CLASSES
+    features = [
+        {
+            "feature": name,
+            "description": FEATURE_DESCRIPTIONS.get(name),
+            "type": "integer" if name in INTEGER_FEATURES else "number",
+            "importance": importance.get(name, 0.0)
+        }
+        for name in FEATURE_NAMES
+    ]
+    ranked = [
+        {"feature": name, "importance": value}
+        for name, value in sorted(importance.items(), key=lambda item: item[1], reverse=True)
+    ]
+    status = model.get_status()
+    version = {"model_version": model.version}
+    return {
+        "metadata": {
+            **version,
+            "model_type": status["model_type"],
+            "backend": status["backend"],
+            "classes": classes,
+            "features": features,
+            "feature_importance": ranked
+        },
+        "features": {**version, "features": features},
+        "classes": {**version, "classes": classes},
+        "importance": {**version, "feature_importance": ranked}
+    }
+
+def build_documents(model: IRCModel, minimum_size: int = 2048, gzip_level: int = 6,
+                    brotli_quality: int = 4) -> Dict[str, Document]:
+    """Serialize the metadata documents of a model, and compress those of minimum_size bytes or more"""
+    documents = {}
+    for name, content in metadata_documents(model).items():
+        body = fastjson.dumps(content)
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        documents[name] = Document(
+            body=body,
+            etag=f'"{model.version or "fallback"}-{digest}"',
+            encoded={
+                encoding: compress(body, encoding, gzip_level, brotli_quality) for encoding in ENCODINGS
+            } if len(body) >= minimum_size else {}
+        )
+    return documents
+
+class MetadataStore:
+    """
+    Metadata documents of the last few model versions
+    
+    The documents of a model still loading (whose version can be known
+    before its classes and importances are) or answering with the fallback
+    rule are built on every request, never kept.
+    """
+    def __init__(self, max_versions: int, minimum_size: int = 2048, gzip_level: int = 6, brotli_quality: int = 4):
+        self._max_versions = max(1, max_versions)
+        self._options = (minimum_size, gzip_level, brotli_quality)
+        self._documents: "OrderedDict[str, Dict[str, Document]]" = OrderedDict()
+    
+    def get(self, model: IRCModel, name: str) -> Document:
+        version = model.version
+        if version is None or model.state not in (MODEL_WARMING, MODEL_READY):
+            return build_documents(model, *self._options)[name]
+        documents = self._documents.get(version)
+        if documents is None:
+            documents = self._documents[version] = build_documents(model, *self._options)
+            while len(self._documents) > self._max_versions:
+                self._documents.popitem(last=False)
+        else:
+            self._documents.move_to_end(version)
+        return documents[name]
@@ -0,0 +1,217 @@
+"""Prometheus metrics of the API, rendered in the text exposition format"""
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+from starlette.routing import Match
+
+# Latency stages of a prediction request
+STAGES = ("validation", "queue", "build", "inference", "explanation", "serialization")
+
+# Upper bounds (seconds) of the latency histogram buckets, from 10µs to 10s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Prefix of every metric name
+NAMESPACE = "nephropredict"
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    """Base class of a metric family: one value (or histogram) per label combination"""
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+    
+    def render(self) -> List[str]:
+        """Lines of the metric family in the text exposition format"""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Labels, float] = {}
+        if not self.label_names:
+            self._values[()] = 0.0
+    
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+    
+    def dec(self, labels: Labels = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+    
+    def set(self, labels: Labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self._buckets = tuple(buckets)
+        # Per label combination: the (non-cumulative) bucket counts, with a
+        # last slot for +Inf, and the sum of the observed values
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+    
+    def observe(self, labels: Labels, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self._buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        lines = super().render()
+        label_names = self.label_names + ("le",)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(label_names, labels + (_format_value(bound),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Metrics:
+    """Registry of the API metrics"""
+    def __init__(self):
+        self.requests = Counter("requests_total", "HTTP requests by endpoint and status code", ("endpoint", "status"))
+        self.request_duration = Histogram(
+            "request_duration_seconds", "Time from request to last response byte, by endpoint", ("endpoint",)
+        )
+        self.in_flight = Gauge("requests_in_flight", "Requests being processed, by endpoint", ("endpoint",))
+        self.stage_duration = Histogram(
+            "stage_duration_seconds", "Time spent in each stage of a prediction request", ("stage",)
+        )
+        self.fallbacks = Counter("fallback_predictions_total", "Predictions answered by the fallback creatinine rule")
+    
+    def observe_stage(self, stage: str, started: float):
+        """Record a stage that started at the given time.perf_counter() value"""
+        self.stage_duration.observe((stage,), time.perf_counter() - started)
+    
+    def observe_stage_duration(self, stage: str, seconds: float):
+        """Record a stage timed elsewhere (e.g. the executor's queue wait)"""
+        self.stage_duration.observe((stage,), seconds)
+    
+    def count_fallbacks(self, count: int):
+        self.fallbacks.inc(amount=count)
+    
+    def render(self, model_status: Dict[str, Any]) -> str:
+        """
+        All metrics in the Prometheus text format
+        
+        Args:
+            model_status: IRCModel.get_status(), for the model gauges
+        """
+        model = [
+            Gauge("model_info", "Model state, version and backend (always 1)", ("state", "version", "backend")),
+            Gauge("model_ready", "1 once the model is loaded and warmed up"),
+            Gauge("model_load_duration_seconds", "Time taken to read and prepare the model"),
+            Gauge("model_warmup_duration_seconds", "Time taken to warm the model up"),
+            Gauge("model_ready_after_seconds", "Time from startup until the model was ready or failed")
+        ]
+        model[0].set((model_status["state"], model_status.get("version") or "", model_status.get("backend") or ""), 1)
+        model[1].set((), 1 if model_status["state"] == "ready" else 0)
+        timings = model_status.get("timings") or {}
+        for gauge, key in zip(model[2:], ("load_ms", "warmup_ms", "ready_after_ms")):
+            if timings.get(key) is not None:
+                gauge.set((), timings[key] / 1000)
+        
+        families = [self.requests, self.request_duration, self.in_flight, self.stage_duration, self.fallbacks, *model]
+        return "\n".join(line for family in families for line in family.render()) + "\n"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests by endpoint and status
+    
+    The endpoint label is the path template of the route a request goes to
+    ("/patients/{patient_id}/visits", not the patient's URL), so unknown URLs
+    are grouped under "other" instead of creating one series each.
+    """
+    def __init__(self, app, metrics: Metrics, routes: Sequence[Any]):
+        self.app = app
+        self.metrics = metrics
+        # Static paths are looked up directly; only templated ones are matched
+        self.static = frozenset(route.path for route in routes if "{" not in route.path)
+        self.templated = [route for route in routes if "{" in route.path]
+    
+    def endpoint(self, scope) -> str:
+        """Path template of the route a request goes to, "other" if none"""
+        if scope["path"] in self.static:
+            return scope["path"]
+        partial = None
+        for route in self.templated:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                return route.path
+            if match is Match.PARTIAL and partial is None:
+                # Path matched with another method: answered with 405
+                partial = route.path
+        return partial or "other"
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        metrics = self.metrics
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        endpoint = self.endpoint(scope)
+        started = time.perf_counter()
+        metrics.in_flight.inc((endpoint,))
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight.dec((endpoint,))
+            metrics.requests.inc((endpoint, str(status)))
+            metrics.request_duration.observe((endpoint,), time.perf_counter() - started)
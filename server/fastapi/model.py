@@ -1,189 +1,635 @@
+import multiprocessing
 import pickle
-import pandas as pd
 import numpy as np
 import os
-from typing import Dict, List, Any
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple, Union
+import config
+from compiled_forest import CompiledForest
+from explain import TreeExplainer
+from process_pool import ForestPool, PooledForest, WorkerError, artifact_directory
+from thresholds import ThresholdIndex
+
+# Model input columns, in the order the model was trained on
+FEATURE_NAMES = [
+    'Créatinine (mg/L)',
+    'Urée (g/L)',
+    'Age',
+    'Na^+ (meq/L)',
+    'TA (mmHg)/Systole',
+    'Choc de Pointe/Perçu',
+    'Score de Glasgow (/15)',
+    'Sexe_M',
+    'Anémie_True',
+    'Enquête Sociale/Tabac_True',
+    'Enquête Sociale/Alcool_True'
+]
+
+# Importance table used when the model does not expose feature_importances_
+FALLBACK_FEATURE_IMPORTANCE = {
+    "Créatinine (mg/L)": 0.35,
+    "Urée (g/L)": 0.25,
+    "Age": 0.15,
+    "TA (mmHg)/Systole": 0.10,
+    "Na^+ (meq/L)": 0.05,
+    "Score de Glasgow (/15)": 0.05,
+    "Sexe_M": 0.02,
+    "Anémie_True": 0.03,
+    "Choc de Pointe/Perçu": 0.02,
+    "Enquête Sociale/Tabac_True": 0.015,
+    "Enquête Sociale/Alcool_True": 0.015
+}
+
+# Model lifecycle: loading -> warming -> ready, or failed when only the
+# fallback rule is available
+MODEL_LOADING = "loading"
+MODEL_WARMING = "warming"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+
+# Patient the synthetic warm-up rows are derived from
+WARMUP_PATIENT = [42.0, 1.14, 68.0, 142.0, 130.0, 0.0, 15.0, 1.0, 1.0, 0.0, 1.0]
+
+# Probability given to the predicted stage by the fallback rule
+FALLBACK_CONFIDENCE = 0.8
+
+@dataclass(frozen=True)
+class PredictionResult:
+    """
+    Immutable outcome of a single prediction
+    
+    Everything a request needs is returned by the prediction call itself, so a
+    model instance holds no per-request state and can be shared across threads.
+    """
+    predicted_stage: int
+    stage_probabilities: Mapping[int, float]
+    feature_importance: Mapping[str, float]
+    fallback: bool = False
+    # Per-patient explanation of the predicted stage's probability: base_probability
+    # plus the sum of the contributions gives confidence (None when not requested)
+    contributions: Optional[Mapping[str, float]] = None
+    base_probability: Optional[float] = None
+    
+    @property
+    def confidence(self) -> float:
+        """Probability of the predicted stage"""
+        return self.stage_probabilities.get(self.predicted_stage, 0.0)
+
+@dataclass(frozen=True)
+class BatchRowError:
+    """A batch row that could not be scored"""
+    index: int
+    error: str
+
+@dataclass(frozen=True)
+class BatchPredictionResult:
+    """
+    Immutable outcome of a batch prediction
+    
+    predictions[i] is the result for input row indices[i]; rows listed in
+    errors have no prediction.
+    """
+    indices: Tuple[int, ...]
+    predictions: Tuple[PredictionResult, ...]
+    errors: Tuple[BatchRowError, ...]
+    feature_importance: Mapping[str, float]
+
+def _frozen(mapping: Dict) -> Mapping:
+    """Wrap a dictionary in a read-only view"""
+    return MappingProxyType(mapping)
+
+def _normalize(importances: Dict[str, float]) -> Dict[str, float]:
+    """Normalize importance values to sum to 1"""
+    total = sum(importances.values())
+    return {k: v/total for k, v in importances.items()}
 
 class IRCModel:
     """
     Class to handle the IRC (Insuffisance Rénale Chronique) prediction model
+    
+    Prediction methods return immutable result objects and never write to the
+    instance, so a single model can serve concurrent requests without locking.
     """
-    def __init__(self):
-        self._model = None
-        self._feature_importance = None
-        self._stage_probabilities = None
+    # metrics.Metrics receiving the build/inference/explanation stage timings
+    # and fallback counts, set by the API when METRICS is enabled
+    metrics = None
+    
+    def __init__(self, backend: Optional[str] = None, source: Optional[str] = None):
+        """
+        Args:
+            backend: "sklearn" to call the pickled forest, "compiled" to
+                evaluate it from flat NumPy arrays or "process" to evaluate
+                them on worker processes (defaults to INFERENCE_BACKEND)
+            source: Pickle file or compiled artifact directory to load
+                (defaults to MODEL_ARTIFACT, then MODEL_PATH)
+        """
+        self._created = time.perf_counter()
+        self._init_state(backend, source)
         self._load_model()
     
+    def _init_state(self, backend: Optional[str] = None, source: Optional[str] = None):
+        """Reset the attributes derived from the model to their unloaded values"""
+        self._backend = backend or config.INFERENCE_BACKEND
+        if self._backend not in ("sklearn", "compiled", "process"):
+            raise ValueError(f"Unknown inference backend: {self._backend}")
+        self._source = source
+        # File or directory the model was actually read from
+        self._loaded_from: Optional[str] = None
+        self._model = None
+        # Object whose predict_proba serves requests: the pickled model or its compiled form
+        self._estimator = None
+        # Per-patient contributions, built from the loaded forest (see explain.py)
+        self._explainer = None
+        # Split breakpoints of every feature, for exact sweeps (see thresholds.py)
+        self._threshold_index = None
+        self._classes = None
+        self._class_list = None
+        self._feature_importance = _frozen(_normalize(FALLBACK_FEATURE_IMPORTANCE))
+        self._state = MODEL_LOADING
+        # Content hash of the loaded model, None until loaded (or for the placeholder)
+        self._version: Optional[str] = None
+        # Set once the model is ready or has failed to load
+        self._settled = threading.Event()
+        self._timings: Dict[str, Optional[float]] = {"load_ms": None, "warmup_ms": None, "ready_after_ms": None}
+    
     def _load_model(self):
-        """Load the model from the pickle file"""
+        """Load the model from its source, then warm it up"""
+        started = time.perf_counter()
         try:
-            model_path = os.path.join(os.path.dirname(__file__), '../../attached_assets/model_lucien_v1.pkl')
-            with open(model_path, 'rb') as file:
-                self._model = pickle.load(file)
+            self._model = self._read_model()
+            self._prepare_model()
             print("Model loaded successfully")
         except Exception as e:
             print(f"Error loading model: {e}")
             # Create a simple fallback model for testing if the real model can't be loaded
             self._create_fallback_model()
+        self._timings["load_ms"] = (time.perf_counter() - started) * 1000
+        
+        if self._classes is None:
+            # Placeholder model: every prediction goes through the fallback rule
+            self._set_state(MODEL_FAILED)
+            return
+        self._set_state(MODEL_WARMING)
+        self._warm_up()
+        self._set_state(MODEL_READY)
+    
+    def _warm_up(self):
+        """
+        Run a few synthetic predictions before accepting requests
+        
+        The first calls pay one-off costs (page faults on the tree arrays,
+        scikit-learn's input validation paths, NumPy buffer allocation) that
+        would otherwise land on the first real patients.
+        """
+        started = time.perf_counter()
+        rows = np.tile(np.asarray(WARMUP_PATIENT), (config.WARMUP_BATCH_SIZE, 1))
+        # Spread creatinine and urea so the rows reach many different leaves
+        rows[:, 0] = np.linspace(5.0, 400.0, len(rows))
+        rows[:, 1] = np.linspace(0.1, 4.0, len(rows))[::-1]
+        try:
+            for _ in range(config.WARMUP_ROUNDS):
+                self.predict_matrix(rows[:1], explain=True)
+                self.predict_matrix(rows)
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+        self._timings["warmup_ms"] = (time.perf_counter() - started) * 1000
+    
+    def _set_state(self, state: str):
+        """Move the model to a new lifecycle state"""
+        self._state = state
+        if state in (MODEL_READY, MODEL_FAILED):
+            self._timings["ready_after_ms"] = (time.perf_counter() - self._created) * 1000
+            self._settled.set()
+        print(f"Model {state}")
+    
+    @property
+    def state(self) -> str:
+        """Current lifecycle state (MODEL_LOADING, MODEL_WARMING, MODEL_READY or MODEL_FAILED)"""
+        return self._state
+    
+    @property
+    def version(self) -> Optional[str]:
+        """Content hash of the loaded artifact or pickle, None while loading or for the placeholder"""
+        return self._version
+    
+    @property
+    def classes(self) -> Optional[List[int]]:
+        """Stages the model predicts, in the order of its probability columns (None for the placeholder)"""
+        return self._class_list
+    
+    @property
+    def feature_importance(self) -> Mapping[str, float]:
+        """Normalized global importance of every feature"""
+        return self._feature_importance
+    
+    @property
+    def threshold_index(self) -> Optional[ThresholdIndex]:
+        """Split breakpoints of the loaded forest, None for the placeholder"""
+        return self._threshold_index
+    
+    def _read_model(self) -> Any:
+        """
+        Read the model from its source: a compiled artifact directory or a pickle file
+        
+        Without an explicit source, the artifact of MODEL_ARTIFACT is used when
+        set, otherwise (or if the artifact is unusable) the MODEL_PATH pickle.
+        The artifact only needs NumPy and is memory-mapped, so it loads in
+        milliseconds and its pages are shared between worker processes.
+        """
+        from artifact import file_sha256
+        
+        if self._source is None and config.MODEL_ARTIFACT:
+            try:
+                return self._read_artifact(config.MODEL_ARTIFACT)
+            except (OSError, ValueError) as e:
+                print(f"Error loading model artifact, using the pickle file instead: {e}")
+        elif self._source is not None and os.path.isdir(self._source):
+            return self._read_artifact(self._source)
+        
+        model_path = self._source or config.MODEL_PATH
+        with open(model_path, 'rb') as file:
+            model = pickle.load(file)
+        self._version = file_sha256(model_path)[:16]
+        self._loaded_from = model_path
+        return model
+    
+    def _read_artifact(self, path: str) -> CompiledForest:
+        """Load a compiled artifact directory"""
+        from artifact import artifact_version, load_artifact
+        
+        forest, manifest = load_artifact(path, verify=config.MODEL_ARTIFACT_VERIFY)
+        print(f"Model artifact loaded from {path} (format v{manifest['format_version']})")
+        self._version = artifact_version(manifest)
+        self._loaded_from = path
+        return forest
     
     def _create_fallback_model(self):
-        """Create a simple fallback model for testing purposes"""
-        from sklearn.ensemble import RandomForestClassifier
+        """Fall back to the creatinine rule when the real model cannot be loaded"""
+        # An untrained placeholder would answer nothing more, so none is built
+        # (which also spares importing scikit-learn)
+        print("Using the fallback creatinine rule")
+        self._model = None
+        self._version = None
+        self._loaded_from = None
+        self._prepare_model()
+    
+    def _prepare_model(self):
+        """
+        Compute everything that only depends on the fitted model, once at load time
+        
+        The class list and the normalized global importance table never change
+        between requests, so they are not rebuilt on every prediction.
+        """
+        try:
+            self._classes = np.asarray(self._model.classes_)
+            self._class_list = [int(c) for c in self._classes]
+        except AttributeError:
+            # Untrained placeholder: predictions go through the fallback rule
+            self._classes = None
+        self._feature_importance = _frozen(self._global_feature_importance())
+        
+        self._estimator = self._model
+        if self._backend != "sklearn" and self._classes is not None and not isinstance(self._model, CompiledForest):
+            try:
+                self._estimator = CompiledForest.from_sklearn(self._model)
+                print(f"Model compiled: {self._estimator.n_estimators} trees, {self._estimator.n_nodes} nodes")
+            except ValueError as e:
+                print(f"Model cannot be compiled, using scikit-learn: {e}")
+        if self._backend == "process" and isinstance(self._estimator, CompiledForest):
+            self._estimator = self._pooled(self._estimator)
         
-        # This is just a placeholder model for when the real pickle file can't be loaded
-        # It will be replaced with the real model in production
-        print("Creating fallback model for testing")
-        self._model = RandomForestClassifier(n_estimators=10, random_state=42)
+        self._explainer = None
+        self._threshold_index = None
+        if self._classes is not None:
+            try:
+                forest = self._estimator if isinstance(self._estimator, CompiledForest) else CompiledForest.from_sklearn(self._model)
+            except ValueError as e:
+                print(f"Model cannot be explained or indexed: {e}")
+            else:
+                self._threshold_index = ThresholdIndex(forest, n_features=len(FEATURE_NAMES))
+                if config.EXPLANATIONS:
+                    self._explainer = TreeExplainer(forest, n_features=len(FEATURE_NAMES))
+    
+    def _pooled(self, forest: CompiledForest) -> CompiledForest:
+        """The forest walked by INFERENCE_PROCESSES worker processes (see process_pool.py)"""
+        if multiprocessing.parent_process() is not None:
+            # Already a worker process (of score.py, or spawned by a pool)
+            return forest
+        try:
+            path = artifact_directory(forest, self._loaded_from)
+        except OSError as e:
+            print(f"Model cannot be shared with worker processes, evaluating it in this process: {e}")
+            return forest
+        pool = ForestPool(
+            path,
+            n_features=len(FEATURE_NAMES),
+            n_trees=forest.n_estimators,
+            processes=config.INFERENCE_PROCESSES,
+            max_rows=config.INFERENCE_PROCESS_MAX_ROWS,
+            timeout=config.INFERENCE_PROCESS_TIMEOUT,
+            health_interval=config.INFERENCE_PROCESS_HEALTH_INTERVAL,
+            owns_path=path != self._loaded_from
+        )
+        return PooledForest(forest, pool)
+    
+    def start_processes(self):
+        """Start the inference worker processes of the "process" backend in this process, if not running"""
+        if isinstance(self._estimator, PooledForest):
+            try:
+                self._estimator.pool.start()
+            except WorkerError as e:
+                print(f"{e}, evaluating the model in this process")
     
-    def predict(self, input_data: Dict[str, Any]) -> int:
+    def stop_processes(self):
+        """Stop the inference worker processes started by this process (calls start them again)"""
+        if isinstance(self._estimator, PooledForest):
+            self._estimator.pool.stop()
+    
+    def predict(self, input_data: Dict[str, Any], explain: bool = True) -> PredictionResult:
         """
         Make a prediction using the loaded model
         
         Args:
             input_data: Dictionary containing patient data
-            
+            explain: Also compute the patient's feature contributions
+        
         Returns:
-            Predicted IRC stage (0-5)
+            Prediction result with the predicted IRC stage (0-5), the stage
+            probabilities, the feature importance and the contributions
         """
+        # Single-row batch: probabilities are computed once and the stage is their argmax
+        return self.predict_matrix(self.build_feature_row(input_data), explain=explain)[0]
+    
+    def build_feature_row(self, input_data: Dict[str, Any]) -> np.ndarray:
+        """Convert one patient dictionary into a (1, n_features) matrix in FEATURE_NAMES order"""
         try:
-            # Convert input data to pandas DataFrame
-            df = pd.DataFrame([input_data])
-            
-            # If using the fallback model (for testing only)
-            if not hasattr(self._model, 'predict'):
-                return self._fallback_predict(df)
-            
-            # Make prediction using the real model
-            prediction = self._model.predict(df)
-            predicted_stage = int(prediction[0])
-            
-            # Calculate stage probabilities if the model supports it
-            if hasattr(self._model, 'predict_proba'):
-                proba = self._model.predict_proba(df)[0]
-                classes = self._model.classes_
-                self._stage_probabilities = {int(classes[i]): float(proba[i]) for i in range(len(classes))}
-            else:
-                # Fallback probabilities
-                self._generate_fallback_probabilities(predicted_stage)
-            
-            # Calculate feature importance
-            self._calculate_feature_importance(df)
-            
-            return predicted_stage
+            return np.array([[float(input_data[name]) for name in FEATURE_NAMES]], dtype=np.float64)
+        except KeyError as e:
+            raise ValueError(f"Missing value for: {e.args[0]}")
+    
+    def predict_batch(self, rows: Union[List[Dict[str, Any]], Dict[str, List[Any]]],
+                      explain: bool = False) -> BatchPredictionResult:
+        """
+        Make predictions for many patients with a single vectorized model call
         
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return self._fallback_predict(pd.DataFrame([input_data]))
+        Args:
+            rows: Either a list of patient dictionaries (records) or a dictionary
+                mapping each feature name to a list of values (columnar payload)
+            explain: Also compute every patient's feature contributions
+        
+        Returns:
+            Batch result with one prediction per valid row, the rows that
+            could not be scored and the global feature importance
+        """
+        started = time.perf_counter()
+        matrix, row_indices, errors = self._build_matrix(rows)
+        if self.metrics is not None:
+            self.metrics.observe_stage("build", started)
+        predictions = self.predict_matrix(matrix, explain=explain) if row_indices else ()
+        
+        return BatchPredictionResult(
+            indices=tuple(row_indices),
+            predictions=predictions,
+            errors=tuple(errors),
+            # Feature importance is global to the model, so it is shared by every row
+            feature_importance=self._feature_importance
+        )
+    
+    def predict_matrix(self, matrix: np.ndarray, explain: bool = False) -> Tuple[PredictionResult, ...]:
+        """
+        Make predictions for a feature matrix with a single vectorized model call
+        
+        Args:
+            matrix: Array of shape (n_patients, n_features), columns in FEATURE_NAMES order
+            explain: Also compute the feature contributions of every row
+        
+        Returns:
+            One prediction result per row of the matrix
+        """
+        explainer, metrics = self._explainer, self.metrics
+        classes, stages, probabilities, fallback = self.predict_probabilities(matrix)
+        
+        # Contributions to the predicted stage of each row; the fallback rule has none
+        contributions = bias = None
+        if explain and not fallback and explainer is not None:
+            started = time.perf_counter()
+            class_index = {c: i for i, c in enumerate(classes)}
+            columns = np.array([class_index[int(stage)] for stage in stages], dtype=np.intp)
+            contributions = explainer.contributions(matrix)[np.arange(len(stages)), :, columns]
+            bias = explainer.bias[columns]
+            if metrics is not None:
+                metrics.observe_stage("explanation", started)
+        
+        return tuple(
+            PredictionResult(
+                predicted_stage=int(stages[position]),
+                stage_probabilities=_frozen({
+                    classes[i]: float(probabilities[position, i]) for i in range(len(classes))
+                }),
+                feature_importance=self._feature_importance,
+                fallback=fallback,
+                contributions=_frozen({
+                    name: float(value) for name, value in zip(FEATURE_NAMES, contributions[position])
+                }) if contributions is not None else None,
+                base_probability=float(bias[position]) if bias is not None else None
+            )
+            for position in range(len(stages))
+        )
     
-    def _fallback_predict(self, df: pd.DataFrame) -> int:
-        """Simple fallback prediction logic for testing"""
-        # Simple logic based on creatinine levels
-        creatinine = df['Créatinine (mg/L)'].values[0]
+    def predict_probabilities(self, matrix: np.ndarray) -> Tuple[List[int], np.ndarray, np.ndarray, bool]:
+        """
+        Score a feature matrix and keep the results as arrays
         
+        For callers that need whole probability surfaces (sweeps over many
+        rows), building one PredictionResult per row would cost more than the
+        forest itself.
+        
+        Returns:
+            The model classes, the predicted stage and class probabilities of
+            every row, and whether the fallback rule was used
+        """
+        metrics = self.metrics
+        started = time.perf_counter()
+        classes, stages, probabilities, fallback = self._predict_matrix(matrix)
+        if metrics is not None:
+            metrics.observe_stage("inference", started)
+            if fallback:
+                metrics.count_fallbacks(len(stages))
+        return classes, stages, probabilities, fallback
+    
+    def _build_matrix(self, rows: Union[List[Dict[str, Any]], Dict[str, List[Any]]]) -> Tuple[np.ndarray, List[int], List[BatchRowError]]:
+        """
+        Convert a batch payload into a feature matrix with columns in FEATURE_NAMES order
+        
+        Rows with missing or non-numeric values are left out of the matrix and
+        reported as errors instead of failing the whole batch.
+        """
+        if isinstance(rows, dict):
+            lengths = {len(values) for values in rows.values()}
+            if len(lengths) > 1:
+                raise ValueError("All columns must have the same number of values")
+            n_rows = lengths.pop() if lengths else 0
+            columns = [rows.get(name) for name in FEATURE_NAMES]
+        else:
+            n_rows = len(rows)
+            columns = [
+                [row.get(name) if isinstance(row, dict) else None for row in rows]
+                for name in FEATURE_NAMES
+            ]
+        
+        matrix = np.empty((n_rows, len(FEATURE_NAMES)), dtype=np.float64)
+        row_errors: Dict[int, List[str]] = {}
+        for j, (name, values) in enumerate(zip(FEATURE_NAMES, columns)):
+            if values is None:
+                values = [None] * n_rows
+            try:
+                # Convert the whole column at once when every value is numeric
+                column = np.asarray(values, dtype=np.float64)
+                invalid = ~np.isfinite(column)
+            except (TypeError, ValueError):
+                column = np.empty(n_rows, dtype=np.float64)
+                invalid = np.zeros(n_rows, dtype=bool)
+                for i, value in enumerate(values):
+                    try:
+                        column[i] = float(value)
+                        invalid[i] = not np.isfinite(column[i])
+                    except (TypeError, ValueError):
+                        invalid[i] = True
+            matrix[:, j] = column
+            for i in np.flatnonzero(invalid):
+                row_errors.setdefault(int(i), []).append(name)
+        
+        errors = [
+            BatchRowError(index=i, error=f"Missing or invalid value for: {', '.join(names)}")
+            for i, names in sorted(row_errors.items())
+        ]
+        row_indices = [i for i in range(n_rows) if i not in row_errors]
+        return matrix[row_indices], row_indices, errors
+    
+    def _predict_matrix(self, matrix: np.ndarray) -> Tuple[List[int], np.ndarray, np.ndarray, bool]:
+        """
+        Run the model once over a feature matrix
+        
+        Returns:
+            The model classes, the predicted stage and class probabilities of
+            every row, and whether the fallback rule was used
+        """
+        if self._classes is None:
+            return self._fallback_predict_matrix(matrix)
+        try:
+            # One pass over the trees: the stage is the most probable class,
+            # exactly as RandomForestClassifier.predict derives it
+            probabilities = self._estimator.predict_proba(matrix)
+            stages = self._classes.take(np.argmax(probabilities, axis=1))
+            return self._class_list, stages, probabilities, False
+        except Exception as e:
+            print(f"Batch prediction error: {e}")
+            return self._fallback_predict_matrix(matrix)
+    
+    def _fallback_predict_matrix(self, matrix: np.ndarray) -> Tuple[List[int], np.ndarray, np.ndarray, bool]:
+        """Apply the fallback creatinine rule to every row of a feature matrix"""
+        classes = list(range(6))
+        stages = np.array([self._fallback_stage(c) for c in matrix[:, 0]], dtype=int)
+        probabilities = np.empty((len(stages), len(classes)), dtype=np.float64)
+        for i, stage in enumerate(stages):
+            row = self._fallback_probabilities(int(stage))
+            probabilities[i] = [row[c] for c in classes]
+        return classes, stages, probabilities, True
+    
+    def _fallback_stage(self, creatinine: float) -> int:
+        """Map a creatinine level to an IRC stage"""
         if creatinine > 200:
-            stage = 5
+            return 5
         elif creatinine > 100:
-            stage = 4
+            return 4
         elif creatinine > 50:
-            stage = 3
+            return 3
         elif creatinine > 20:
-            stage = 2
+            return 2
         elif creatinine > 15:
-            stage = 1
-        else:
-            stage = 0
-            
-        # Generate probabilities and feature importance for fallback
-        self._generate_fallback_probabilities(stage)
-        self._generate_fallback_feature_importance(df)
-        
-        return stage
-    
-    def _generate_fallback_probabilities(self, predicted_stage: int) -> None:
-        """Generate fallback probabilities for testing"""
-        # Give the predicted stage a high probability and distribute the rest
-        confidence = 0.75 + (np.random.random() * 0.2)  # Between 0.75 and 0.95
+            return 1
+        return 0
+    
+    def _fallback_probabilities(self, predicted_stage: int) -> Dict[int, float]:
+        """Build a fallback probability distribution centred on the predicted stage"""
+        # Give the predicted stage a high probability and distribute the rest.
+        # The value is fixed so a flagged fallback answer is reproducible
+        confidence = FALLBACK_CONFIDENCE
         remaining = 1.0 - confidence
         
-        self._stage_probabilities = {
-            0: 0.0,
-            1: 0.0,
-            2: 0.0,
-            3: 0.0,
-            4: 0.0,
-            5: 0.0
-        }
+        # Distribute remaining probability among other stages
+        probabilities = {stage: remaining / 5 for stage in range(6)}
         
         # Set the confidence for the predicted stage
-        self._stage_probabilities[predicted_stage] = confidence
-        
-        # Distribute remaining probability among other stages
-        other_stages = [s for s in range(6) if s != predicted_stage]
-        for stage in other_stages:
-            self._stage_probabilities[stage] = remaining / len(other_stages)
+        probabilities[predicted_stage] = confidence
+        return probabilities
     
-    def _calculate_feature_importance(self, df: pd.DataFrame) -> None:
-        """Calculate feature importance based on the model"""
+    def _global_feature_importance(self) -> Dict[str, float]:
+        """Get the model's normalized feature importances, keyed by feature name"""
         try:
             if hasattr(self._model, 'feature_importances_'):
-                # Get feature names
-                feature_names = df.columns.tolist()
-                
-                # Get feature importances from model
                 importances = self._model.feature_importances_
-                
-                # Create a dictionary of feature importances
-                self._feature_importance = {
-                    feature_names[i]: float(importances[i]) 
-                    for i in range(len(feature_names))
-                }
-                
-                # Normalize to sum to 1
-                total = sum(self._feature_importance.values())
-                self._feature_importance = {
-                    k: v/total for k, v in self._feature_importance.items()
+                total = float(sum(importances))
+                return {
+                    FEATURE_NAMES[i]: float(importances[i]) / total
+                    for i in range(len(FEATURE_NAMES))
                 }
-            else:
-                self._generate_fallback_feature_importance(df)
         except Exception as e:
             print(f"Error calculating feature importance: {e}")
-            self._generate_fallback_feature_importance(df)
-    
-    def _generate_fallback_feature_importance(self, df: pd.DataFrame) -> None:
-        """Generate fallback feature importance for testing"""
-        # Create a dictionary mapping feature names to importance values
-        features = list(df.columns)
-        
-        # Assign higher importance to creatinine and urea
-        self._feature_importance = {
-            "Créatinine (mg/L)": 0.35,
-            "Urée (g/L)": 0.25,
-            "Age": 0.15,
-            "TA (mmHg)/Systole": 0.10,
-            "Na^+ (meq/L)": 0.05,
-            "Score de Glasgow (/15)": 0.05,
-            "Sexe_M": 0.02,
-            "Anémie_True": 0.03,
-            "Choc de Pointe/Perçu": 0.02,
-            "Enquête Sociale/Tabac_True": 0.015,
-            "Enquête Sociale/Alcool_True": 0.015
-        }
-        
-        # Make sure we're only using features that are actually in the input
-        self._feature_importance = {
-            k: v for k, v in self._feature_importance.items() if k in features
-        }
+        return _normalize(FALLBACK_FEATURE_IMPORTANCE)
+    
+    def is_model_ready(self) -> bool:
+        """Check if the model is loaded, warmed up and ready for predictions"""
+        return self._state == MODEL_READY
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for loading and warm-up to finish, successfully or not
         
-        # Normalize to sum to 1
-        total = sum(self._feature_importance.values())
-        self._feature_importance = {
-            k: v/total for k, v in self._feature_importance.items()
-        }
+        Returns:
+            False if the timeout expired first
+        """
+        return self._settled.wait(timeout)
     
-    def get_stage_probabilities(self) -> Dict[int, float]:
-        """Get the probability distribution across all stages"""
-        return self._stage_probabilities if self._stage_probabilities else {}
+    def memory_usage(self) -> Dict[str, Any]:
+        """
+        Size of the arrays held for inference, in MB
+        
+        Memory-mapped artifact arrays are reported apart: their pages live in
+        the page cache and are shared by every process mapping them.
+        """
+        usage = {"model_mb": 0.0, "compiled_mb": 0.0, "mapped_mb": 0.0, "explainer_mb": 0.0, "threshold_index_mb": 0.0}
+        for estimator in {id(self._model): self._model, id(self._estimator): self._estimator}.values():
+            if isinstance(estimator, CompiledForest):
+                usage["mapped_mb" if estimator.memory_mapped else "compiled_mb"] += estimator.nbytes / 2**20
+            elif hasattr(estimator, "estimators_"):
+                usage["model_mb"] += sum(
+                    tree.tree_.__getstate__()["nodes"].nbytes + tree.tree_.value.nbytes
+                    for tree in estimator.estimators_
+                ) / 2**20
+        explainer = self._explainer
+        if explainer is not None:
+            usage["explainer_mb"] = explainer.nbytes / 2**20
+        index = self._threshold_index
+        if index is not None:
+            usage["threshold_index_mb"] = index.nbytes / 2**20
+        usage["private_mb"] = usage["model_mb"] + usage["compiled_mb"] + usage["explainer_mb"] + usage["threshold_index_mb"]
+        return {name: round(value, 2) for name, value in usage.items()}
     
-    def get_feature_importance(self) -> Dict[str, float]:
-        """Get the feature importance scores"""
-        return self._feature_importance if self._feature_importance else {}
+    def get_status(self) -> Dict[str, Any]:
+        """Get the current status of the model"""
+        return {
+            "state": self._state,
+            "version": self._version,
+            "source": self._loaded_from,
+            # The placeholder of a failed load is not a model: only the fallback rule answers
+            "model_loaded": self._state in (MODEL_WARMING, MODEL_READY),
+            "model_loading": self._state == MODEL_LOADING,
+            "timings": dict(self._timings),
+            "model_type": type(self._model).__name__ if self._model is not None else "None",
+            "backend": type(self._estimator).__name__ if self._estimator is not None else "None",
+            "processes": self._estimator.get_status() if isinstance(self._estimator, PooledForest) else None
+        }
@@ -0,0 +1,84 @@
+"""Global partial dependence of the model on every feature"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from model import FEATURE_NAMES, IRCModel
+
+def training_matrix(path: Optional[str] = None) -> np.ndarray:
+    """Complete rows of the training CSV (or of a dataset shaped like it)"""
+    from dataset import DATASET_PATH, load_feature_matrix
+    
+    matrix, _ = load_feature_matrix(path or DATASET_PATH)
+    return matrix[np.isfinite(matrix).all(axis=1)]
+
+def partial_dependence_curves(model: IRCModel, matrix: np.ndarray) -> Dict[str, Any]:
+    """
+    Partial-dependence curves of every feature over a dataset
+    
+    The values of a curve hold on the intervals cut by its breakpoints:
+    value 0 up to breakpoints[0] included, value i between breakpoints[i-1]
+    (excluded) and breakpoints[i], the last one above the last breakpoint.
+    Like the model, breakpoints compare the feature rounded to float32.
+    
+    Raises:
+        ValueError: if the model has no threshold index (fallback rule)
+    """
+    index = model.threshold_index
+    if index is None:
+        raise ValueError("Partial dependence needs the tree model, the fallback rule is in use")
+    classes = model.classes
+    features = []
+    for j, name in enumerate(FEATURE_NAMES):
+        curve = index.partial_dependence(matrix, j)
+        features.append({
+            "feature": name,
+            "training_range": [float(matrix[:, j].min()), float(matrix[:, j].max())],
+            "breakpoints": index.breakpoints[j].tolist(),
+            "predicted_stage": [classes[i] for i in curve.argmax(axis=1)],
+            "expected_stage": (curve @ np.asarray(classes, dtype=np.float64)).tolist(),
+            "stage_probabilities": [
+                {"stage": c, "probabilities": curve[:, i].tolist()} for i, c in enumerate(classes)
+            ]
+        })
+    return {"model_version": model.version, "rows": len(matrix), "features": features}
+
+class PartialDependenceCache:
+    """
+    Curves of the last few model versions, each computed once
+    
+    Requests arriving while a version is being computed wait for the same
+    computation. A failed computation is not kept, so the next request
+    retries.
+    """
+    def __init__(self, max_versions: int):
+        self._max_versions = max(1, max_versions)
+        self._entries: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """The training rows, read on first use"""
+        if self._matrix is None:
+            self._matrix = training_matrix()
+        return self._matrix
+    
+    async def get(self, version: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """The curves of a model version, from compute() the first time"""
+        future = self._entries.get(version)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda done: self._discard_failed(version, done))
+            self._entries[version] = future
+            while len(self._entries) > self._max_versions:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(version)
+        # A client going away must not cancel the computation others wait for
+        return await asyncio.shield(future)
+    
+    def _discard_failed(self, version: str, future: asyncio.Future):
+        if (future.cancelled() or future.exception() is not None) and self._entries.get(version) is future:
+            del self._entries[version]
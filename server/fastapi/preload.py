@@ -0,0 +1,82 @@
+"""Share one loaded model between gunicorn workers"""
+import gc
+import os
+from typing import Any, Dict, Optional
+
+from model import IRCModel
+
+# pid of the master that loaded the model, inherited by the forked workers
+_preloaded_by: Optional[int] = None
+
+# Fields of /proc/self/smaps_rollup reported on /model/status (kB)
+_SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb"
+}
+
+def prepare_for_fork(model: IRCModel, timeout: float) -> bool:
+    """
+    Get the model ready to be shared by forked workers
+    
+    Called in the gunicorn master once the application is loaded, before any
+    worker is forked.
+    
+    Args:
+        model: Model of the preloaded application
+        timeout: Seconds to wait for a model that loads in the background
+    
+    Returns:
+        True if the model was ready before the timeout
+    """
+    global _preloaded_by
+    
+    ready = model.wait_until_ready(timeout)
+    # Worker processes started by the warm-up belong to the master: every
+    # forked worker starts its own
+    model.stop_processes()
+    # Collect first so garbage is not frozen along with the model
+    gc.collect()
+    gc.freeze()
+    _preloaded_by = os.getpid()
+    return ready
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, float]:
+    """
+    Memory of the current process (or of another process by pid) in MB
+    
+    PSS splits shared pages between the processes mapping them, so the sum of
+    the workers' PSS is the real footprint of the service; RSS counts the
+    shared model once per worker.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as file:
+            lines = file.readlines()
+    except OSError:
+        if pid is not None:
+            return {}
+        # Not Linux: only the peak RSS is available
+        import resource
+        
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"max_rss_mb": round(max_rss / 1024, 1)}
+    
+    usage = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in _SMAPS_FIELDS:
+            usage[_SMAPS_FIELDS[name]] = round(int(value.split()[0]) / 1024, 1)
+    return usage
+
+def get_status() -> Dict[str, Any]:
+    """Get the preloading state and memory usage of this worker"""
+    return {
+        "pid": os.getpid(),
+        "preloaded": _preloaded_by is not None and _preloaded_by != os.getpid(),
+        "preloaded_by": _preloaded_by,
+        "frozen_objects": gc.get_freeze_count(),
+        "memory": memory_usage()
+    }
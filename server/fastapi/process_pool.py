@@ -0,0 +1,439 @@
+"""Walk the forest on a pool of worker processes"""
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from compiled_forest import CompiledForest
+
+class WorkerError(Exception):
+    """Raised when a worker process cannot be started, has died or stopped answering"""
+
+def _serve(path: str, shared_memory: str, max_rows: int, n_features: int, connection):
+    """Main loop of a worker process: walk the rows written in shared memory when told to"""
+    from artifact import load_artifact
+    
+    forest, _ = load_artifact(path, mmap=True, verify=False)
+    block = SharedMemory(name=shared_memory)
+    inputs = np.ndarray((max_rows, n_features), dtype=np.float64, buffer=block.buf)
+    leaves = np.ndarray((max_rows, forest.n_estimators), dtype=np.intp, buffer=block.buf, offset=inputs.nbytes)
+    # Fault in the node arrays before the first request
+    forest.apply(np.zeros((1, n_features)))
+    connection.send(("ready", os.getpid(), forest.n_estimators))
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                # The server process is gone
+                break
+            if message[0] == "apply":
+                count = message[1]
+                try:
+                    leaves[:count] = forest.apply(inputs[:count])
+                except Exception as e:
+                    connection.send(("error", str(e)))
+                else:
+                    connection.send(("ok", count))
+            elif message[0] == "ping":
+                connection.send(("pong",))
+            else:
+                break
+    finally:
+        del inputs, leaves
+        block.close()
+
+class _Worker:
+    """One worker process, its pipe and its shared memory block (owned by the server process)"""
+    def __init__(self, context, name: str, path: str, max_rows: int, n_features: int, n_trees: int):
+        self._context = context
+        self.name = name
+        self._path = path
+        self._max_rows = max_rows
+        self._n_features = n_features
+        self._n_trees = n_trees
+        self._block = SharedMemory(
+            create=True,
+            size=max_rows * (n_features * np.dtype(np.float64).itemsize + n_trees * np.dtype(np.intp).itemsize)
+        )
+        self.inputs = np.ndarray((max_rows, n_features), dtype=np.float64, buffer=self._block.buf)
+        self.leaves = np.ndarray((max_rows, n_trees), dtype=np.intp, buffer=self._block.buf, offset=self.inputs.nbytes)
+        self.process = None
+        self.connection = None
+        self.pid: Optional[int] = None
+    
+    def start(self):
+        """Spawn the process; wait_ready tells when it can take calls"""
+        self.connection, child_connection = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_serve,
+            args=(self._path, self._block.name, self._max_rows, self._n_features, child_connection),
+            name=self.name,
+            daemon=True
+        )
+        try:
+            self.process.start()
+        finally:
+            child_connection.close()
+    
+    def wait_ready(self, timeout: float):
+        reply = self.receive(timeout)
+        if reply[0] != "ready" or reply[2] != self._n_trees:
+            raise WorkerError(f"{self.name} did not load the expected forest: {reply}")
+        self.pid = reply[1]
+    
+    def receive(self, timeout: float):
+        """
+        Next reply of the process
+        
+        Raises:
+            WorkerError: if the process died or did not answer in time
+        """
+        try:
+            if not self.connection.poll(timeout):
+                raise WorkerError(f"{self.name} did not answer within {timeout}s")
+            return self.connection.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"{self.name} exited with code {self.process.exitcode}: {e!r}")
+    
+    def send(self, message):
+        try:
+            self.connection.send(message)
+        except OSError as e:
+            raise WorkerError(f"{self.name} is unreachable: {e!r}")
+    
+    def stop(self):
+        """Stop the process, killing it if it does not exit by itself"""
+        if self.process is None:
+            return
+        try:
+            self.connection.send(("stop",))
+        except OSError:
+            pass
+        if self.process.pid is not None:
+            self.process.join(1.0)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.connection.close()
+        self.process = self.connection = self.pid = None
+    
+    def close(self):
+        """Stop the process and release the shared memory block"""
+        self.stop()
+        self.inputs = self.leaves = None
+        try:
+            self._block.close()
+        except BufferError:
+            # A call still holds a view: the mapping goes away with it
+            pass
+        self._block.unlink()
+
+def default_processes() -> int:
+    """
+    One worker process per CPU, divided between the server workers
+    
+    Read when the workers start: gunicorn.conf.py sets SERVER_WORKERS
+    before forking, after a preloaded model was created.
+    """
+    server_workers = int(os.environ.get("SERVER_WORKERS") or os.environ.get("WORKERS") or "1")
+    return max(1, (os.cpu_count() or 1) // max(1, server_workers))
+
+class ForestPool:
+    """
+    Worker processes walking the trees of a compiled artifact
+    
+    Calls come from the inference threads: each call takes idle workers
+    from a queue, so up to `processes` calls (or chunks of a large batch)
+    run in parallel and the others wait for a worker.
+    """
+    def __init__(self, path: str, n_features: int, n_trees: int, processes: int, max_rows: int = 1024,
+                 timeout: float = 10.0, health_interval: float = 5.0, owns_path: bool = False):
+        """
+        Args:
+            processes: Number of workers, 0 for default_processes()
+            owns_path: Remove the artifact directory with the pool (an export
+                made by artifact_directory)
+        """
+        self.path = path
+        if owns_path:
+            weakref.finalize(self, _remove_export, path, os.getpid())
+        self._n_features = n_features
+        self._n_trees = n_trees
+        self._requested_processes = max(0, processes)
+        self._processes = self._requested_processes or default_processes()
+        self._max_rows = max(1, max_rows)
+        self._timeout = timeout
+        self._health_interval = health_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        # pid of the process the workers were started by (see start)
+        self._pid: Optional[int] = None
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._stop = threading.Event()
+        # Failed start: no new attempt before this time, so calls do not each pay for one
+        self._retry_at = 0.0
+        self._calls = 0
+        self._rows = 0
+        self._restarts = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+    
+    @property
+    def started(self) -> bool:
+        return self._pid == os.getpid()
+    
+    def start(self):
+        """
+        Start the workers in this process, unless they already are
+        
+        Raises:
+            WorkerError: if they cannot be started (tried again after
+                health_interval seconds)
+        """
+        from artifact import load_artifact
+        
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if multiprocessing.parent_process() is not None:
+                # Spawned children import the server's main module again; a
+                # model loaded there must not start workers of its own
+                raise WorkerError("Worker processes cannot start pools")
+            if time.monotonic() < self._retry_at:
+                raise WorkerError(f"Worker processes failed to start: {self._last_error}")
+            # Workers inherited from a forking parent belong to it
+            self._workers, self._idle = [], queue.Queue()
+            self._processes = self._requested_processes or default_processes()
+            try:
+                # Workers map the arrays without checking them: check them here
+                load_artifact(self.path, mmap=True, verify=True)
+                for i in range(self._processes):
+                    worker = _Worker(self._context, f"inference-{i}", self.path, self._max_rows, self._n_features,
+                                     self._n_trees)
+                    self._workers.append(worker)
+                    worker.start()
+                # Started together, then waited for: they load in parallel
+                for worker in self._workers:
+                    worker.wait_ready(self._timeout)
+            except Exception as e:
+                self._last_error = str(e)
+                self._retry_at = time.monotonic() + self._health_interval
+                for worker in self._workers:
+                    worker.close()
+                self._workers = []
+                raise WorkerError(f"Worker processes failed to start: {e}")
+            for worker in self._workers:
+                self._idle.put(worker)
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            threading.Thread(target=self._watch, args=(self._stop,), name="inference-health", daemon=True).start()
+            print(f"Inference worker processes started: {[worker.pid for worker in self._workers]}")
+    
+    def stop(self):
+        """Stop the workers of this process; the next call starts new ones"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._stop.set()
+            for worker in self._workers:
+                worker.close()
+            self._workers, self._idle = [], queue.Queue()
+            self._pid = None
+    
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Leaf reached by every row in every tree, like CompiledForest.apply
+        
+        Raises:
+            ValueError: for rows the forest refuses (NaN or infinite values)
+            WorkerError: if no worker could walk a chunk
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2D array, got {X.ndim}D")
+        self.start()
+        leaves = np.empty((len(X), self._n_trees), dtype=np.intp)
+        chunks = deque(range(0, len(X), self._max_rows))
+        self._calls += 1
+        self._rows += len(X)
+        while chunks:
+            workers = [self._acquire()]
+            # More idle workers take the next chunks in parallel
+            while len(workers) < len(chunks):
+                try:
+                    workers.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._walk(workers, [chunks.popleft() for _ in workers], X, leaves)
+            finally:
+                for worker in workers:
+                    self._idle.put(worker)
+        return leaves
+    
+    def _acquire(self) -> _Worker:
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise WorkerError(f"No worker process free within {self._timeout}s")
+    
+    def _walk(self, workers: List[_Worker], starts: List[int], X: np.ndarray, leaves: np.ndarray):
+        """Walk one chunk per worker, all sent before any reply is awaited"""
+        size = self._max_rows
+        send_errors: List[Optional[WorkerError]] = []
+        for worker, start in zip(workers, starts):
+            rows = X[start:start + size]
+            try:
+                worker.inputs[:len(rows)] = rows
+                worker.send(("apply", len(rows)))
+                send_errors.append(None)
+            except WorkerError as e:
+                send_errors.append(e)
+        # Every sent chunk is answered, even after an error, so no reply is
+        # left in a pipe for the next call
+        error = None
+        for worker, start, send_error in zip(workers, starts, send_errors):
+            rows = X[start:start + size]
+            try:
+                try:
+                    if send_error is not None:
+                        raise send_error
+                    reply = worker.receive(self._timeout)
+                except WorkerError as e:
+                    self._restart(worker, e)
+                    worker.inputs[:len(rows)] = rows
+                    worker.send(("apply", len(rows)))
+                    reply = worker.receive(self._timeout)
+                if reply[0] == "error":
+                    raise ValueError(reply[1])
+                leaves[start:start + len(rows)] = worker.leaves[:len(rows)]
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+    
+    def _restart(self, worker: _Worker, reason: Exception):
+        """Replace a dead or stuck worker process"""
+        self._failures += 1
+        self._last_error = str(reason)
+        print(f"Restarting inference worker: {reason}")
+        worker.stop()
+        worker.start()
+        worker.wait_ready(self._timeout)
+        self._restarts += 1
+    
+    def _watch(self, stop: threading.Event):
+        """Ping the idle workers regularly and replace those that do not answer"""
+        while not stop.wait(self._health_interval):
+            checked = []
+            while len(checked) < self._processes:
+                try:
+                    checked.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for worker in checked:
+                try:
+                    if stop.is_set():
+                        break
+                    try:
+                        worker.send(("ping",))
+                        if worker.receive(self._timeout)[0] != "pong":
+                            raise WorkerError(f"{worker.name} answered a ping with something else")
+                    except WorkerError as e:
+                        self._restart(worker, e)
+                except Exception as e:
+                    # Tried again at the next check, or by the next call
+                    print(f"Inference worker restart failed: {e}")
+                finally:
+                    self._idle.put(worker)
+    
+    def get_status(self) -> Dict[str, Any]:
+        started = self.started
+        workers = self._workers if started else []
+        return {
+            "processes": self._processes,
+            "started": started,
+            "pids": [worker.pid for worker in workers],
+            "alive": sum(worker.process is not None and worker.process.is_alive() for worker in workers),
+            "idle": self._idle.qsize() if started else 0,
+            "max_rows": self._max_rows,
+            "calls": self._calls,
+            "rows": self._rows,
+            "restarts": self._restarts,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "artifact": self.path
+        }
+
+class PooledForest(CompiledForest):
+    """
+    Compiled forest whose walks over all the trees run on a ForestPool
+    
+    Walks over a subset of the trees (the threshold index's incremental
+    sweeps) stay in this process. If the pool cannot answer, the trees are
+    walked here, so predictions never fail because of a worker.
+    """
+    def __init__(self, forest: CompiledForest, pool: ForestPool):
+        super().__init__(
+            forest.feature, forest.threshold, forest.children, forest.value, forest.roots, forest.classes_,
+            forest.max_depth, getattr(forest, "feature_importances_", None)
+        )
+        self.pool = pool
+        self.local_walks = 0
+        self._reported: Optional[str] = None
+    
+    def apply(self, X: np.ndarray, roots: Optional[np.ndarray] = None) -> np.ndarray:
+        if roots is not None:
+            return super().apply(X, roots)
+        try:
+            return self.pool.apply(X)
+        except ValueError:
+            raise
+        except Exception as e:
+            self.local_walks += 1
+            if str(e) != self._reported:
+                self._reported = str(e)
+                print(f"Inference worker pool unavailable, walking the trees in this process: {e}")
+            return super().apply(X)
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {**self.pool.get_status(), "local_walks": self.local_walks}
+
+def _remove_export(path: str, pid: int):
+    # Workers forked from the exporting process must not remove it on exit
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+def artifact_directory(forest: CompiledForest, source: Optional[str]) -> str:
+    """
+    Artifact directory the workers can map the forest from
+    
+    The one the model was loaded from, or else an export of the forest in a
+    new private directory (mode 0700, random name; see ForestPool's
+    owns_path): a shared, predictable path could be replaced by another
+    local user.
+    """
+    from artifact import MANIFEST_FILE, export_artifact
+    
+    if source is not None and os.path.isfile(os.path.join(source, MANIFEST_FILE)):
+        return source
+    path = tempfile.mkdtemp(prefix="nephropredict-")
+    try:
+        export_artifact(forest, path, source_path=source)
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    return path
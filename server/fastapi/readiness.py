@@ -0,0 +1,76 @@
+import asyncio
+import time
+from typing import Any, Dict, Union
+
+from model import IRCModel, MODEL_FAILED, MODEL_READY
+from registry import ModelRegistry
+
+# Accepted values of NOT_READY_POLICY
+NOT_READY_POLICIES = ("wait", "reject", "fallback")
+
+class ModelNotReady(Exception):
+    """Raised when a prediction is refused because the model is not ready"""
+    def __init__(self, state: str, retry_after: int):
+        super().__init__(f"Model not ready ({state})")
+        self.state = state
+        self.retry_after = retry_after
+
+class ReadinessGate:
+    """
+    Decide what happens to predictions received before the model is ready
+    
+    - "wait": hold the request until the model is ready, up to timeout seconds
+    - "reject": refuse it straight away
+    - "fallback": let it through; the model answers with the creatinine rule
+      and the response is flagged with "fallback": true
+    
+    Refused requests raise ModelNotReady. Once the model is ready the check
+    is a single attribute read. Given a registry, the gate follows its
+    active model, so a successful reload also opens a gate left closed by a
+    failed startup.
+    """
+    def __init__(self, model: Union[IRCModel, ModelRegistry], policy: str, timeout: float, retry_after: int,
+                 poll_interval: float = 0.02):
+        if policy not in NOT_READY_POLICIES:
+            raise ValueError(f"Unknown not-ready policy: {policy}")
+        self._model = model
+        self._policy = policy
+        self._timeout = timeout
+        self._retry_after = retry_after
+        self._poll_interval = poll_interval
+        self._waited = 0
+        self._rejected = 0
+    
+    async def check(self):
+        """
+        Apply the policy to one incoming prediction request
+        
+        Raises:
+            ModelNotReady: if the request must be answered with a 503
+        """
+        state = self._model.state
+        if state == MODEL_READY or self._policy == "fallback":
+            return
+        
+        if self._policy == "wait" and state != MODEL_FAILED:
+            self._waited += 1
+            deadline = time.perf_counter() + self._timeout
+            # The model is loaded by a plain thread, so poll its state instead
+            # of tying up an executor thread per waiting request
+            while state not in (MODEL_READY, MODEL_FAILED) and time.perf_counter() < deadline:
+                await asyncio.sleep(self._poll_interval)
+                state = self._model.state
+            if state == MODEL_READY:
+                return
+        
+        self._rejected += 1
+        raise ModelNotReady(state, self._retry_after)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the policy settings and how many requests it delayed or refused"""
+        return {
+            "policy": self._policy,
+            "timeout_s": self._timeout,
+            "waited": self._waited,
+            "rejected": self._rejected
+        }
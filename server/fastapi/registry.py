@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from artifact import MANIFEST_FILE
+from model import IRCModel, MODEL_READY
+
+class ModelVersionNotFound(Exception):
+    """Raised when a request pins a model version that is not resident"""
+    def __init__(self, version: str):
+        super().__init__(f"Model version {version} is not loaded")
+        self.version = version
+
+class ModelRegistry:
+    """
+    Resident model versions and the active one serving unpinned requests
+    
+    New versions are loaded and warmed up on a background thread while the
+    active one keeps serving. Only a version that reached MODEL_READY is
+    activated, by rebinding a single attribute: a request picks its model
+    once, so in-flight predictions finish on the version they started with
+    even if it is replaced or evicted meanwhile.
+    
+    Up to max_versions models stay resident (the active one is never
+    evicted), so requests can pin an older version and a bad release can be
+    rolled back instantly. Reloads and activations are serialized by a lock;
+    the request path only reads the active model and the version table.
+    """
+    def __init__(self, model: IRCModel, max_versions: int, watch_path: Optional[str] = None):
+        self._active = model
+        self._max_versions = max(1, max_versions)
+        self._versions: "OrderedDict[str, IRCModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._reloading: Optional[str] = None
+        self._last_reload: Optional[Dict[str, Any]] = None
+        self._watch_path = watch_path
+        self._watch_stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+    
+    @property
+    def active(self) -> IRCModel:
+        """Model serving requests that do not pin a version"""
+        return self._active
+    
+    @property
+    def state(self) -> str:
+        """Lifecycle state of the active model"""
+        return self._active.state
+    
+    def get(self, version: Optional[str] = None) -> IRCModel:
+        """
+        Model of a given version, or the active one
+        
+        Raises:
+            ModelVersionNotFound: if the version is not resident
+        """
+        active = self._active
+        if version is None or version == active.version:
+            return active
+        model = self._versions.get(version)
+        if model is None:
+            raise ModelVersionNotFound(version)
+        return model
+    
+    def reload(self, source: Optional[str] = None) -> bool:
+        """
+        Load a model version in the background and activate it once warmed up
+        
+        Args:
+            source: Pickle file or artifact directory (defaults to MODEL_ARTIFACT, then MODEL_PATH)
+        
+        Returns:
+            False if a reload is already running
+        """
+        with self._lock:
+            if self._reloading is not None:
+                return False
+            self._reloading = source or config.MODEL_ARTIFACT or config.MODEL_PATH
+        thread = threading.Thread(target=self._reload, args=(source,), name="model-reload", daemon=True)
+        thread.start()
+        return True
+    
+    def _reload(self, source: Optional[str]):
+        started = time.perf_counter()
+        outcome: Dict[str, Any] = {"source": self._reloading, "started_at": time.time()}
+        try:
+            candidate = IRCModel(source=source)
+            if candidate.state != MODEL_READY:
+                outcome["result"] = "failed"
+            elif candidate.version == self._active.version:
+                outcome["result"] = "unchanged"
+            else:
+                # Stage timings and fallback counts of the new model go to the same metrics
+                candidate.metrics = self._active.metrics
+                self.activate_model(candidate)
+                outcome["result"] = "activated"
+            if outcome["result"] != "activated":
+                # Discarded: its warm-up may have started worker processes
+                candidate.stop_processes()
+            outcome["version"] = candidate.version
+        except Exception as e:
+            outcome.update(result="failed", error=str(e))
+        outcome["duration_ms"] = (time.perf_counter() - started) * 1000
+        print(f"Model reload {outcome['result']}: {outcome.get('version')} from {outcome['source']}")
+        with self._lock:
+            self._last_reload = outcome
+            self._reloading = None
+    
+    def activate_model(self, model: IRCModel):
+        """Make a ready model the active one and evict the versions beyond max_versions"""
+        with self._lock:
+            previous = self._active
+            if previous.version is not None and previous.state == MODEL_READY:
+                self._versions[previous.version] = previous
+            self._versions[model.version] = model
+            self._versions.move_to_end(model.version)
+            self._active = model
+            while len(self._versions) > self._max_versions:
+                evicted, evicted_model = self._versions.popitem(last=False)
+                # Calls still running on it walk the trees in their own process
+                evicted_model.stop_processes()
+                print(f"Model version {evicted} evicted")
+    
+    def activate(self, version: str) -> IRCModel:
+        """
+        Make a resident version the active one again (rollback)
+        
+        Raises:
+            ModelVersionNotFound: if the version is not resident
+        """
+        model = self.get(version)
+        if model is not self._active:
+            self.activate_model(model)
+        return model
+    
+    def start_watching(self, interval: float):
+        """
+        Reload the model whenever its file changes on disk
+        
+        Polling the modification time needs no extra dependency and works on
+        every filesystem. The watcher is a plain thread, so it must be started
+        in every worker process (after the fork).
+        """
+        if self._watcher is not None or not self._watch_path:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(self._watch_path, interval), name="model-watch", daemon=True
+        )
+        self._watcher.start()
+    
+    def stop_watching(self):
+        self._watch_stop.set()
+    
+    def stop_processes(self):
+        """Stop the inference worker processes of every resident version"""
+        with self._lock:
+            models = {id(model): model for model in (self._active, *self._versions.values())}
+        for model in models.values():
+            model.stop_processes()
+    
+    def _watch(self, path: str, interval: float):
+        last = _fingerprint(path)
+        while not self._watch_stop.wait(interval):
+            current = _fingerprint(path)
+            if current != last and current is not None:
+                print(f"Model file {path} changed, reloading")
+                # A file still being written fails to load and is retried on its next change
+                if self.reload(path):
+                    last = current
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the resident versions with their memory use and the reload state"""
+        with self._lock:
+            active = self._active
+            models: List[Tuple[str, IRCModel]] = list(self._versions.items())
+        if active.version not in self._versions:
+            models.append((active.version, active))
+        versions = []
+        for version, model in models:
+            status = model.get_status()
+            versions.append({
+                "version": version,
+                "active": model is active,
+                "state": status["state"],
+                "source": status["source"],
+                "backend": status["backend"],
+                "memory": model.memory_usage()
+            })
+        return {
+            "active_version": active.version,
+            "max_versions": self._max_versions,
+            "versions": versions,
+            "resident_private_mb": round(sum(v["memory"]["private_mb"] for v in versions), 2),
+            "reloading": self._reloading,
+            "last_reload": self._last_reload,
+            "watching": self._watch_path if self._watcher is not None else None,
+            "pid": os.getpid()
+        }
+
+def _fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a pickle file or of an artifact's manifest (written last)"""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,242 @@
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Dict, Any, Optional
+import datetime
+import math
+import numpy as np
+from model import FEATURE_NAMES
+
+# Input data model
+class PredictionInput(BaseModel):
+    """Input data for IRC stage prediction"""
+    créatinine_mg_L: float = Field(alias="Créatinine (mg/L)", description="Blood creatinine level in mg/L")
+    urée_g_L: float = Field(alias="Urée (g/L)", description="Blood urea level in g/L")
+    age: int = Field(alias="Age", description="Patient's age in years")
+    sodium_meq_L: float = Field(alias="Na^+ (meq/L)", description="Blood sodium level in meq/L")
+    ta_systole: float = Field(alias="TA (mmHg)/Systole", description="Systolic blood pressure in mmHg")
+    choc_de_pointe: int = Field(alias="Choc de Pointe/Perçu", description="Presence of shock, 0 or 1")
+    sexe_M: int = Field(alias="Sexe_M", description="Gender: 1 for male, 0 for female")
+    anémie_true: int = Field(alias="Anémie_True", description="Presence of anemia: 1 if present, 0 otherwise")
+    glasgow: float = Field(alias="Score de Glasgow (/15)", description="Glasgow score on a scale of 3 to 15")
+    tabac_true: int = Field(alias="Enquête Sociale/Tabac_True", description="Tobacco use: 1 if yes, 0 if no")
+    alcool_true: int = Field(alias="Enquête Sociale/Alcool_True", description="Alcohol consumption: 1 if yes, 0 if no")
+    
+    class Config:
+        populate_by_name = True
+        schema_extra = {
+            "example": {
+                "Créatinine (mg/L)": 42.0,
+                "Urée (g/L)": 1.14,
+                "Age": 68,
+                "Na^+ (meq/L)": 142.0,
+                "TA (mmHg)/Systole": 130.0,
+                "Choc de Pointe/Perçu": 0,
+                "Sexe_M": 1,
+                "Anémie_True": 1,
+                "Score de Glasgow (/15)": 15.0,
+                "Enquête Sociale/Tabac_True": 0,
+                "Enquête Sociale/Alcool_True": 1
+            }
+        }
+    
+    def to_feature_row(self) -> np.ndarray:
+        """(1, n_features) matrix of the patient in FEATURE_NAMES order"""
+        model_input = self.to_model_input()
+        return np.array([[float(model_input[name]) for name in FEATURE_NAMES]], dtype=np.float64)
+    
+    def to_model_input(self) -> Dict[str, Any]:
+        """Convert the input to the format expected by the model"""
+        return {
+            'Créatinine (mg/L)': self.créatinine_mg_L,
+            'Urée (g/L)': self.urée_g_L,
+            'Age': self.age,
+            'Na^+ (meq/L)': self.sodium_meq_L,
+            'TA (mmHg)/Systole': self.ta_systole,
+            'Choc de Pointe/Perçu': self.choc_de_pointe,
+            'Score de Glasgow (/15)': self.glasgow,
+            'Sexe_M': self.sexe_M,
+            'Anémie_True': self.anémie_true,
+            'Enquête Sociale/Tabac_True': self.tabac_true,
+            'Enquête Sociale/Alcool_True': self.alcool_true
+        }
+
+# (alias, integer field) of every PredictionInput field, in FEATURE_NAMES order
+_ROW_FIELDS = tuple(
+    (name, field.annotation is int)
+    for name in FEATURE_NAMES
+    for field in PredictionInput.model_fields.values()
+    if field.alias == name
+)
+
+# Features validated as integers (age and the 0/1 indicators)
+INTEGER_FEATURES = frozenset(name for name, integer in _ROW_FIELDS if integer)
+
+def parse_feature_row(data: Any) -> np.ndarray:
+    """
+    Validate a /predict body straight into a (1, n_features) matrix in FEATURE_NAMES order
+    
+    Bodies keyed by alias with plain JSON numbers of the field's type (what
+    the web client sends) are copied into the row without building a
+    PredictionInput. Anything else (numeric strings, field names, integral
+    floats for int fields, invalid values) goes through the Pydantic model,
+    so coercion rules and error messages are unchanged.
+    
+    Raises:
+        pydantic.ValidationError: if the body is not a valid PredictionInput
+    """
+    if type(data) is dict:
+        row = np.empty((1, len(_ROW_FIELDS)), dtype=np.float64)
+        values = row[0]
+        try:
+            for j, (name, integer) in enumerate(_ROW_FIELDS):
+                value = data[name]
+                kind = type(value)
+                if kind is int or (kind is float and not integer and math.isfinite(value)):
+                    values[j] = value
+                else:
+                    break
+            else:
+                return row
+        except (KeyError, OverflowError):
+            pass
+    
+    return PredictionInput.model_validate(data).to_feature_row()
+
+# Stage probability model
+class StageProbability(BaseModel):
+    stage: int
+    probability: float
+
+# Feature importance model
+class FeatureImportance(BaseModel):
+    feature: str
+    importance: float
+
+# Per-patient feature contribution model
+class FeatureContribution(BaseModel):
+    feature: str
+    contribution: float
+
+# Prediction output model
+class PredictionOutput(BaseModel):
+    predicted_stage: int
+    confidence: float
+    stage_probabilities: List[StageProbability]
+    feature_importance: List[FeatureImportance]
+    # Explanation of the confidence: base_probability plus the sum of the
+    # contributions (null when explain=false or for fallback answers)
+    base_probability: Optional[float] = None
+    feature_contributions: Optional[List[FeatureContribution]] = None
+    # True when the model was not ready and the creatinine rule answered instead
+    fallback: bool = False
+
+# Batch input model
+class BatchPredictionInput(BaseModel):
+    """
+    Input data for scoring many patients at once
+    
+    Exactly one of 'records' (a list of patients keyed like /predict) or
+    'columns' (one list of values per feature) must be provided.
+    """
+    records: Optional[List[Dict[str, Any]]] = None
+    columns: Optional[Dict[str, List[Any]]] = None
+
+# Per-row batch prediction model
+class BatchRowPrediction(BaseModel):
+    index: int
+    predicted_stage: int
+    confidence: float
+    stage_probabilities: List[StageProbability]
+    base_probability: Optional[float] = None
+    feature_contributions: Optional[List[FeatureContribution]] = None
+    fallback: bool = False
+
+# Per-row batch error model
+class BatchRowError(BaseModel):
+    index: int
+    error: str
+
+# Batch output model
+class BatchPredictionOutput(BaseModel):
+    count: int
+    predictions: List[BatchRowPrediction]
+    errors: List[BatchRowError]
+    feature_importance: List[FeatureImportance]
+
+# Trajectory visit model
+class Visit(PredictionInput):
+    """Labs and examination of a patient at one visit"""
+    date: datetime.date = Field(description="Visit date (YYYY-MM-DD)")
+
+# Trajectory input model
+class TrajectoryInput(BaseModel):
+    """
+    Visits of one patient, scored together
+    
+    Visits are put in date order. With a patient_id the trajectory is kept,
+    so later visits can be appended one at a time.
+    """
+    patient_id: Optional[str] = Field(None, max_length=128)
+    visits: List[Visit] = Field(min_length=1)
+
+# Swept feature model
+class SweepInput(BaseModel):
+    """A feature to vary, from min to max in steps evenly spaced values"""
+    feature: str = Field(description="Feature name, as in /predict (e.g. \"Créatinine (mg/L)\")")
+    min: float
+    max: float
+    steps: int = Field(50, ge=2)
+    
+    @field_validator("feature")
+    @classmethod
+    def known_feature(cls, value: str) -> str:
+        if value not in FEATURE_NAMES:
+            raise ValueError(f"Unknown feature, expected one of: {', '.join(FEATURE_NAMES)}")
+        return value
+    
+    @model_validator(mode="after")
+    def ordered_range(self) -> "SweepInput":
+        if not (math.isfinite(self.min) and math.isfinite(self.max) and self.min < self.max):
+            raise ValueError("min must be lower than max")
+        return self
+
+# Sensitivity sweep input model
+class SensitivityInput(BaseModel):
+    """One patient and the one or two features to sweep"""
+    patient: PredictionInput
+    sweeps: List[SweepInput] = Field(min_length=1, max_length=2)
+    
+    @model_validator(mode="after")
+    def distinct_features(self) -> "SensitivityInput":
+        if len({sweep.feature for sweep in self.sweeps}) != len(self.sweeps):
+            raise ValueError("Swept features must be different")
+        return self
+
+# Model status model
+class ModelStatus(BaseModel):
+    status: str
+    model_loaded: bool
+    model_loading: bool
+    model_type: Optional[str] = None
+    state: Optional[str] = None
+    timings: Optional[Dict[str, Optional[float]]] = None
+    readiness: Optional[Dict[str, Any]] = None
+    executor: Optional[Dict[str, Any]] = None
+    micro_batching: Optional[Dict[str, Any]] = None
+    cache: Optional[Dict[str, Any]] = None
+    trajectories: Optional[Dict[str, Any]] = None
+    process: Optional[Dict[str, Any]] = None
+    audit: Optional[Dict[str, Any]] = None
+
+# Model reload request model
+class ModelReloadInput(BaseModel):
+    # Pickle file or compiled artifact directory; defaults to MODEL_ARTIFACT, then MODEL_PATH
+    source: Optional[str] = None
+
+# Shadow model request model
+class ShadowModelInput(BaseModel):
+    # Pickle file or compiled artifact directory; null stops shadow scoring
+    source: Optional[str] = None
+
+# Model activation (rollback) request model
+class ModelActivateInput(BaseModel):
+    version: str
@@ -0,0 +1,292 @@
+"""
+Bulk scoring of patient files shaped like the training CSV
+
+Usage:
+    python score.py INPUT [-o OUTPUT] [--format csv|ndjson] [--chunk-size N]
+                          [--workers N] [--keep COLUMN ...]
+
+INPUT and OUTPUT default to stdin/stdout ("-"). The output has the input's
+format unless --output-format is given.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+import config
+from dataset import RAW_COLUMN_MAP
+from model import FEATURE_NAMES, BatchPredictionResult, IRCModel
+
+FORMATS = ("csv", "ndjson")
+
+# IRC stages, one probability column each in the output
+STAGES = range(6)
+
+# Raw column name of each one-hot feature
+_RAW_NAMES = {feature: raw for raw, feature in RAW_COLUMN_MAP.items()}
+
+# Textual spellings accepted for the one-hot features in raw files
+_BINARY_TOKENS = {
+    "1": 1.0, "true": 1.0, "oui": 1.0, "yes": 1.0, "m": 1.0,
+    "0": 0.0, "false": 0.0, "non": 0.0, "no": 0.0, "f": 0.0
+}
+
+@dataclass(frozen=True)
+class Chunk:
+    """
+    A block of input rows ready to be scored
+    
+    columns maps every model feature to its raw values for the block; kept
+    holds the passthrough columns of each row, and parse_errors the rows
+    (by offset in the block) that could not even be read.
+    """
+    start: int
+    columns: Dict[str, List[Any]]
+    kept: List[Dict[str, Any]]
+    parse_errors: Dict[int, str]
+    
+    def __len__(self) -> int:
+        return len(self.kept)
+
+def detect_format(path: Optional[str]) -> str:
+    """Guess the format of a file from its extension (CSV by default)"""
+    if path and os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "csv"
+
+def _binary(value: Any) -> Any:
+    """Map textual yes/no spellings of a one-hot feature to 1.0/0.0"""
+    if isinstance(value, str):
+        return _BINARY_TOKENS.get(value.strip().lower(), value)
+    return value
+
+def _to_columns(records: Sequence[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Collect the model features of a block of records, accepting raw column names"""
+    columns = {}
+    for name in FEATURE_NAMES:
+        raw = _RAW_NAMES.get(name)
+        values = [record.get(name, record.get(raw)) if raw else record.get(name) for record in records]
+        columns[name] = [_binary(v) for v in values] if raw else values
+    return columns
+
+def _read_csv(stream: TextIO, chunk_size: int, keep: Sequence[str]) -> Iterator[Chunk]:
+    """Read a CSV file chunk by chunk"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    missing = [
+        f"{name} (or {_RAW_NAMES[name]})" if name in _RAW_NAMES else name
+        for name in FEATURE_NAMES
+        if name not in header and _RAW_NAMES.get(name) not in header
+    ]
+    missing += [name for name in keep if name not in header]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    
+    start = 0
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            return
+        records = [dict(zip(header, row)) for row in rows]
+        yield Chunk(
+            start=start,
+            columns=_to_columns(records),
+            kept=[{name: record.get(name) for name in keep} for record in records],
+            parse_errors={}
+        )
+        start += len(rows)
+
+def _read_ndjson(stream: TextIO, chunk_size: int, keep: Sequence[str]) -> Iterator[Chunk]:
+    """Read a newline-delimited JSON file chunk by chunk"""
+    lines = (line for line in stream if line.strip())
+    start = 0
+    while True:
+        block = list(islice(lines, chunk_size))
+        if not block:
+            return
+        records, parse_errors = [], {}
+        for offset, line in enumerate(block):
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as e:
+                record = {}
+                parse_errors[offset] = f"Invalid JSON line: {e}"
+            records.append(record)
+        yield Chunk(
+            start=start,
+            columns=_to_columns(records),
+            kept=[{name: record.get(name) for name in keep} for record in records],
+            parse_errors=parse_errors
+        )
+        start += len(block)
+
+def read_chunks(stream: TextIO, fmt: str, chunk_size: int, keep: Sequence[str] = ()) -> Iterator[Chunk]:
+    """
+    Split an input stream into chunks of at most chunk_size rows
+    
+    Raises:
+        ValueError: if the format is unknown or a CSV header lacks a model feature
+    """
+    if fmt == "csv":
+        return _read_csv(stream, chunk_size, keep)
+    if fmt == "ndjson":
+        return _read_ndjson(stream, chunk_size, keep)
+    raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+def score_chunk(model: IRCModel, chunk: Chunk) -> List[Dict[str, Any]]:
+    """Score a chunk with one model call and build one output record per input row"""
+    return chunk_records(chunk, model.predict_batch(chunk.columns))
+
+def chunk_records(chunk: Chunk, result: BatchPredictionResult) -> List[Dict[str, Any]]:
+    """One output record per input row of a scored chunk"""
+    records = [{"row": chunk.start + offset, **kept} for offset, kept in enumerate(chunk.kept)]
+    for offset, prediction in zip(result.indices, result.predictions):
+        record = records[offset]
+        record["predicted_stage"] = prediction.predicted_stage
+        record["confidence"] = prediction.confidence
+        for stage in STAGES:
+            record[f"probability_stage_{stage}"] = prediction.stage_probabilities.get(stage, 0.0)
+        record["fallback"] = prediction.fallback
+    for error in result.errors:
+        records[error.index]["error"] = chunk.parse_errors.get(error.index, error.error)
+    return records
+
+class ResultWriter:
+    """Format output records as CSV (with a fixed header) or NDJSON"""
+    def __init__(self, fmt: str, keep: Sequence[str] = ()):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+        self.fmt = fmt
+        self.fields = [
+            "row", *keep, "predicted_stage", "confidence",
+            *(f"probability_stage_{stage}" for stage in STAGES), "fallback", "error"
+        ]
+    
+    @property
+    def media_type(self) -> str:
+        return "text/csv" if self.fmt == "csv" else "application/x-ndjson"
+    
+    def header(self) -> str:
+        """Text written before the first chunk"""
+        if self.fmt == "ndjson":
+            return ""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(self.fields)
+        return buffer.getvalue()
+    
+    def format(self, records: List[Dict[str, Any]]) -> str:
+        """Text of a block of records"""
+        if self.fmt == "ndjson":
+            return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, self.fields).writerows(records)
+        return buffer.getvalue()
+
+def score_next(model: IRCModel, chunks: Iterator[Chunk],
+               writer: ResultWriter) -> Optional[Tuple[str, Chunk, BatchPredictionResult]]:
+    """
+    Read, score and format the next chunk
+    
+    Returns:
+        The formatted text, the chunk and its batch result (for the audit
+        log), or None at the end of the input
+    """
+    chunk = next(chunks, None)
+    if chunk is None:
+        return None
+    result = model.predict_batch(chunk.columns)
+    return writer.format(chunk_records(chunk, result)), chunk, result
+
+# Model of a scoring worker process, inherited from the parent when processes are forked
+_worker_model: Optional[IRCModel] = None
+
+def _load_model() -> IRCModel:
+    """Load the model without mixing its log lines into an output written to stdout"""
+    with redirect_stdout(sys.stderr):
+        return IRCModel()
+
+def _init_worker():
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = _load_model()
+
+def _score_in_worker(chunk: Chunk, writer: ResultWriter) -> Tuple[str, int, int]:
+    records = score_chunk(_worker_model, chunk)
+    return writer.format(records), len(records), sum("error" in record for record in records)
+
+def score_stream(chunks: Iterator[Chunk], writer: ResultWriter, workers: int = 1) -> Iterator[Tuple[str, int, int]]:
+    """
+    Score chunks in input order, in this process or in a pool of worker processes
+    
+    With workers > 1 at most 2 * workers chunks are in flight at once, so the
+    pool never reads ahead of the output by more than that.
+    """
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = _load_model()
+    
+    if workers <= 1:
+        for chunk in chunks:
+            yield _score_in_worker(chunk, writer)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk, writer))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Score a CSV or NDJSON file of patients in chunks")
+    parser.add_argument("input", nargs="?", default="-", help="input file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--output-format", choices=FORMATS, help="output format (default: the input format)")
+    parser.add_argument("--chunk-size", type=int, default=config.SCORING_CHUNK_SIZE, help="rows scored per model call")
+    parser.add_argument("--workers", type=int, default=1, help="processes scoring chunks in parallel")
+    parser.add_argument("--keep", nargs="*", default=[], help="input columns copied to the output (e.g. an id)")
+    args = parser.parse_args(argv)
+    
+    fmt = args.format or detect_format(args.input)
+    writer = ResultWriter(args.output_format or fmt, args.keep)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    
+    started = time.perf_counter()
+    n_rows = n_errors = 0
+    try:
+        target.write(writer.header())
+        for text, rows, errors in score_stream(read_chunks(source, fmt, args.chunk_size, args.keep), writer, args.workers):
+            target.write(text)
+            n_rows += rows
+            n_errors += errors
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    
+    elapsed = time.perf_counter() - started
+    print(
+        f"Scored {n_rows} rows ({n_errors} errors) in {elapsed:.2f}s, {n_rows / elapsed if elapsed else 0:.0f} rows/s",
+        file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""What-if sensitivity sweeps of one patient over one or two features"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from model import FEATURE_NAMES, IRCModel
+from schemas import INTEGER_FEATURES
+from thresholds import next_float32
+
+@dataclass(frozen=True)
+class Sweep:
+    """Values taken by one feature over the grid"""
+    feature: str
+    values: np.ndarray
+    
+    @property
+    def column(self) -> int:
+        return FEATURE_NAMES.index(self.feature)
+
+def sweep_values(feature: str, low: float, high: float, steps: int) -> np.ndarray:
+    """
+    Evenly spaced values of a feature between low and high
+    
+    Integer features (age, the 0/1 indicators) are rounded, so their sweep
+    may hold fewer than steps values.
+    """
+    values = np.linspace(low, high, steps)
+    if feature in INTEGER_FEATURES:
+        values = np.unique(np.round(values))
+    return values
+
+def build_grid(row: np.ndarray, sweeps: Sequence[Sweep]) -> np.ndarray:
+    """
+    The patient's row repeated over the grid of the swept values
+    
+    Returns:
+        (n_points, n_features) matrix, the last swept feature varying fastest
+    """
+    shape = tuple(len(sweep.values) for sweep in sweeps)
+    grid = np.repeat(row, int(np.prod(shape)), axis=0)
+    axes = np.meshgrid(*(sweep.values for sweep in sweeps), indexing="ij")
+    for sweep, axis in zip(sweeps, axes):
+        grid[:, sweep.column] = axis.ravel()
+    return grid
+
+def _thresholds(sweeps: Sequence[Sweep], stages: np.ndarray) -> List[Dict[str, Any]]:
+    """Grid intervals of each swept feature across which the predicted stage changes"""
+    thresholds = []
+    for axis, sweep in enumerate(sweeps):
+        # Stage changes between consecutive values of this feature, the other one held fixed
+        before = np.take(stages, np.arange(len(sweep.values) - 1), axis=axis)
+        after = np.take(stages, np.arange(1, len(sweep.values)), axis=axis)
+        for index in np.argwhere(before != after):
+            position = tuple(index)
+            i = position[axis]
+            threshold = {
+                "feature": sweep.feature,
+                "from_stage": int(before[position]),
+                "to_stage": int(after[position]),
+                "lower": float(sweep.values[i]),
+                "upper": float(sweep.values[i + 1]),
+                "exact": False
+            }
+            if len(sweeps) == 2:
+                other = sweeps[1 - axis]
+                threshold["at"] = {other.feature: float(other.values[position[1 - axis]])}
+            thresholds.append(threshold)
+    return thresholds
+
+def _exact_thresholds(sweep: Sweep, crossed: np.ndarray, stages: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Breakpoints across which the predicted stage changes
+    
+    Args:
+        crossed: Breakpoints crossed by the sweep, in order
+        stages: Stage at the start of the sweep, then just above each breakpoint
+    """
+    return [
+        {
+            "feature": sweep.feature,
+            "from_stage": int(stages[k]),
+            "to_stage": int(stages[k + 1]),
+            "lower": float(crossed[k]),
+            "upper": float(next_float32(crossed[k])),
+            "exact": True
+        }
+        for k in np.flatnonzero(stages[:-1] != stages[1:])
+    ]
+
+def sensitivity_sweep(model: IRCModel, row: np.ndarray, sweeps: Sequence[Sweep]) -> Dict[str, Any]:
+    """
+    Score a patient over a grid of one or two features in one model call
+    
+    Args:
+        row: (1, n_features) matrix of the patient in FEATURE_NAMES order
+        sweeps: The swept features and their values
+    
+    Returns:
+        The patient's own prediction, the grid axes, the stage, confidence
+        and per-stage probability surfaces (nested lists shaped like the
+        grid) and the decision thresholds
+    """
+    shape = tuple(len(sweep.values) for sweep in sweeps)
+    n_points = int(np.prod(shape))
+    index = model.threshold_index
+    crossed = None
+    if index is not None and len(sweeps) == 1:
+        sweep = sweeps[0]
+        crossed = index.crossed(sweep.column, sweep.values[0], sweep.values[-1])
+        starts = np.append(np.float32(sweep.values[0]), next_float32(crossed))
+        segments = np.repeat(row, len(starts), axis=0)
+        segments[:, sweep.column] = starts
+    else:
+        segments = row[:0]
+    # The patient's own row and the sweep's segments are scored in the same call
+    matrix = np.vstack([build_grid(row, sweeps), row, segments])
+    classes, stages, probabilities, fallback = model.predict_probabilities(matrix)
+    baseline_stage, baseline_probabilities = int(stages[n_points]), probabilities[n_points]
+    segment_stages = stages[n_points + 1:]
+    stages = stages[:n_points].reshape(shape)
+    probabilities = probabilities[:n_points].reshape(shape + (len(classes),))
+    # Classes are sorted, so a stage's column is its rank among them
+    columns = np.searchsorted(np.asarray(classes), stages)
+    confidence = np.take_along_axis(probabilities, columns[..., None], axis=-1)[..., 0]
+    class_index = {c: i for i, c in enumerate(classes)}
+    
+    return {
+        "model_version": model.version,
+        "fallback": fallback,
+        "points": n_points,
+        "baseline": {
+            "predicted_stage": baseline_stage,
+            "confidence": float(baseline_probabilities[class_index[baseline_stage]]),
+            "stage_probabilities": [
+                {"stage": c, "probability": float(baseline_probabilities[i])} for i, c in enumerate(classes)
+            ]
+        },
+        "features": [{"feature": sweep.feature, "values": sweep.values.tolist()} for sweep in sweeps],
+        "predicted_stage": stages.tolist(),
+        "confidence": confidence.tolist(),
+        "stage_probabilities": [
+            {"stage": c, "probabilities": probabilities[..., i].tolist()} for i, c in enumerate(classes)
+        ],
+        "thresholds": _exact_thresholds(sweeps[0], crossed, segment_stages)
+        if crossed is not None and not fallback else _thresholds(sweeps, stages)
+    }
@@ -0,0 +1,199 @@
+import asyncio
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+
+import config
+from executor import ExecutorSaturated, InferenceExecutor
+from model import IRCModel, PredictionResult, MODEL_READY
+
+# Stages of the agreement matrix
+STAGES = range(6)
+
+# Latencies kept for the percentiles of each model
+LATENCY_WINDOW = 1000
+
+def _percentiles(values: Deque[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        "p50_ms": round(ordered[last // 2], 3),
+        "p95_ms": round(ordered[min(last, int(len(ordered) * 0.95))], 3),
+        "p99_ms": round(ordered[min(last, int(len(ordered) * 0.99))], 3)
+    }
+
+class ShadowComparison:
+    """Running comparison of the primary and shadow answers for the same patients"""
+    def __init__(self, primary_version: Optional[str], shadow_version: Optional[str]):
+        self.primary_version = primary_version
+        self.shadow_version = shadow_version
+        self.compared = 0
+        self.agreed = 0
+        # agreement[primary stage][shadow stage]
+        self.agreement = [[0] * len(STAGES) for _ in STAGES]
+        self.confidence_delta_sum = 0.0
+        self.abs_confidence_delta_sum = 0.0
+        self.total_variation_sum = 0.0
+        self.max_total_variation = 0.0
+        self.primary_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.shadow_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+    
+    def add(self, primary: PredictionResult, shadow: PredictionResult, primary_ms: float, shadow_ms: float):
+        self.compared += 1
+        self.agreed += primary.predicted_stage == shadow.predicted_stage
+        if primary.predicted_stage in STAGES and shadow.predicted_stage in STAGES:
+            self.agreement[primary.predicted_stage][shadow.predicted_stage] += 1
+        
+        # Probability the shadow gives to the primary's answer, and how far
+        # apart the two distributions are (total variation distance, 0 to 1)
+        delta = shadow.stage_probabilities.get(primary.predicted_stage, 0.0) - primary.confidence
+        self.confidence_delta_sum += delta
+        self.abs_confidence_delta_sum += abs(delta)
+        stages = primary.stage_probabilities.keys() | shadow.stage_probabilities.keys()
+        distance = 0.5 * sum(
+            abs(primary.stage_probabilities.get(s, 0.0) - shadow.stage_probabilities.get(s, 0.0)) for s in stages
+        )
+        self.total_variation_sum += distance
+        self.max_total_variation = max(self.max_total_variation, distance)
+        self.primary_ms.append(primary_ms)
+        self.shadow_ms.append(shadow_ms)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        n = self.compared
+        return {
+            "primary_version": self.primary_version,
+            "shadow_version": self.shadow_version,
+            "compared": n,
+            "agreement_rate": self.agreed / n if n else None,
+            "agreement_matrix": self.agreement,
+            "mean_confidence_delta": self.confidence_delta_sum / n if n else None,
+            "mean_abs_confidence_delta": self.abs_confidence_delta_sum / n if n else None,
+            "mean_total_variation": self.total_variation_sum / n if n else None,
+            "max_total_variation": self.max_total_variation,
+            "latency": {
+                "primary": _percentiles(self.primary_ms),
+                "shadow": _percentiles(self.shadow_ms)
+            }
+        }
+
+class ShadowScorer:
+    """
+    Score live /predict traffic with a secondary model, off the request path
+    
+    The primary answer is sent as usual; the same feature row is then given
+    to the shadow model on its own small thread pool and both answers are
+    compared in memory. Shadow work is dropped, never queued without bound:
+    when the primary executor has no idle worker, when the shadow pool is
+    full, or when the request is not sampled. Dropping is counted, so the
+    comparison stays honest about its coverage.
+    """
+    def __init__(self, primary_executor: InferenceExecutor, max_workers: int, max_queue: int, sample_rate: float):
+        self._primary_executor = primary_executor
+        self._executor = InferenceExecutor(max_workers=max_workers, max_queue=max_queue)
+        self._sample_rate = sample_rate
+        self._model: Optional[IRCModel] = None
+        self._loading: Optional[str] = None
+        self._load_error: Optional[str] = None
+        self._comparison: Optional[ShadowComparison] = None
+        self._submitted = 0
+        self._dropped = {"not_sampled": 0, "primary_busy": 0, "shadow_saturated": 0}
+        self._skipped_fallbacks = 0
+        self._errors = 0
+        self._tasks = set()
+    
+    @property
+    def model(self) -> Optional[IRCModel]:
+        return self._model
+    
+    def load(self, source: Optional[str]) -> bool:
+        """
+        Load the shadow model in the background (None disables shadowing)
+        
+        Returns:
+            False if a shadow model is already being loaded
+        """
+        if self._loading is not None:
+            return False
+        if source is None:
+            self._model = None
+            return True
+        self._loading = source
+        threading.Thread(target=self._load, args=(source,), name="shadow-load", daemon=True).start()
+        return True
+    
+    def _load(self, source: str):
+        # Scored in this process even with the "process" backend, so the
+        # shadow model does not take cores from the primary's worker processes
+        candidate = IRCModel(backend="compiled" if config.INFERENCE_BACKEND == "process" else None, source=source)
+        if candidate.state == MODEL_READY:
+            self._model = candidate
+            self._load_error = None
+        else:
+            self._load_error = f"Cannot load shadow model from {source}"
+        print(f"Shadow model {candidate.state}: {candidate.version} from {source}")
+        self._loading = None
+    
+    def submit(self, row: np.ndarray, primary: PredictionResult, primary_version: Optional[str], primary_ms: float):
+        """Schedule the shadow scoring of a row the primary model has answered (returns immediately)"""
+        model = self._model
+        if model is None:
+            return
+        if primary.fallback:
+            self._skipped_fallbacks += 1
+            return
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            self._dropped["not_sampled"] += 1
+            return
+        # Requests queueing for the primary model come first
+        if self._primary_executor.busy:
+            self._dropped["primary_busy"] += 1
+            return
+        
+        comparison = self._comparison
+        if comparison is None or (comparison.primary_version, comparison.shadow_version) != (primary_version, model.version):
+            # Comparisons are only meaningful between two fixed versions
+            comparison = self._comparison = ShadowComparison(primary_version, model.version)
+        
+        self._submitted += 1
+        task = asyncio.ensure_future(self._score(model, row, primary, primary_ms, comparison))
+        # Keep a reference until done, the event loop only holds weak ones
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _score(self, model: IRCModel, row: np.ndarray, primary: PredictionResult,
+                     primary_ms: float, comparison: ShadowComparison):
+        try:
+            results, timing = await self._executor.run(model.predict_matrix, row)
+        except ExecutorSaturated:
+            self._dropped["shadow_saturated"] += 1
+            return
+        except Exception as e:
+            self._errors += 1
+            print(f"Shadow prediction error: {e}")
+            return
+        comparison.add(primary, results[0], primary_ms, timing.execution_ms)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the shadow settings, how much traffic was compared and the comparison so far"""
+        model = self._model
+        return {
+            "enabled": model is not None,
+            "shadow_version": model.version if model is not None else None,
+            "loading": self._loading,
+            "load_error": self._load_error,
+            "sample_rate": self._sample_rate,
+            "submitted": self._submitted,
+            "dropped": dict(self._dropped),
+            "skipped_fallbacks": self._skipped_fallbacks,
+            "errors": self._errors,
+            "executor": self._executor.get_status(),
+            "comparison": self._comparison.to_dict() if self._comparison is not None else None
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown()
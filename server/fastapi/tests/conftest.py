@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+# The server modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Patient of the README's /predict example
+PATIENT = {
+    "Créatinine (mg/L)": 42.0,
+    "Urée (g/L)": 1.14,
+    "Age": 68,
+    "Na^+ (meq/L)": 142.0,
+    "TA (mmHg)/Systole": 130.0,
+    "Choc de Pointe/Perçu": 0,
+    "Sexe_M": 1,
+    "Anémie_True": 1,
+    "Score de Glasgow (/15)": 15.0,
+    "Enquête Sociale/Tabac_True": 0,
+    "Enquête Sociale/Alcool_True": 1
+}
+
+@pytest.fixture
+def patient():
+    return dict(PATIENT)
+
+@pytest.fixture(scope="session")
+def model():
+    from model import IRCModel
+    
+    return IRCModel(backend="compiled")
+
+@pytest.fixture
+def make_client(model, monkeypatch):
+    """Start the API around the compiled model with some config settings overridden"""
+    import config
+    from api import create_app
+    from fastapi.testclient import TestClient
+    
+    clients = []
+    
+    def make(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(config, name, value)
+        client = TestClient(create_app(model))
+        client.__enter__()
+        clients.append(client)
+        return client
+    
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
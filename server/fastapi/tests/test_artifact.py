@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from artifact import ArtifactError, export_artifact, load_artifact, read_manifest
+from compiled_forest import CompiledForest
+from dataset import load_feature_matrix
+
+@pytest.fixture(scope="module")
+def compiled(model):
+    forest = model._estimator
+    if not isinstance(forest, CompiledForest):
+        pytest.skip("the compiled model cannot be loaded")
+    return forest
+
+def _truncated(forest: CompiledForest, n_trees: int) -> CompiledForest:
+    """Forest of the first n_trees trees, so an export changes every array"""
+    end = forest.roots[n_trees]
+    return CompiledForest(
+        forest.feature[:end], forest.threshold[:end], forest.children[:end], forest.value[:end],
+        forest.roots[:n_trees], forest.classes_, forest.max_depth
+    )
+
+def test_reexport_leaves_mapped_arrays_untouched(compiled, tmp_path):
+    matrix, _ = load_feature_matrix()
+    export_artifact(compiled, str(tmp_path))
+    mapped, _ = load_artifact(str(tmp_path), mmap=True)
+    expected = compiled.predict_proba(matrix)
+    
+    smaller = _truncated(compiled, 10)
+    export_artifact(smaller, str(tmp_path))
+    # The first load still maps the arrays it was given
+    assert np.array_equal(mapped.predict_proba(matrix), expected)
+    reloaded, _ = load_artifact(str(tmp_path), mmap=True, verify=True)
+    assert reloaded.n_estimators == 10
+    assert np.array_equal(reloaded.predict_proba(matrix), smaller.predict_proba(matrix))
+    # Only the files of the current manifest are left
+    listed = {entry["file"] for entry in read_manifest(str(tmp_path))["arrays"].values()}
+    assert set(os.listdir(tmp_path)) == listed | {"manifest.json"}
+
+def test_failed_export_keeps_the_previous_artifact(compiled, tmp_path, monkeypatch):
+    manifest = export_artifact(compiled, str(tmp_path))
+    
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(np, "save", fail)
+    with pytest.raises(OSError):
+        export_artifact(_truncated(compiled, 10), str(tmp_path))
+    assert read_manifest(str(tmp_path)) == manifest
+    load_artifact(str(tmp_path), verify=True)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
+
+def test_corrupted_array_is_rejected(compiled, tmp_path):
+    manifest = export_artifact(compiled, str(tmp_path))
+    path = os.path.join(tmp_path, manifest["arrays"]["threshold"]["file"])
+    with open(path, "r+b") as file:
+        file.seek(-8, os.SEEK_END)
+        tail = file.read()
+        file.seek(-8, os.SEEK_END)
+        file.write(bytes(byte ^ 0xFF for byte in tail))
+    with pytest.raises(ArtifactError):
+        load_artifact(str(tmp_path), verify=True)
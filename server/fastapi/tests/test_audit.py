@@ -0,0 +1,139 @@
+import asyncio
+import io
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from api import create_app
+from audit import AuditEntry, AuditLog, AuditLogSaturated, AuditStore
+from dataset import load_feature_matrix
+
+@pytest.fixture
+def audited_app(model, monkeypatch, tmp_path):
+    """App writing its audit log to a temporary database, and that database's path"""
+    path = str(tmp_path / "audit.db")
+    monkeypatch.setattr(config, "AUDIT_LOG", path)
+    monkeypatch.setattr(config, "AUDIT_FLUSH_MS", 1.0)
+    # A file's rows are numbered across several chunks
+    monkeypatch.setattr(config, "SCORING_CHUNK_SIZE", 2)
+    return create_app(model), path
+
+def _records(path):
+    store = AuditStore(path)
+    try:
+        records, _ = store.query(None, None, 1000)
+    finally:
+        store.close()
+    return records
+
+def test_every_prediction_endpoint_is_audited(audited_app, patient):
+    app, path = audited_app
+    visits = [{**patient, "date": "2024-01-01"}, {**patient, "Créatinine (mg/L)": 150.0, "date": "2024-06-01"}]
+    header = ",".join(f'"{name}"' for name in patient) + "\n"
+    csv = header + (",".join(str(value) for value in patient.values()) + "\n") * 3
+    with TestClient(app) as client:
+        assert client.post("/predict", json=patient).status_code == 200
+        assert client.post("/predict/batch", json={"records": [patient, patient]}).status_code == 200
+        assert client.post("/predict/trajectory", json={"patient_id": "a", "visits": visits}).status_code == 200
+        assert client.post("/patients/a/visits", json={**patient, "date": "2024-09-01"}).status_code == 200
+        response = client.post("/predict/file", files={"file": ("patients.csv", io.BytesIO(csv.encode()))})
+        assert response.status_code == 200
+        sweep = {"feature": "Age", "min": 20, "max": 80, "steps": 5}
+        assert client.post("/predict/sensitivity", json={"patient": patient, "sweeps": [sweep]}).status_code == 200
+    
+    by_endpoint = {}
+    for record in _records(path):
+        by_endpoint.setdefault(record["endpoint"], []).append(record)
+    assert {endpoint: len(records) for endpoint, records in by_endpoint.items()} == {
+        "/predict": 1,
+        "/predict/batch": 2,
+        "/predict/trajectory": 2,
+        "/patients/{patient_id}/visits": 1,
+        "/predict/file": 3,
+        # Only the patient's own prediction, not the grid points
+        "/predict/sensitivity": 1
+    }
+    assert sorted(r["row_index"] for r in by_endpoint["/predict/trajectory"]) == [0, 1]
+    assert by_endpoint["/patients/{patient_id}/visits"][0]["row_index"] == 2
+    assert sorted(r["row_index"] for r in by_endpoint["/predict/file"]) == [0, 1, 2]
+    assert by_endpoint["/predict"][0]["row_index"] is None
+    assert by_endpoint["/predict/sensitivity"][0]["inputs"]["Age"] == patient["Age"]
+
+@pytest.fixture(scope="module")
+def scored(model):
+    """Three rows of the dataset and their predictions"""
+    matrix, _ = load_feature_matrix()
+    matrix = matrix[np.isfinite(matrix).all(axis=1)][:3]
+    return matrix, model.predict_matrix(matrix)
+
+def _entry(scored):
+    matrix, results = scored
+    return AuditEntry(time.time(), "/predict/batch", "v1", matrix, range(len(results)), results, 1.0)
+
+async def _written(log, count):
+    while log.get_status()["written"] < count:
+        await asyncio.sleep(0.001)
+
+def test_records_are_written_in_batches(scored, tmp_path):
+    async def run():
+        log = AuditLog(str(tmp_path / "audit.db"), max_queue=100, batch_size=9, flush_ms=60_000, queue_timeout=1.0)
+        # The third entry fills a batch: no need to wait for the flush delay
+        for _ in range(3):
+            await log.submit(_entry(scored))
+        await asyncio.wait_for(_written(log, 9), 5.0)
+        await log.submit(_entry(scored))
+        await log.close()
+        return log.get_status()
+    
+    status = asyncio.run(run())
+    assert (status["written"], status["batches"], status["queued"]) == (12, 2, 0)
+    assert len(_records(str(tmp_path / "audit.db"))) == 12
+
+def test_full_queue_waits_then_rejects(scored, tmp_path):
+    async def run(flush_ms):
+        log = AuditLog(str(tmp_path / f"{flush_ms}.db"), max_queue=4, batch_size=100, flush_ms=flush_ms, queue_timeout=0.2)
+        await log.submit(_entry(scored))
+        try:
+            # Room only comes back once the first entry is flushed
+            await log.submit(_entry(scored))
+        except AuditLogSaturated:
+            pass
+        await log.close()
+        return log.get_status()
+    
+    status = asyncio.run(run(flush_ms=10.0))
+    assert (status["backpressure_waits"], status["rejected"], status["written"]) == (1, 0, 6)
+    status = asyncio.run(run(flush_ms=60_000))
+    assert (status["backpressure_waits"], status["rejected"], status["written"]) == (1, 1, 3)
+
+def test_records_are_paged_by_cursor(audited_app, model, patient, monkeypatch):
+    # The admin routes only exist with a token
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    with TestClient(create_app(model)) as client:
+        for age in range(40, 45):
+            client.post("/predict", json={**patient, "Age": age})
+        client.post("/predict/batch", json={"records": [patient, patient]})
+        deadline = time.monotonic() + 5.0
+        while client.get("/admin/audit", headers=headers).json()["status"]["written"] < 7:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        
+        assert client.get("/admin/audit").status_code == 403
+        assert client.get("/admin/audit", headers=headers, params={"before": "x"}).status_code == 422
+        pages, params = [], {"limit": 3}
+        while True:
+            page = client.get("/admin/audit", headers=headers, params=params).json()
+            pages.append(page["records"])
+            if page["next"] is None:
+                break
+            params["before"] = page["next"]
+    
+    assert [len(page) for page in pages] == [3, 3, 1]
+    records = [record for page in pages for record in page]
+    assert len({record["id"] for record in records}) == 7
+    assert [(r["timestamp"], r["id"]) for r in records] == sorted(((r["timestamp"], r["id"]) for r in records), reverse=True)
+    assert sorted(r["inputs"]["Age"] for r in records if r["endpoint"] == "/predict") == list(range(40, 45))
@@ -0,0 +1,81 @@
+import numpy as np
+
+import cache as cache_module
+from cache import PredictionCache
+from model import FEATURE_NAMES, PredictionResult
+from thresholds import next_float32
+
+def _row(**values):
+    row = np.ones((1, len(FEATURE_NAMES)))
+    for name, value in values.items():
+        row[0, FEATURE_NAMES.index(name)] = value
+    return row
+
+def _result(stage=3, fallback=False, contributions=None):
+    return PredictionResult(stage, {stage: 0.9}, {}, fallback=fallback, contributions=contributions)
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_key_is_the_float32_row_the_forest_compares(model):
+    cache = PredictionCache(max_entries=10, ttl=60)
+    breakpoints = model.threshold_index.breakpoints[FEATURE_NAMES.index("Créatinine (mg/L)")]
+    # Two values on both sides of a split, equal once rounded to 4 decimals
+    below = float(breakpoints[len(breakpoints) // 2])
+    above = float(next_float32(np.array([below]))[0])
+    assert round(below, 4) == round(above, 4)
+    assert cache.key(_row(**{"Créatinine (mg/L)": below})) != cache.key(_row(**{"Créatinine (mg/L)": above}))
+    # Values the forest cannot tell apart share a key
+    assert cache.key(_row(Age=68.0)) == cache.key(_row(Age=68.0 + 1e-12))
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = PredictionCache(max_entries=10, ttl=60)
+    key = cache.key(_row())
+    cache.put(key, "v1", _result())
+    clock.now += 59
+    assert cache.get(key, "v1") is not None
+    clock.now += 2
+    assert cache.get(key, "v1") is None
+    assert cache.get_status()["expirations"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2, ttl=60)
+    first, second, third = (cache.key(_row(Age=age)) for age in (1, 2, 3))
+    cache.put(first, "v1", _result())
+    cache.put(second, "v1", _result())
+    assert cache.get(first, "v1") is not None
+    cache.put(third, "v1", _result())
+    assert cache.get(second, "v1") is None
+    assert cache.get(first, "v1") is not None
+    assert cache.get_status()["evictions"] == 1
+
+def test_version_change_drops_every_entry():
+    cache = PredictionCache(max_entries=10, ttl=60)
+    key = cache.key(_row())
+    cache.put(key, "v1", _result())
+    assert cache.get(key, "v2") is None
+    assert cache.get(key, "v1") is None
+    assert cache.get_status()["invalidations"] == 1
+
+def test_fallback_and_unexplained_results():
+    cache = PredictionCache(max_entries=10, ttl=60)
+    key = cache.key(_row())
+    cache.put(key, "v1", _result(fallback=True))
+    cache.put(key, None, _result())
+    assert cache.get(key, "v1") is None
+    cache.put(key, "v1", _result())
+    assert cache.get(key, "v1", explained=True) is None
+    assert cache.get(key, "v1") is not None
+
+def test_resubmitted_patient_is_served_from_the_cache(make_client, patient):
+    client = make_client(PREDICTION_CACHE=True)
+    first = client.post("/predict", json=patient)
+    second = client.post("/predict", json=patient)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("miss", "hit")
+    assert first.json() == second.json()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from artifact import export_artifact, load_artifact
+from compiled_forest import CompiledForest
+from dataset import load_feature_matrix
+from model import FEATURE_NAMES, IRCModel
+from process_pool import ForestPool, PooledForest
+
+@pytest.fixture(scope="module")
+def sklearn_model():
+    model = IRCModel(backend="sklearn")._model
+    if model is None:
+        pytest.skip("the scikit-learn model cannot be loaded")
+    return model
+
+@pytest.fixture(scope="module")
+def matrix():
+    matrix, _ = load_feature_matrix()
+    return matrix
+
+@pytest.fixture(scope="module")
+def compiled(sklearn_model):
+    return CompiledForest.from_sklearn(sklearn_model)
+
+def test_compiled_matches_sklearn(sklearn_model, compiled, matrix):
+    assert np.array_equal(compiled.predict_proba(matrix), sklearn_model.predict_proba(matrix))
+    assert np.array_equal(compiled.classes_, sklearn_model.classes_)
+
+def test_artifact_matches_sklearn(sklearn_model, compiled, matrix, tmp_path):
+    export_artifact(compiled, str(tmp_path))
+    loaded, _ = load_artifact(str(tmp_path), mmap=True, verify=True)
+    assert np.array_equal(loaded.predict_proba(matrix), sklearn_model.predict_proba(matrix))
+
+def test_pooled_matches_sklearn(sklearn_model, compiled, matrix, tmp_path):
+    # Worker processes only accept finite rows
+    matrix = matrix[np.isfinite(matrix).all(axis=1)]
+    export_artifact(compiled, str(tmp_path))
+    # Small chunks, so a batch is split across both workers
+    pool = ForestPool(str(tmp_path), len(FEATURE_NAMES), compiled.n_estimators, processes=2, max_rows=64)
+    pooled = PooledForest(compiled, pool)
+    try:
+        pool.start()
+        assert np.array_equal(pooled.predict_proba(matrix), sklearn_model.predict_proba(matrix))
+        assert np.array_equal(pooled.predict_proba(matrix[:1]), sklearn_model.predict_proba(matrix[:1]))
+        assert pooled.local_walks == 0
+    finally:
+        pool.stop()
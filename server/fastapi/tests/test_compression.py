@@ -0,0 +1,71 @@
+import pytest
+
+from compression import ENCODINGS, etag_matches, negotiate
+
+def _batch(patient, n=50):
+    return {"records": [patient] * n}
+
+def test_negotiation_follows_quality_values():
+    assert negotiate("gzip") == "gzip"
+    assert negotiate("gzip;q=0, deflate") is None
+    assert negotiate("identity") is None
+    assert negotiate("*;q=0.5, gzip;q=0") == ("br" if "br" in ENCODINGS else None)
+    assert etag_matches('W/"abc-gzip", "other"', ['"abc"'])
+    assert not etag_matches('"abc-deflate"', ['"abc"'])
+
+def test_metadata_is_revalidated_by_etag(make_client):
+    client = make_client()
+    response = client.get("/model/metadata", headers={"Accept-Encoding": "identity"})
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+    
+    for if_none_match in (etag, f"W/{etag}", f'"stale", {etag}', "*"):
+        cached = client.get("/model/metadata", headers={"Accept-Encoding": "identity", "If-None-Match": if_none_match})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+    assert client.get("/model/metadata", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_metadata_is_sent_precompressed(make_client, encoding):
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    client = make_client(COMPRESSION_MIN_SIZE=0)
+    plain = client.get("/model/metadata", headers={"Accept-Encoding": "identity"})
+    response = client.get("/model/metadata", headers={"Accept-Encoding": encoding})
+    assert response.headers["Content-Encoding"] == encoding
+    assert response.headers["ETag"] == f'{plain.headers["ETag"][:-1]}-{encoding}"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+    # The client decodes the body back to the identity document
+    assert response.json() == plain.json()
+    # Either ETag revalidates either representation
+    cached = client.get("/model/metadata", headers={"Accept-Encoding": "identity", "If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+def test_small_metadata_is_not_compressed(make_client):
+    client = make_client(COMPRESSION_MIN_SIZE=1 << 20)
+    response = client.get("/model/classes", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert not response.headers["ETag"].endswith('-gzip"')
+
+def test_large_responses_are_compressed(make_client, patient):
+    # One patient answers about 1 kB, fifty about 17 kB
+    client = make_client(COMPRESSION_MIN_SIZE=4096)
+    response = client.post("/predict/batch", json=_batch(patient), headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.json()["predictions"]) == 50
+    assert int(response.headers["Content-Length"]) < len(response.content)
+    
+    small = client.post("/predict/batch", json=_batch(patient, 1), headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    refused = client.post("/predict/batch", json=_batch(patient), headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+
+def test_compression_can_be_disabled(make_client, patient):
+    client = make_client(COMPRESSION=False, COMPRESSION_MIN_SIZE=0)
+    for response in (
+        client.post("/predict/batch", json=_batch(patient), headers={"Accept-Encoding": "gzip"}),
+        client.get("/model/metadata", headers={"Accept-Encoding": "gzip"})
+    ):
+        assert "Content-Encoding" not in response.headers
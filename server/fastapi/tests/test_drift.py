@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from drift import FOLD_ROWS, DriftMonitor, FeatureReference
+from model import FEATURE_NAMES
+
+CREATININE = FEATURE_NAMES.index("Créatinine (mg/L)")
+
+@pytest.fixture(scope="module")
+def training():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(50.0, 10.0, size=(2000, len(FEATURE_NAMES)))
+    # A discrete feature, binned between its values
+    matrix[:, FEATURE_NAMES.index("Sexe_M")] = rng.integers(0, 2, size=len(matrix))
+    return matrix
+
+@pytest.fixture(scope="module")
+def reference(training):
+    return FeatureReference(training, bins=10)
+
+def _observe(monitor, rows):
+    for row in rows:
+        monitor.observe(row[None, :])
+
+def _expected_scores(reference, rows, j):
+    """PSI and KS of one feature, computed directly from the bin edges"""
+    edges = reference.edges[j, :reference.used_bins[j] - 1]
+    live = np.bincount(np.searchsorted(edges, rows[:, j], side="right"), minlength=len(edges) + 1)
+    expected = reference.counts[j, :len(edges) + 1]
+    shares = []
+    for counts in (live, expected):
+        p = np.maximum(counts / counts.sum(), 1e-4)
+        shares.append(p / p.sum())
+    live_p, reference_p = shares
+    psi = ((live_p - reference_p) * np.log(live_p / reference_p)).sum()
+    ks = np.abs(np.cumsum(live_p) - np.cumsum(reference_p)).max()
+    return psi, ks
+
+def test_training_rows_do_not_drift(reference, training):
+    monitor = DriftMonitor(reference, window=len(training))
+    _observe(monitor, training)
+    status = monitor.get_status()
+    assert status["drifting"] == []
+    for feature in status["features"]:
+        assert feature["status"] == "ok"
+        assert feature["psi"] == pytest.approx(0.0, abs=1e-4)
+        assert feature["ks"] == pytest.approx(0.0, abs=1e-4)
+
+def test_scores_match_their_definition(reference):
+    rows = np.random.default_rng(1).normal(55.0, 12.0, size=(500, len(FEATURE_NAMES)))
+    monitor = DriftMonitor(reference, window=1000)
+    _observe(monitor, rows)
+    features = monitor.get_status()["features"]
+    for j in (CREATININE, FEATURE_NAMES.index("Age")):
+        psi, ks = _expected_scores(reference, rows, j)
+        assert features[j]["psi"] == pytest.approx(psi, abs=1e-4)
+        assert features[j]["ks"] == pytest.approx(ks, abs=1e-4)
+
+def test_streaming_moments_match_numpy(reference):
+    # Not a multiple of FOLD_ROWS, so the last rows are still buffered
+    rows = np.random.default_rng(2).normal(40.0, 5.0, size=(3 * FOLD_ROWS + 7, len(FEATURE_NAMES)))
+    monitor = DriftMonitor(reference, window=1000)
+    _observe(monitor, rows)
+    status = monitor.get_status()
+    assert status["rows"] == len(rows)
+    live = status["features"][CREATININE]["live"]
+    assert live["mean"] == pytest.approx(rows[:, CREATININE].mean(), abs=1e-4)
+    assert live["std"] == pytest.approx(rows[:, CREATININE].std(ddof=1), abs=1e-4)
+    assert live["min"] == pytest.approx(rows[:, CREATININE].min(), abs=1e-4)
+    assert live["max"] == pytest.approx(rows[:, CREATININE].max(), abs=1e-4)
+
+def test_unit_mistake_is_reported(reference, training):
+    rows = training[:300].copy()
+    # Creatinine sent in µmol/L instead of mg/L
+    rows[:, CREATININE] *= 8.84
+    monitor = DriftMonitor(reference, window=1000)
+    _observe(monitor, rows)
+    status = monitor.get_status()
+    creatinine = status["features"][CREATININE]
+    assert status["drifting"] == ["Créatinine (mg/L)"]
+    assert creatinine["status"] == "drift"
+    assert creatinine["mean_ratio"] == pytest.approx(8.84, rel=0.05)
+    assert creatinine["live"]["above_reference_max"] > 0
+
+def test_scores_follow_the_last_two_windows(reference, training):
+    window = 200
+    shifted = training[:2 * window].copy()
+    shifted[:, CREATININE] += 100.0
+    monitor = DriftMonitor(reference, window=window)
+    _observe(monitor, training[:window])
+    _observe(monitor, shifted)
+    status = monitor.get_status()
+    # The first window has been dropped: only shifted rows are scored
+    assert status["window_rows"] == 2 * window
+    assert status["rows"] == 3 * window
+    assert sum(status["features"][CREATININE]["live"]["histogram"][:-1]) == 0
+
+def test_too_few_rows_are_not_scored(reference, training):
+    monitor = DriftMonitor(reference, window=1000, min_rows=100)
+    _observe(monitor, training[:50])
+    feature = monitor.get_status()["features"][CREATININE]
+    assert feature["status"] == "insufficient_data"
+    assert feature["psi"] is None
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from executor import ExecutorSaturated, InferenceExecutor
+
+def test_cancelled_call_holds_its_slot_until_it_finishes():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+    
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "done"
+    
+    async def scenario():
+        task = asyncio.ensure_future(executor.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        # The client went away, but the call still runs on the only thread
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert executor.get_status()["pending"] == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(lambda: None)
+        
+        release.set()
+        for _ in range(100):
+            if executor.get_status()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.get_status()["pending"] == 0
+        result, _ = await executor.run(lambda: "next")
+        assert result == "next"
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+
+def test_cancelled_queued_call_is_dropped():
+    executor = InferenceExecutor(max_workers=1, max_queue=1)
+    started, release = threading.Event(), threading.Event()
+    ran = []
+    
+    def blocking():
+        started.set()
+        release.wait(5)
+    
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        queued = asyncio.ensure_future(executor.run(lambda: ran.append(True)))
+        await asyncio.sleep(0)
+        assert executor.get_status()["pending"] == 2
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        await asyncio.sleep(0)
+        assert executor.get_status()["pending"] == 1
+        release.set()
+        await running
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert ran == []
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from dataset import load_feature_matrix
+from explain import TreeExplainer
+from model import FEATURE_NAMES
+
+@pytest.fixture(scope="module")
+def forest(model):
+    return model._estimator
+
+@pytest.fixture(scope="module")
+def matrix():
+    matrix, _ = load_feature_matrix()
+    return matrix[np.isfinite(matrix).all(axis=1)]
+
+def _walked_contributions(forest, row):
+    """Contributions of one row, summed node by node along every tree's path"""
+    row = row.astype(np.float32)
+    result = np.zeros((len(FEATURE_NAMES), forest.value.shape[1]))
+    for node in forest.roots:
+        while forest.children[node, 0] != node:
+            j = forest.feature[node]
+            child = forest.children[node, int(row[j] > forest.threshold[node])]
+            result[j] += forest.value[child] - forest.value[node]
+            node = child
+    return result / forest.n_estimators
+
+def test_contributions_add_up_to_probabilities(forest, matrix):
+    explainer = TreeExplainer(forest, len(FEATURE_NAMES))
+    # More rows than CHUNK_SIZE, so several blocks are gathered
+    contributions = explainer.contributions(matrix)
+    assert contributions.shape == (len(matrix), len(FEATURE_NAMES), len(forest.classes_))
+    assert np.allclose(explainer.bias + contributions.sum(axis=1), forest.predict_proba(matrix))
+
+def test_contributions_match_the_decision_paths(forest, matrix):
+    explainer = TreeExplainer(forest, len(FEATURE_NAMES))
+    rows = matrix[:5]
+    contributions = explainer.contributions(rows)
+    for row, expected in zip(rows, contributions):
+        assert np.allclose(_walked_contributions(forest, row), expected)
+    assert np.allclose(explainer.bias, forest.value[forest.roots].mean(axis=0))
+
+def test_response_explains_the_confidence(make_client, patient):
+    body = make_client().post("/predict", json=patient).json()
+    contributions = body["feature_contributions"]
+    assert [c["feature"] for c in contributions] == FEATURE_NAMES
+    total = body["base_probability"] + sum(c["contribution"] for c in contributions)
+    assert total == pytest.approx(body["confidence"], abs=1e-6)
+    
+    body = make_client().post("/predict?explain=false", json=patient).json()
+    assert body["feature_contributions"] is None
+    assert body["base_probability"] is None
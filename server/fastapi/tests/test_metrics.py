@@ -0,0 +1,25 @@
+def _requests(client, endpoint):
+    """Sum of the request counters of an endpoint label"""
+    total = 0.0
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(f'nephropredict_requests_total{{endpoint="{endpoint}"'):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+def test_parameterized_routes_are_labeled_by_template(make_client, patient):
+    client = make_client(METRICS=True)
+    client.get("/patients/a/trajectory")
+    client.get("/patients/b/trajectory")
+    assert _requests(client, "/patients/{patient_id}/trajectory") == 2
+    assert _requests(client, "/patients/a/trajectory") == 0
+
+def test_unknown_paths_are_grouped(make_client):
+    client = make_client(METRICS=True)
+    client.get("/no/such/path")
+    assert _requests(client, "other") == 1
+    assert _requests(client, "/no/such/path") == 0
+
+def test_static_routes_keep_their_path(make_client, patient):
+    client = make_client(METRICS=True)
+    assert client.post("/predict", json=patient).status_code == 200
+    assert _requests(client, "/predict") == 1
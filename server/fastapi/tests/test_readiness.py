@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+from api import create_app
+from model import MODEL_FAILED, MODEL_READY, IRCModel
+
+def test_loaded_model_is_reported_loaded(model):
+    status = model.get_status()
+    assert status["state"] == MODEL_READY
+    assert status["model_loaded"] is True
+
+def test_failed_load_is_not_reported_loaded(tmp_path):
+    failed = IRCModel(backend="compiled", source=str(tmp_path / "missing.pkl"))
+    with TestClient(create_app(failed)) as client:
+        health = client.get("/health").json()
+        status = client.get("/model/status").json()
+    # Only the creatinine fallback rule answers
+    assert health["model_status"]["state"] == MODEL_FAILED
+    assert health["model_loaded"] is False
+    assert status["model_loaded"] is False
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from model import FEATURE_NAMES
+from schemas import PredictionInput
+from thresholds import next_float32
+
+# The forest splits on standardized values: the sweeps go across its breakpoints
+CREATININE = "Créatinine (mg/L)"
+UREA = "Urée (g/L)"
+
+def _stages(model, patient, values, feature=CREATININE):
+    """Stages predicted directly for the patient with a feature set to each value"""
+    matrix = np.repeat(PredictionInput.model_validate(patient).to_feature_row(), len(values), axis=0)
+    matrix[:, FEATURE_NAMES.index(feature)] = values
+    _, stages, _, _ = model.predict_probabilities(matrix)
+    return stages
+
+def test_exact_thresholds_are_every_stage_change(make_client, model, patient):
+    body = make_client().post("/predict/sensitivity", json={
+        "patient": patient, "sweeps": [{"feature": CREATININE, "min": -1.0, "max": 1.0, "steps": 20}]
+    }).json()
+    thresholds = body["thresholds"]
+    assert thresholds and all(t["exact"] for t in thresholds)
+    for threshold in thresholds:
+        below, above = _stages(model, patient, [threshold["lower"], threshold["upper"]])
+        assert (below, above) == (threshold["from_stage"], threshold["to_stage"])
+    
+    # Brute force: the stage just below and above every breakpoint in the range
+    index = model.threshold_index
+    crossed = index.crossed(FEATURE_NAMES.index(CREATININE), -1.0, 1.0)
+    stages = _stages(model, patient, np.concatenate([[-1.0], next_float32(crossed)]))
+    changes = [
+        (float(crossed[k]), int(stages[k]), int(stages[k + 1]))
+        for k in np.flatnonzero(stages[:-1] != stages[1:])
+    ]
+    assert [(t["lower"], t["from_stage"], t["to_stage"]) for t in thresholds] == changes
+
+def test_grid_matches_direct_predictions(make_client, model, patient):
+    body = make_client().post("/predict/sensitivity", json={"patient": patient, "sweeps": [
+        {"feature": CREATININE, "min": -1.0, "max": 1.0, "steps": 8},
+        {"feature": UREA, "min": 0.0, "max": 0.3, "steps": 4}
+    ]}).json()
+    creatinines, ureas = (np.array(axis["values"]) for axis in body["features"])
+    assert ureas.tolist() == pytest.approx([0.0, 0.1, 0.2, 0.3])
+    assert body["points"] == len(creatinines) * len(ureas)
+    for j, urea in enumerate(ureas):
+        expected = _stages(model, {**patient, UREA: urea}, creatinines)
+        assert [row[j] for row in body["predicted_stage"]] == expected.tolist()
+    assert body["thresholds"]
+    for threshold in body["thresholds"]:
+        assert threshold["exact"] is False
+        assert set(threshold["at"]) == {UREA} if threshold["feature"] == CREATININE else {CREATININE}
+    assert body["baseline"]["predicted_stage"] == make_client().post("/predict", json=patient).json()["predicted_stage"]
+
+def test_oversized_grid_is_refused(make_client, patient):
+    client = make_client(SENSITIVITY_MAX_POINTS=100)
+    response = client.post("/predict/sensitivity", json={"patient": patient, "sweeps": [
+        {"feature": CREATININE, "min": 10.0, "max": 200.0, "steps": 20},
+        {"feature": UREA, "min": 0.1, "max": 3.0, "steps": 20}
+    ]})
+    assert response.status_code == 413
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from model import FEATURE_NAMES
+from partial_dependence import training_matrix
+from thresholds import next_float32
+
+CREATININE = FEATURE_NAMES.index("Créatinine (mg/L)")
+UREA = FEATURE_NAMES.index("Urée (g/L)")
+
+@pytest.fixture(scope="module")
+def forest(model):
+    return model._estimator
+
+@pytest.fixture(scope="module")
+def index(model):
+    return model.threshold_index
+
+@pytest.fixture(scope="module")
+def matrix():
+    return training_matrix()
+
+def _with_feature(rows, feature, value):
+    rows = np.array(rows, dtype=np.float64)
+    rows[:, feature] = value
+    return rows
+
+@pytest.mark.parametrize("feature", [CREATININE, UREA])
+def test_trees_only_change_at_breakpoints(forest, index, matrix, feature):
+    rows = matrix[:20]
+    breakpoints = index.breakpoints[feature]
+    assert np.all(breakpoints[1:] > breakpoints[:-1])
+    for k, breakpoint in enumerate(breakpoints):
+        # Both ends of the interval ending at the breakpoint reach the same leaves
+        start = next_float32(breakpoints[k - 1]) if k else breakpoint - 1.0
+        at = forest.apply(_with_feature(rows, feature, breakpoint))
+        assert np.array_equal(forest.apply(_with_feature(rows, feature, start)), at)
+        # Crossing it only moves the trees listed for it
+        above = forest.apply(_with_feature(rows, feature, next_float32(breakpoint)))
+        moved = np.flatnonzero((above != at).any(axis=0))
+        assert np.isin(moved, index.changed_trees(feature, k)).all()
+
+def test_crossed_breakpoints(index):
+    breakpoints = index.breakpoints[CREATININE]
+    assert np.array_equal(index.crossed(CREATININE, breakpoints[2], breakpoints[5]), breakpoints[2:5])
+    assert np.array_equal(index.crossed(CREATININE, next_float32(breakpoints[2]), breakpoints[5]), breakpoints[3:5])
+    assert len(index.crossed(CREATININE, breakpoints[-1] + 1.0, breakpoints[-1] + 2.0)) == 0
+
+@pytest.mark.parametrize("feature", [CREATININE, UREA])
+def test_partial_dependence_matches_brute_force(forest, index, matrix, feature):
+    rows = matrix[:100]
+    curve = index.partial_dependence(rows, feature)
+    points = index.points(feature)
+    assert curve.shape == (len(points), len(forest.classes_))
+    expected = [forest.predict_proba(_with_feature(rows, feature, point)).mean(axis=0) for point in points]
+    assert np.allclose(curve, expected)
+
+def test_partial_dependence_endpoint(make_client, index, matrix):
+    client = make_client()
+    body = client.get("/model/partial-dependence", params={"feature": "Créatinine (mg/L)"}).json()
+    assert body["rows"] == len(matrix)
+    [curve] = body["features"]
+    assert curve["breakpoints"] == index.breakpoints[CREATININE].tolist()
+    probabilities = np.array([stage["probabilities"] for stage in curve["stage_probabilities"]]).T
+    assert np.allclose(probabilities, index.partial_dependence(matrix, CREATININE))
+    assert len(client.get("/model/partial-dependence").json()["features"]) == len(FEATURE_NAMES)
+    assert client.get("/model/partial-dependence", params={"feature": "Poids"}).status_code == 422
@@ -0,0 +1,77 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from trajectory import DAYS_PER_YEAR, LinearTrend, cumulative_slopes
+
+def _visits(patient, *creatinines):
+    return [
+        {**patient, "Créatinine (mg/L)": value, "date": f"2024-{month:02d}-01"}
+        for month, value in enumerate(creatinines, start=1)
+    ]
+
+def test_visit_append_needs_a_single_worker(make_client, patient):
+    client = make_client(SERVER_WORKERS=4)
+    client.post("/predict/trajectory", json={"patient_id": "a", "visits": _visits(patient, 40.0)})
+    response = client.post("/patients/a/visits", json={**patient, "date": "2024-09-01"})
+    assert response.status_code == 409
+    assert "4 server workers" in response.json()["detail"]
+
+def test_unknown_patient_is_not_started_from_one_visit(make_client, patient):
+    client = make_client(SERVER_WORKERS=1)
+    response = client.post("/patients/unknown/visits", json={**patient, "date": "2024-09-01"})
+    assert response.status_code == 404
+    assert client.get("/patients/unknown/trajectory").status_code == 404
+
+def test_running_slopes_match_a_least_squares_fit():
+    days = np.array([0.0, 0.0, 30.0, 45.0, 200.0, 201.0])
+    values = np.array([40.0, 44.0, 52.0, 49.0, 80.0, 95.0])
+    slopes = cumulative_slopes(days, values)
+    assert np.isnan(slopes[:2]).all()
+    trend = LinearTrend(days[:2], values[:2])
+    assert trend.slope() is None
+    for i in range(2, len(days)):
+        expected = np.polyfit(days[:i + 1], values[:i + 1], 1)[0]
+        assert slopes[i] == pytest.approx(expected)
+        trend.add(days[i], values[i])
+        assert trend.slope() == pytest.approx(expected)
+
+def test_trajectory_is_sorted_and_fitted(make_client, patient):
+    creatinines = [40.0, 55.0, 90.0, 160.0]
+    visits = _visits(patient, *creatinines)
+    body = make_client().post("/predict/trajectory", json={"visits": visits[::-1]}).json()
+    assert [point["date"] for point in body["points"]] == [visit["date"] for visit in visits]
+    days = [(datetime.date.fromisoformat(visit["date"]) - datetime.date(2024, 1, 1)).days for visit in visits]
+    for i, point in enumerate(body["points"][1:], start=2):
+        expected = np.polyfit(days[:i], creatinines[:i], 1)[0] * DAYS_PER_YEAR
+        assert point["slopes_per_year"]["creatinine"] == pytest.approx(expected)
+    assert body["points"][0]["slopes_per_year"]["creatinine"] is None
+    stages = [point["predicted_stage"] for point in body["points"]]
+    assert body["transitions"] == sum(a != b for a, b in zip(stages, stages[1:]))
+
+def test_appended_visits_match_full_scoring(make_client, patient):
+    client = make_client(SERVER_WORKERS=1)
+    visits = _visits(patient, 40.0, 55.0, 90.0, 160.0, 150.0)
+    client.post("/predict/trajectory", json={"patient_id": "a", "visits": visits[:2]})
+    for count, visit in enumerate(visits[2:], start=3):
+        body = client.post("/patients/a/visits", json=visit).json()
+        assert body["visits"] == count
+        assert body["visit"]["visit"] == count - 1
+        assert body["rescored"] is False
+    
+    appended = client.get("/patients/a/trajectory").json()
+    scored = client.post("/predict/trajectory", json={"visits": visits}).json()
+    assert appended["stage_transitions"] == scored["stage_transitions"]
+    for got, expected in zip(appended["points"], scored["points"]):
+        assert got["predicted_stage"] == expected["predicted_stage"]
+        assert got["confidence"] == pytest.approx(expected["confidence"])
+        assert got["slopes_per_year"] == pytest.approx(expected["slopes_per_year"])
+    assert len(appended["points"]) == len(visits)
+
+def test_visit_before_the_last_one_is_refused(make_client, patient):
+    client = make_client(SERVER_WORKERS=1)
+    client.post("/predict/trajectory", json={"patient_id": "a", "visits": _visits(patient, 40.0, 50.0)})
+    response = client.post("/patients/a/visits", json={**patient, "date": "2023-12-01"})
+    assert response.status_code == 409
+    assert client.get("/patients/a/trajectory").json()["visits"] == 2
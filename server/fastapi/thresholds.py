@@ -0,0 +1,132 @@
+"""Index of the split thresholds of a forest, per feature"""
+from typing import List
+
+import numpy as np
+
+from compiled_forest import CompiledForest
+
+_FLOAT32_UP = np.float32(np.inf)
+
+def _float32_floor(values: np.ndarray) -> np.ndarray:
+    """Largest float32 values not above each float64 value, as float64"""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], -_FLOAT32_UP)
+    return rounded.astype(np.float64)
+
+def next_float32(values: np.ndarray) -> np.ndarray:
+    """Smallest float32 values above each float32 value, as float64"""
+    return np.nextafter(np.asarray(values, dtype=np.float32), _FLOAT32_UP).astype(np.float64)
+
+class ThresholdIndex:
+    """
+    Sorted split breakpoints of every feature, with the trees that split at each one
+    
+    For feature j, breakpoints[j] cuts the real line into len + 1 intervals,
+    (-inf, b0], (b0, b1], ..., (b_last, inf), on which every tree answers the
+    same whatever the feature's value (the other features being fixed).
+    """
+    def __init__(self, forest: CompiledForest, n_features: int):
+        self._forest = forest
+        self.n_features = n_features
+        nodes = np.flatnonzero(forest.children[:, 0] != np.arange(forest.n_nodes))
+        # Trees are stored one after the other, from their root
+        node_trees = np.searchsorted(forest.roots, nodes, side="right") - 1
+        node_breakpoints = _float32_floor(forest.threshold[nodes])
+        node_features = forest.feature[nodes]
+        
+        self.breakpoints: List[np.ndarray] = []
+        # Per feature, the split nodes ("branches") and the trees changing at
+        # each breakpoint, concatenated, with the offsets of each breakpoint
+        self._nodes: List[np.ndarray] = []
+        self._node_offsets: List[np.ndarray] = []
+        self._trees: List[np.ndarray] = []
+        self._tree_offsets: List[np.ndarray] = []
+        for j in range(n_features):
+            mask = node_features == j
+            order = np.lexsort((node_trees[mask], node_breakpoints[mask]))
+            values, split_nodes, trees = node_breakpoints[mask][order], nodes[mask][order], node_trees[mask][order]
+            breakpoints, starts = np.unique(values, return_index=True)
+            self.breakpoints.append(breakpoints)
+            self._nodes.append(split_nodes)
+            self._node_offsets.append(np.append(starts, len(values)))
+            # A tree may split twice on the same value (in different branches)
+            first = np.ones(len(values), dtype=bool)
+            first[1:] = (values[1:] != values[:-1]) | (trees[1:] != trees[:-1])
+            kept = np.flatnonzero(first)
+            self._trees.append(trees[kept])
+            self._tree_offsets.append(np.searchsorted(kept, self._node_offsets[-1]))
+            for array in (breakpoints, split_nodes, trees):
+                array.setflags(write=False)
+    
+    @property
+    def nbytes(self) -> int:
+        """Size of the index arrays"""
+        return sum(
+            array.nbytes for arrays in (self.breakpoints, self._nodes, self._node_offsets, self._trees, self._tree_offsets)
+            for array in arrays
+        )
+    
+    def branches(self, feature: int, k: int) -> np.ndarray:
+        """Split nodes on a feature whose direction changes when it crosses breakpoint k"""
+        offsets = self._node_offsets[feature]
+        return self._nodes[feature][offsets[k]:offsets[k + 1]]
+    
+    def changed_trees(self, feature: int, k: int) -> np.ndarray:
+        """Trees whose leaf may change when a feature crosses breakpoint k"""
+        offsets = self._tree_offsets[feature]
+        return self._trees[feature][offsets[k]:offsets[k + 1]]
+    
+    def points(self, feature: int) -> np.ndarray:
+        """
+        One value in every interval of a feature, in order
+        
+        The point of (b_k-1, b_k] is b_k itself and that of (b_last, inf) the
+        next float32 value, so every point is exactly what the trees compare.
+        """
+        breakpoints = self.breakpoints[feature]
+        if not len(breakpoints):
+            # The forest ignores the feature: any value stands for all of them
+            return np.zeros(1)
+        return np.append(breakpoints, next_float32(breakpoints[-1:]))
+    
+    def crossed(self, feature: int, low: float, high: float) -> np.ndarray:
+        """
+        Breakpoints a sweep of a feature from low to high goes across
+        
+        The sweep goes through one interval from low (as float32) to the first
+        of them, then one from just above each of them (next_float32) to the
+        next one, the last one ending at high.
+        """
+        breakpoints = self.breakpoints[feature]
+        return breakpoints[(breakpoints >= np.float32(low)) & (breakpoints < np.float32(high))]
+    
+    def partial_dependence(self, matrix: np.ndarray, feature: int) -> np.ndarray:
+        """
+        Class probabilities averaged over the rows of a dataset, the feature
+        being set to the value of each interval in turn (see points)
+        
+        Every tree is walked once for the first interval; moving to the next
+        interval only walks again the trees that split at the breakpoint in
+        between, so the cost grows with the number of splits on the feature
+        rather than with intervals times trees.
+        
+        Returns:
+            Array of shape (len(points(feature)), n_classes)
+        """
+        forest = self._forest
+        points = self.points(feature)
+        n_trees = forest.n_estimators
+        X = np.array(matrix, dtype=np.float64)
+        X[:, feature] = points[0]
+        # Mean leaf distribution of every tree over the rows
+        tree_means = forest.value[forest.apply(X)].mean(axis=0)
+        
+        curve = np.empty((len(points), forest.value.shape[1]))
+        curve[0] = tree_means.sum(axis=0) / n_trees
+        for k in range(1, len(points)):
+            trees = self.changed_trees(feature, k - 1)
+            X[:, feature] = points[k]
+            tree_means[trees] = forest.value[forest.apply(X, roots=forest.roots[trees])].mean(axis=0)
+            curve[k] = tree_means.sum(axis=0) / n_trees
+        return curve
@@ -0,0 +1,245 @@
+"""Stage trajectories of patients followed over several visits"""
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from model import FEATURE_NAMES, IRCModel, PredictionResult
+
+# Features whose slope over time is reported, by output name
+TREND_FEATURES = {"creatinine": FEATURE_NAMES.index("Créatinine (mg/L)"), "urea": FEATURE_NAMES.index("Urée (g/L)")}
+
+# Slopes are fitted per day and reported per year
+DAYS_PER_YEAR = 365.25
+
+class VisitOutOfOrder(ValueError):
+    """Raised when an appended visit is dated before the patient's last one"""
+
+def _expected_stage(result: PredictionResult) -> float:
+    return sum(stage * probability for stage, probability in result.stage_probabilities.items())
+
+def cumulative_slopes(days: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Least-squares slope of values over days after each point (NaN while all days are equal)
+    
+    Days are whole numbers, so the sums are exact and a zero denominator
+    really means a single date.
+    """
+    n = np.arange(1, len(days) + 1)
+    sum_t, sum_y = np.cumsum(days), np.cumsum(values)
+    sum_tt, sum_ty = np.cumsum(days * days), np.cumsum(days * values)
+    denominator = n * sum_tt - sum_t * sum_t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, (n * sum_ty - sum_t * sum_y) / denominator, np.nan)
+
+class LinearTrend:
+    """Running least-squares slope of a value over time, updated in O(1) per point"""
+    __slots__ = ("n", "sum_t", "sum_y", "sum_tt", "sum_ty")
+    
+    def __init__(self, days: Sequence[float] = (), values: Sequence[float] = ()):
+        days, values = np.asarray(days, dtype=np.float64), np.asarray(values, dtype=np.float64)
+        self.n = len(days)
+        self.sum_t, self.sum_y = float(days.sum()), float(values.sum())
+        self.sum_tt, self.sum_ty = float(days @ days), float(days @ values)
+    
+    def add(self, day: float, value: float):
+        self.n += 1
+        self.sum_t += day
+        self.sum_y += value
+        self.sum_tt += day * day
+        self.sum_ty += day * value
+    
+    def slope(self) -> Optional[float]:
+        """Slope per day, None until two different days were seen"""
+        denominator = self.n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+        return (self.n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+def _per_year(slope: Optional[float]) -> Optional[float]:
+    if slope is None or slope != slope:
+        return None
+    return slope * DAYS_PER_YEAR
+
+@dataclass(frozen=True)
+class TrajectoryPoint:
+    """Prediction of one visit, with the trends up to that visit"""
+    visit: int
+    date: datetime.date
+    result: PredictionResult
+    # Slopes per year of the TREND_FEATURES over the visits so far
+    slopes: Dict[str, Optional[float]]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.result
+        return {
+            "visit": self.visit,
+            "date": self.date.isoformat(),
+            "predicted_stage": result.predicted_stage,
+            "confidence": result.confidence,
+            "expected_stage": _expected_stage(result),
+            "stage_probabilities": [
+                {"stage": stage, "probability": probability}
+                for stage, probability in result.stage_probabilities.items()
+            ],
+            "slopes_per_year": self.slopes,
+            "fallback": result.fallback
+        }
+
+def _transition(previous: TrajectoryPoint, point: TrajectoryPoint) -> Dict[str, Any]:
+    before, after = previous.result.predicted_stage, point.result.predicted_stage
+    return {
+        "visit": point.visit,
+        "date": point.date.isoformat(),
+        "from_stage": before,
+        "to_stage": after,
+        "direction": "progression" if after > before else "regression",
+        "days_since_previous": (point.date - previous.date).days
+    }
+
+class PatientTrajectory:
+    """
+    Visits of one patient with their predictions and running trends
+    
+    The feature rows are kept so the whole history can be rescored in one
+    pass when the model version changes.
+    """
+    def __init__(self, version: Optional[str], dates: Sequence[datetime.date], matrix: np.ndarray,
+                 results: Sequence[PredictionResult]):
+        self.version = version
+        self._first_day = dates[0].toordinal() if len(dates) else None
+        self._rows: List[np.ndarray] = list(matrix)
+        self.points: List[TrajectoryPoint] = []
+        self.transitions: List[Dict[str, Any]] = []
+        
+        days = np.array([d.toordinal() - self._first_day for d in dates], dtype=np.float64)
+        slopes = {
+            name: cumulative_slopes(days, matrix[:, column]) if len(days) else np.empty(0)
+            for name, column in TREND_FEATURES.items()
+        }
+        self._trends = {name: LinearTrend(days, matrix[:, column]) for name, column in TREND_FEATURES.items()}
+        for i, (date, result) in enumerate(zip(dates, results)):
+            self._add_point(TrajectoryPoint(i, date, result, {name: _per_year(s[i]) for name, s in slopes.items()}))
+    
+    def __len__(self) -> int:
+        return len(self.points)
+    
+    @property
+    def last_date(self) -> Optional[datetime.date]:
+        return self.points[-1].date if self.points else None
+    
+    @property
+    def dates(self) -> List[datetime.date]:
+        return [point.date for point in self.points]
+    
+    def stacked_rows(self) -> np.ndarray:
+        """Feature rows of every visit, (n_visits, n_features)"""
+        return np.array(self._rows).reshape(len(self._rows), len(FEATURE_NAMES))
+    
+    def _add_point(self, point: TrajectoryPoint) -> Optional[Dict[str, Any]]:
+        transition = None
+        if self.points and self.points[-1].result.predicted_stage != point.result.predicted_stage:
+            transition = _transition(self.points[-1], point)
+            self.transitions.append(transition)
+        self.points.append(point)
+        return transition
+    
+    def append(self, date: datetime.date, row: np.ndarray, result: PredictionResult) -> Optional[Dict[str, Any]]:
+        """
+        Add a visit scored on its own, in O(1)
+        
+        Returns:
+            The stage transition it makes, if any
+        
+        Raises:
+            VisitOutOfOrder: if the visit is dated before the last one
+        """
+        if self.points and date < self.points[-1].date:
+            raise VisitOutOfOrder(
+                f"Visit of {date.isoformat()} is before the last one ({self.points[-1].date.isoformat()}): "
+                "submit the whole trajectory instead"
+            )
+        if self._first_day is None:
+            self._first_day = date.toordinal()
+        day = float(date.toordinal() - self._first_day)
+        slopes = {}
+        for name, column in TREND_FEATURES.items():
+            trend = self._trends[name]
+            trend.add(day, float(row[0, column]))
+            slopes[name] = _per_year(trend.slope())
+        self._rows.append(row[0])
+        return self._add_point(TrajectoryPoint(len(self.points), date, result, slopes))
+    
+    def summary(self) -> Dict[str, Any]:
+        """Current state of the trajectory, without the per-visit curve"""
+        last = self.points[-1] if self.points else None
+        return {
+            "visits": len(self.points),
+            "model_version": self.version,
+            "first_date": self.points[0].date.isoformat() if self.points else None,
+            "last_date": last.date.isoformat() if last is not None else None,
+            "current_stage": last.result.predicted_stage if last is not None else None,
+            "slopes_per_year": dict(last.slopes) if last is not None else {name: None for name in TREND_FEATURES},
+            "transitions": len(self.transitions)
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The whole trajectory: summary, per-visit curve and transitions"""
+        return {
+            **self.summary(),
+            "points": [point.to_dict() for point in self.points],
+            "stage_transitions": list(self.transitions)
+        }
+
+def score_trajectory(model: IRCModel, dates: Sequence[datetime.date], matrix: np.ndarray) -> PatientTrajectory:
+    """
+    Score a patient's visits with one model call
+    
+    Args:
+        dates: Visit dates, in chronological order
+        matrix: (n_visits, n_features) feature rows in the same order
+    """
+    results = model.predict_matrix(matrix) if len(matrix) else ()
+    return PatientTrajectory(model.version, dates, matrix, results)
+
+class TrajectoryStore:
+    """Bounded LRU store of the trajectories of identified patients"""
+    def __init__(self, max_patients: int, max_visits: int):
+        self._max_patients = max_patients
+        self.max_visits = max_visits
+        self._trajectories: "OrderedDict[str, PatientTrajectory]" = OrderedDict()
+        self._evictions = 0
+        self._appends = 0
+        self._rescores = 0
+    
+    def get(self, patient_id: str) -> Optional[PatientTrajectory]:
+        trajectory = self._trajectories.get(patient_id)
+        if trajectory is not None:
+            self._trajectories.move_to_end(patient_id)
+        return trajectory
+    
+    def put(self, patient_id: str, trajectory: PatientTrajectory):
+        self._trajectories[patient_id] = trajectory
+        self._trajectories.move_to_end(patient_id)
+        while len(self._trajectories) > self._max_patients:
+            self._trajectories.popitem(last=False)
+            self._evictions += 1
+    
+    def delete(self, patient_id: str) -> bool:
+        return self._trajectories.pop(patient_id, None) is not None
+    
+    def count_append(self, rescored: bool):
+        self._appends += 1
+        self._rescores += rescored
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "patients": len(self._trajectories),
+            "max_patients": self._max_patients,
+            "max_visits": self.max_visits,
+            "appends": self._appends,
+            "rescores": self._rescores,
+            "evictions": self._evictions
+        }
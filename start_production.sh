@@ -4,7 +4,8 @@ set -e
 # Configuration par défaut
 PORT=${PORT:-8000}
 HOST=${HOST:-0.0.0.0}
-WORKERS=${WORKERS:-4}
+# Exporté: l'API en déduit si les trajectoires gardées par worker peuvent être complétées
+export WORKERS=${WORKERS:-4}
 
 # Couleurs pour une meilleure lisibilité
 GREEN='\033[0;32m'
@@ -32,6 +33,7 @@ cd "$FASTAPI_DIR"
 # Vérifier si nous sommes dans un environnement Heroku/etc qui n'autorise pas --chdir
 if [[ -n "$DYNO" || -n "$RENDER" ]]; then
     exec gunicorn main:app \
+        --config gunicorn.conf.py \
         --worker-class uvicorn.workers.UvicornWorker \
         --workers $WORKERS \
         --bind $HOST:$PORT \
@@ -40,6 +42,7 @@ if [[ -n "$DYNO" || -n "$RENDER" ]]; then
 else
     # Configuration standard
     exec gunicorn main:app \
+        --config gunicorn.conf.py \
         --worker-class uvicorn.workers.UvicornWorker \
         --workers $WORKERS \
         --bind $HOST:$PORT \